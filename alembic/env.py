@@ -5,6 +5,7 @@ from sqlalchemy import engine_from_config, pool
 
 from alembic import context
 from hashtablebot.entity.bot_user import BotUser
+from hashtablebot.entity.channel_no_prefix_command import ChannelNoPrefixCommand
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -30,6 +31,7 @@ if config.config_file_name is not None:
 # for 'autogenerate' support
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
+# Every entity shares the metadata of mapper_registry, the import above registers their tables
 target_metadata = [BotUser.__table__.metadata]
 
 # other values from the config, defined by the needs of env.py,
@@ -0,0 +1,68 @@
+"""
+Compares message throughput when command handlers read users through the bot's read path,
+HashTableBot._get_bot_user, from a slow database with the blocking BotUserDao and with
+AsyncBotUserDao.
+
+Run with:
+
+    python -m benchmarks.async_dao_benchmark
+"""
+
+import asyncio
+import time
+from unittest.mock import patch
+
+from hashtablebot.entity.bot_user import BotUser
+from hashtablebot.hash_table_bot import HashTableBot
+from hashtablebot.persistence.async_bot_user_dao import AsyncBotUserDao
+from hashtablebot.persistence.bot_user_cache import bot_user_cache
+from hashtablebot.persistence.bot_user_dao import BotUserDao
+
+QUERY_LATENCY_SECONDS = 0.05
+N_CHANNELS = 20
+MESSAGES_PER_CHANNEL = 10
+
+
+def slow_get_by_id(obj_id: int) -> BotUser:
+    time.sleep(QUERY_LATENCY_SECONDS)
+    return BotUser(id=obj_id)
+
+
+async def blocking_get_by_id(obj_id: int) -> BotUser:
+    return BotUserDao.get_by_id(obj_id)
+
+
+async def run_channel(bot: HashTableBot, channel: int):
+    for message in range(MESSAGES_PER_CHANNEL):
+        await bot._get_bot_user(channel * MESSAGES_PER_CHANNEL + message)
+
+
+async def measure(bot: HashTableBot) -> float:
+    """
+    :return: messages processed per second, with every channel sending messages at the same time
+    """
+    # Every message reads a different user, so none of them are cached
+    bot_user_cache.clear()
+    start = time.perf_counter()
+    await asyncio.gather(*(run_channel(bot, c) for c in range(N_CHANNELS)))
+    return N_CHANNELS * MESSAGES_PER_CHANNEL / (time.perf_counter() - start)
+
+
+async def main():
+    bot = HashTableBot(token="benchmark", initial_channels=[])
+
+    with patch.object(BotUserDao, "get_by_id", side_effect=slow_get_by_id):
+        with patch.object(AsyncBotUserDao, "get_by_id", side_effect=blocking_get_by_id):
+            blocking = await measure(bot)
+        non_blocking = await measure(bot)
+
+    print(
+        f"{N_CHANNELS} channels, {MESSAGES_PER_CHANNEL} messages each, "
+        f"{QUERY_LATENCY_SECONDS * 1000:.0f}ms per query"
+    )
+    print(f"BotUserDao:      {blocking:8.1f} messages/s")
+    print(f"AsyncBotUserDao: {non_blocking:8.1f} messages/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
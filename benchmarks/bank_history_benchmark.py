@@ -0,0 +1,85 @@
+"""
+Measures the memory held by a Bank while a million transactions go through it,
+showing that its bounded history keeps memory flat, unlike an unbounded history.
+Fails if the memory held with the bounded history grows past MAX_GROWTH_IN_BYTES.
+
+Run with:
+
+    python -m benchmarks.bank_history_benchmark
+"""
+
+import tracemalloc
+from dataclasses import dataclass
+
+from hashtablebot.banking.bank import Bank
+from hashtablebot.banking.commands import Deposit
+
+N_TRANSACTIONS = 1_000_000
+# Transactions between memory measurements
+CHECKPOINT_INTERVAL = 100_000
+# The unbounded history grows with every transaction, so fewer are run through it
+N_UNBOUNDED_TRANSACTIONS = 100_000
+# Memory the bounded history may gain after the first checkpoint, far below what a history of
+# CHECKPOINT_INTERVAL more transactions would take
+MAX_GROWTH_IN_BYTES = 16 * 1024
+
+
+@dataclass
+class BenchmarkBankUser:
+    balance: int = 0
+
+    def deposit(self, amount: int):
+        self.balance += amount
+
+    def withdraw(self, amount: int):
+        self.balance -= amount
+
+    def name(self) -> str:
+        return "user"
+
+    def get_balance(self) -> int:
+        return self.balance
+
+
+def measure(history_size, n_transactions: int) -> list[int]:
+    """
+    :return: bytes allocated since the bank was created, measured every CHECKPOINT_INTERVAL transactions
+    """
+    bank_user = BenchmarkBankUser()
+    tracemalloc.start()
+    bank = Bank(history_size=history_size)
+    measurements = []
+
+    for i in range(1, n_transactions + 1):
+        bank.execute(Deposit(bank_user=bank_user, amount=1))
+
+        if i % CHECKPOINT_INTERVAL == 0:
+            measurements.append(tracemalloc.get_traced_memory()[0])
+
+    tracemalloc.stop()
+    return measurements
+
+
+def main():
+    bounded = measure(Bank.DEFAULT_HISTORY_SIZE, N_TRANSACTIONS)
+    unbounded = measure(None, N_UNBOUNDED_TRANSACTIONS)
+
+    print(f"History of {Bank.DEFAULT_HISTORY_SIZE} transactions")
+    for i, size in enumerate(bounded, start=1):
+        print(f"{i * CHECKPOINT_INTERVAL:>9} transactions: {size / 1024:10.1f} KiB")
+    growth = max(bounded) - bounded[0]
+    print(f"Growth after the first checkpoint: {growth / 1024:.1f} KiB")
+
+    print("Unbounded history")
+    print(
+        f"{N_UNBOUNDED_TRANSACTIONS:>9} transactions: {unbounded[-1] / 1024:10.1f} KiB"
+    )
+
+    assert growth <= MAX_GROWTH_IN_BYTES, (
+        f"Memory grew by {growth} bytes with a history of {Bank.DEFAULT_HISTORY_SIZE}"
+        f" transactions, more than {MAX_GROWTH_IN_BYTES}"
+    )
+
+
+if __name__ == "__main__":
+    main()
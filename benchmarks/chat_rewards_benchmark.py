@@ -0,0 +1,54 @@
+"""
+Measures how many chat messages per second the ChatRewardEngine handles,
+and how many database writes crediting their rewards takes.
+
+Run with:
+
+    python -m benchmarks.chat_rewards_benchmark
+"""
+
+import asyncio
+import random
+import time
+from unittest.mock import AsyncMock, patch
+
+from hashtablebot.chat_rewards import ChatRewardEngine
+from hashtablebot.persistence.balance_write_buffer import BalanceWriteBuffer
+
+N_MESSAGES = 200_000
+N_CHANNELS = 500
+N_USERS = 20_000
+
+
+async def main():
+    rng = random.Random(0)
+    messages = [
+        (f"channel{rng.randrange(N_CHANNELS)}", rng.randrange(N_USERS))
+        for _ in range(N_MESSAGES)
+    ]
+
+    with patch(
+        "hashtablebot.persistence.balance_write_buffer.AsyncBotUserDao.add_to_balances",
+        new_callable=AsyncMock,
+    ) as add_to_balances:
+        buffer = BalanceWriteBuffer(flush_interval_in_seconds=0.1)
+        engine = ChatRewardEngine(buffer, reward=1)
+        buffer.start()
+
+        start = time.perf_counter()
+        for i, (channel_name, user_id) in enumerate(messages):
+            engine.reward_message(channel_name, user_id)
+            # Let the buffer flush in the background, as the bot does between messages
+            if i % 1000 == 0:
+                await asyncio.sleep(0)
+        elapsed = time.perf_counter() - start
+
+        await buffer.close()
+
+    print(f"{N_MESSAGES} messages, {N_CHANNELS} channels, {N_USERS} users")
+    print(f"Throughput:      {N_MESSAGES / elapsed:12.1f} messages/s")
+    print(f"Database writes: {add_to_balances.await_count:12d}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""
+Compares the time to find the command without a prefix invoked by a message
+when scanning every command with is_a_match and when looking it up in a NoPrefixCommandIndex.
+
+Run with:
+
+    python -m benchmarks.no_prefix_index_benchmark
+"""
+
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+from hashtablebot.memory_entity.no_prefix_command import (
+    DefaultNoPrefix,
+    NoPrefixCommandIndex,
+)
+
+N_COMMANDS = 5_000
+N_MESSAGES = 2_000
+MAX_NAMES_PER_COMMAND = 3
+
+
+def make_commands(rng: random.Random) -> list[DefaultNoPrefix]:
+    words = [f"emote{i}" for i in range(N_COMMANDS)]
+    commands = dict()
+
+    while len(commands) < N_COMMANDS:
+        names = " ".join(rng.sample(words, rng.randint(1, MAX_NAMES_PER_COMMAND)))
+        commands[names] = DefaultNoPrefix(names, names)
+
+    return list(commands.values())
+
+
+def make_messages(rng: random.Random, commands: list[DefaultNoPrefix]) -> list:
+    # Half of the messages invoke a command, the other half are regular chat messages
+    contents = [
+        " ".join(rng.choice(commands).names) + " hello"
+        if i % 2
+        else "just chatting in chat"
+        for i in range(N_MESSAGES)
+    ]
+    return [SimpleNamespace(content=content) for content in contents]
+
+
+async def find_by_scan(commands: list[DefaultNoPrefix], message):
+    for cmd in commands:
+        if await cmd.is_a_match(message):
+            return cmd
+
+
+async def measure_scan(commands: list[DefaultNoPrefix], messages: list) -> float:
+    """
+    :return: messages processed per second
+    """
+    start = time.perf_counter()
+    for message in messages:
+        await find_by_scan(commands, message)
+    return len(messages) / (time.perf_counter() - start)
+
+
+def measure_index(index: NoPrefixCommandIndex, messages: list) -> float:
+    """
+    :return: messages processed per second
+    """
+    start = time.perf_counter()
+    for message in messages:
+        index.find(message.content)
+    return len(messages) / (time.perf_counter() - start)
+
+
+async def main():
+    rng = random.Random(0)
+    commands = make_commands(rng)
+    messages = make_messages(rng, commands)
+    index = NoPrefixCommandIndex(commands)
+
+    scan = await measure_scan(commands, messages)
+    trie = measure_index(index, messages)
+
+    print(f"{N_COMMANDS} commands, {N_MESSAGES} messages")
+    print(f"Linear scan:          {scan:12.1f} messages/s")
+    print(f"NoPrefixCommandIndex: {trie:12.1f} messages/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
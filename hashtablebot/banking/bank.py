@@ -1,3 +1,6 @@
+from collections import deque
+from typing import Optional
+
 from hashtablebot.banking.transaction import Transaction
 
 
@@ -7,13 +10,31 @@ class Bank:
 
     Uses ArjanCodes's implementation of the Command Design Pattern to
     ensure an error in a batch of transactions rolls back changes to all balances.
+
+    Each Bank keeps its own history of transactions that can be undone and redone. The history is
+    bounded, so once it's full the oldest transactions are forgotten and can no longer be undone.
     """
 
-    undo_stack: list[Transaction] = list()
-    redo_stack: list[Transaction] = list()
+    DEFAULT_HISTORY_SIZE = 100
+
+    def __init__(self, history_size: Optional[int] = DEFAULT_HISTORY_SIZE):
+        """
+        :param history_size: maximum number of transactions that can be undone. If it's 0, no history is
+            kept and undo/redo do nothing. If it's None, the history is unbounded.
+        """
+        if history_size is not None and history_size < 0:
+            raise ValueError("history_size can't be negative")
+
+        self.history_size = history_size
+        self.undo_stack: deque[Transaction] = deque(maxlen=history_size)
+        self.redo_stack: deque[Transaction] = deque(maxlen=history_size)
 
     def execute(self, transaction: Transaction) -> None:
         transaction.execute()
+
+        if self.history_size == 0:
+            return
+
         self.redo_stack.clear()
         self.undo_stack.append(transaction)
 
@@ -1,4 +1,4 @@
-from typing import Protocol
+from typing import Protocol, runtime_checkable
 
 
 class BankUser(Protocol):
@@ -13,3 +13,14 @@ class BankUser(Protocol):
 
     def get_balance(self) -> int:
         ...
+
+
+@runtime_checkable
+class TransferringBankUser(BankUser, Protocol):
+    """
+    BankUser that can move coins to another BankUser as a single operation,
+    instead of a withdrawal followed by a deposit.
+    """
+
+    def transfer_to(self, to_bank_user: BankUser, amount: int):
+        ...
@@ -1,7 +1,7 @@
 import logging
 from dataclasses import dataclass, field
 
-from hashtablebot.banking.bank_user import BankUser
+from hashtablebot.banking.bank_user import BankUser, TransferringBankUser
 from hashtablebot.banking.transaction import Transaction
 
 
@@ -62,19 +62,24 @@ class Transfer:
             f" to bot_user {self.to_bank_user.name()}"
         )
 
+    @staticmethod
+    def _move(from_bank_user: BankUser, to_bank_user: BankUser, amount: int) -> None:
+        if isinstance(from_bank_user, TransferringBankUser):
+            from_bank_user.transfer_to(to_bank_user, amount)
+        else:
+            from_bank_user.withdraw(amount)
+            to_bank_user.deposit(amount)
+
     def execute(self) -> None:
-        self.from_bank_user.withdraw(self.amount)
-        self.to_bank_user.deposit(self.amount)
+        self._move(self.from_bank_user, self.to_bank_user, self.amount)
         logging.info(f"Transferred {self.transfer_details}")
 
     def undo(self) -> None:
-        self.to_bank_user.withdraw(self.amount)
-        self.from_bank_user.deposit(self.amount)
+        self._move(self.to_bank_user, self.from_bank_user, self.amount)
         logging.info(f"Undid transfer of {self.transfer_details}")
 
     def redo(self) -> None:
-        self.from_bank_user.withdraw(self.amount)
-        self.to_bank_user.deposit(self.amount)
+        self._move(self.from_bank_user, self.to_bank_user, self.amount)
         logging.info(f"Redid transfer of {self.transfer_details}")
 
 
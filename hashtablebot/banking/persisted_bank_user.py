@@ -0,0 +1,60 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from hashtablebot.banking.bank_user import BankUser
+from hashtablebot.entity.bot_user import BotUser
+from hashtablebot.persistence.bot_user_dao import BotUserDao
+
+
+@dataclass
+class PersistedBankUser:
+    """
+    BankUser whose balance changes are applied by the database in a single conditional statement.
+
+    Nothing is read before writing, so concurrent commands and bot replicas can't overwrite
+    each other's changes. The balance attribute holds the last balance returned by the database.
+
+    Its methods block on the database, so they should be run with run_blocking inside coroutines.
+    """
+
+    id: int
+    balance: int = 0
+    display_name: Optional[str] = None
+
+    @classmethod
+    def from_bot_user(cls, bot_user: BotUser) -> "PersistedBankUser":
+        return cls(
+            id=int(bot_user.id),
+            balance=bot_user.balance,
+            display_name=bot_user.display_name or bot_user.login_name,
+        )
+
+    def deposit(self, amount: int):
+        self.balance = BotUserDao.deposit(self.id, amount)
+
+    def withdraw(self, amount: int):
+        """
+        :raises: NotEnoughCoinError
+        """
+        self.balance = BotUserDao.withdraw(self.id, amount)
+
+    def transfer_to(self, to_bank_user: BankUser, amount: int):
+        """
+        Move amount to to_bank_user, in a single database transaction if it's also persisted.
+
+        :raises: NotEnoughCoinError
+        """
+        if not isinstance(to_bank_user, PersistedBankUser):
+            self.withdraw(amount)
+            to_bank_user.deposit(amount)
+            return
+
+        self.balance, to_bank_user.balance = BotUserDao.transfer(
+            self.id, to_bank_user.id, amount
+        )
+
+    def name(self) -> str:
+        return self.display_name or str(self.id)
+
+    def get_balance(self) -> int:
+        return self.balance
@@ -0,0 +1,474 @@
+import asyncio
+import dataclasses
+import json
+import logging
+import math
+import random
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+from twitchio import Channel, Chatter, Message
+from twitchio.abcs import Messageable
+from twitchio.ext import commands
+
+from hashtablebot.entity.bot_user import BotUser, mapper_registry
+from hashtablebot.hash_table_bot import HashTableBot
+from hashtablebot.persistence.async_bot_user_dao import AsyncBotUserDao
+from hashtablebot.persistence.bot_user_cache import bot_user_cache
+from hashtablebot.persistence.session import Session
+from hashtablebot.user_resolver import ResolvedUser
+
+
+@dataclasses.dataclass(frozen=True)
+class BenchMessage:
+    """
+    A chat message replayed by the benchmark.
+    """
+
+    channel: str
+    user: str
+    content: str
+
+
+"""
+Maps each kind of synthetic message to a function returning its content, given the random
+generator and the names of the other users.
+"""
+MESSAGE_TEMPLATES = {
+    "chat": lambda rng, users: rng.choice(
+        ("hello chat", "LUL", "elisYes elisYes", "what game is this?", "gg", "KEKW")
+    ),
+    "ping": lambda rng, users: "$ping",
+    "eliscoins": lambda rng, users: rng.choice(
+        ("$eliscoins", f"$eliscoins {rng.choice(users)}")
+    ),
+    "leaderboard": lambda rng, users: "$leaderboard",
+    "channelleaderboard": lambda rng, users: "$channelleaderboard",
+    "gamble": lambda rng, users: f"$gamble {rng.randint(1, 10)}",
+    "give": lambda rng, users: f"$give {rng.choice(users)} {rng.randint(1, 5)}",
+    "translate": lambda rng, users: "$translate text auto en "
+    + rng.choice(("hola", "bonjour", "ciao")),
+    "trigger": lambda rng, users: rng.choice(("Robert", "elisElis")),
+}
+
+DEFAULT_COMMAND_MIX = (
+    "chat=85,eliscoins=4,gamble=3,give=2,ping=2,trigger=2,leaderboard=1,translate=1"
+)
+
+
+def parse_command_mix(command_mix: str) -> dict[str, float]:
+    """
+    Parse a comma-separated list of message kinds and their weights, like "chat=90,ping=10".
+
+    :return: dictionary mapping each kind of MESSAGE_TEMPLATES to its weight
+    :raises: ValueError
+    """
+    weights: dict[str, float] = dict()
+
+    for entry in filter(None, (entry.strip() for entry in command_mix.split(","))):
+        kind, _, weight = entry.partition("=")
+        kind = kind.strip()
+
+        if kind not in MESSAGE_TEMPLATES:
+            raise ValueError(
+                f"Unknown message kind '{kind}', expected one of {', '.join(MESSAGE_TEMPLATES)}"
+            )
+
+        try:
+            weights[kind] = float(weight)
+        except ValueError:
+            raise ValueError(f"Invalid weight '{weight}' for '{kind}'") from None
+
+        if weights[kind] < 0:
+            raise ValueError(f"Negative weight for '{kind}'")
+
+    if not any(weights.values()):
+        raise ValueError("At least one kind of message needs a positive weight")
+
+    return weights
+
+
+def synthetic_messages(
+    count: int,
+    channel_count: int,
+    user_count: int,
+    command_mix: dict[str, float],
+    seed: Optional[int] = None,
+) -> Iterator[BenchMessage]:
+    """
+    Generate chat messages sent by random users in random channels.
+
+    :param count: number of messages
+    :param channel_count: number of channels the messages are sent in
+    :param user_count: number of users sending them
+    :param command_mix: dictionary mapping kinds of MESSAGE_TEMPLATES to their weight
+    :param seed: seed of the random generator, None for a different load every time
+    """
+    rng = random.Random(seed)
+    channels = [f"channel{i}" for i in range(channel_count)]
+    users = [f"user{i}" for i in range(user_count)]
+    kinds, weights = zip(*command_mix.items())
+
+    for kind in rng.choices(kinds, weights, k=count):
+        yield BenchMessage(
+            channel=rng.choice(channels),
+            user=rng.choice(users),
+            content=MESSAGE_TEMPLATES[kind](rng, users),
+        )
+
+
+def read_chat_log(path: str) -> Iterator[BenchMessage]:
+    """
+    Read the messages of a recorded chat log, with a message per line either as tab-separated
+    channel, user and content, or as a JSON object with these keys. Empty lines are skipped.
+
+    :raises: ValueError if a line is in neither format
+    """
+    with open(path, encoding="utf-8") as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.rstrip("\r\n")
+
+            if not line.strip():
+                continue
+
+            try:
+                if line.startswith("{"):
+                    entry = json.loads(line)
+                    channel, user, content = (
+                        entry["channel"],
+                        entry["user"],
+                        entry["content"],
+                    )
+                else:
+                    channel, user, content = line.split("\t", 2)
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"Invalid chat log line {line_number}: {e}") from e
+
+            yield BenchMessage(
+                channel=channel.lstrip("#").lower(), user=user.lower(), content=content
+            )
+
+
+@dataclasses.dataclass
+class BenchReport:
+    """
+    Results of a benchmark run.
+    """
+
+    message_count: int
+    duration_in_seconds: float
+    # Maps "chat", "trigger" or the command name to the latencies of its messages in seconds
+    latencies: dict[str, list[float]]
+    # Messages the bot sent in response
+    sent_count: int
+    # Messages dropped from full channel queues
+    dropped_count: int
+    # Commands that ended with an error, like a bad argument
+    error_count: int
+
+    @property
+    def throughput(self) -> float:
+        """
+        :return: messages handled per second
+        """
+        return self.message_count / self.duration_in_seconds
+
+    def percentile(self, label: str, percent: float) -> float:
+        """
+        :return: latency in seconds that percent of the messages with the label didn't exceed
+        """
+        latencies = sorted(self.latencies[label])
+        rank = max(math.ceil(percent / 100 * len(latencies)), 1)
+        return latencies[rank - 1]
+
+    def format(self) -> str:
+        lines = [
+            f"Replayed {self.message_count} messages in {self.duration_in_seconds:.2f}s: "
+            f"{self.throughput:.1f} messages/s",
+            f"Sent {self.sent_count} messages, dropped {self.dropped_count}, "
+            f"{self.error_count} command errors",
+            "",
+            f"{'command':<20}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}",
+        ]
+
+        for label in sorted(self.latencies, key=lambda l: -len(self.latencies[l])):
+            percentiles = "".join(
+                f"{self.percentile(label, percent) * 1000:>10.2f}"
+                for percent in (50, 95, 99)
+            )
+            lines.append(f"{label:<20}{len(self.latencies[label]):>8}{percentiles}")
+
+        return "\n".join(lines)
+
+
+class EchoTranslationBackend:
+    """
+    Translation backend answering with the text itself, so the benchmark doesn't call Google Translate.
+    """
+
+    def translate(self, text: str, source_lang: str, target_lang: str) -> str:
+        return text
+
+    def translate_batch(
+        self, texts: list[str], source_lang: str, target_lang: str
+    ) -> list[str]:
+        return list(texts)
+
+
+class _BenchWebSocket:
+    """
+    Stands in for the IRC connection of the replayed messages, counting the messages sent to it.
+    """
+
+    def __init__(self, bot: "BenchBot"):
+        self._client = bot
+        self.nick = "hashtablebot"
+        # Maps channel name to its chatters, read by twitchio to know if the bot is a moderator
+        self._cache: defaultdict[str, set] = defaultdict(set)
+        self.sent_count = 0
+
+    async def send(self, message: str) -> None:
+        self.sent_count += 1
+
+    async def reply(self, msg_id: str, message: str) -> None:
+        self.sent_count += 1
+
+
+class BenchBot(HashTableBot):
+    """
+    HashTableBot fed with fake twitchio messages instead of connecting to Twitch.
+
+    Users are made up when they're fetched, translations are echoed back and the messages
+    sent by the bot are only counted. Cooldowns are removed, so every command runs.
+    """
+
+    BENCH_USER_ID_OFFSET = 1_000_000
+
+    def __init__(self):
+        super().__init__(
+            token="bench",
+            initial_channels=[],
+            translation_backend=EchoTranslationBackend(),
+        )
+        self._websocket = _BenchWebSocket(self)
+        # Maps name to the made-up users
+        self._bench_users: dict[str, ResolvedUser] = dict()
+        # Maps message id to when the handling of the message ended
+        self._handled_at: dict[str, float] = dict()
+        self.error_count = 0
+
+        for command in self.commands.values():
+            command._cooldowns.clear()
+
+    def bench_user(self, name: str) -> ResolvedUser:
+        """
+        :return: the made-up user with the name, created if it doesn't exist
+        """
+        name = name.lower()
+
+        if (user := self._bench_users.get(name)) is None:
+            user = self._bench_users[name] = ResolvedUser(
+                id=self.BENCH_USER_ID_OFFSET + len(self._bench_users),
+                name=name,
+                display_name=name,
+            )
+
+        return user
+
+    async def fetch_users(
+        self, names: Optional[list[str]] = None, ids: Optional[list[int]] = None, **_
+    ) -> list[ResolvedUser]:
+        id_to_user = {user.id: user for user in self._bench_users.values()}
+
+        return [self.bench_user(name) for name in names or ()] + [
+            id_to_user[int(user_id)]
+            for user_id in ids or ()
+            if int(user_id) in id_to_user
+        ]
+
+    async def event_command_error(self, context: commands.Context, error: Exception):
+        self.error_count += 1
+        logging.debug(f"Command error: {error!r}")
+
+    async def _handle_message(self, message: Message, no_prefix_command):
+        try:
+            await super()._handle_message(message, no_prefix_command)
+        finally:
+            self._handled_at[message.id] = time.perf_counter()
+
+    def to_twitchio_message(self, message_id: int, message: BenchMessage) -> Message:
+        user = self.bench_user(message.user)
+        channel = Channel(name=message.channel, websocket=self._websocket)
+        author = Chatter(
+            websocket=self._websocket,
+            name=user.name,
+            channel=channel,
+            bot=self,
+            tags={
+                "user-id": str(user.id),
+                "display-name": user.display_name,
+                "badges": "",
+                "subscriber": "0",
+                "mod": "0",
+                "color": "",
+            },
+        )
+        return Message(
+            raw_data="",
+            content=message.content,
+            author=author,
+            channel=channel,
+            tags={
+                "id": str(message_id),
+                "tmi-sent-ts": str(int(time.time() * 1000)),
+            },
+        )
+
+    def label(self, message: Message) -> str:
+        """
+        :return: name of the command invoked by the message, "trigger" for commands without
+            a prefix or "chat" for other messages
+        """
+        if self._find_no_prefix_command(message) is not None:
+            return "trigger"
+
+        prefix = self._prefix_cache.get(message.channel.name) or self.DEFAULT_PREFIX
+
+        if not message.content.startswith(prefix):
+            return "chat"
+
+        name, *_ = message.content[len(prefix) :].split(maxsplit=1) or [""]
+        command = self.get_command(name)
+        return command.name if command is not None else "unknown command"
+
+    async def replay(
+        self,
+        messages: list[BenchMessage],
+        messages_per_second: Optional[float] = None,
+        initial_balance: int = 1000,
+    ) -> BenchReport:
+        """
+        Pass the messages to event_message and wait until every one of them is handled.
+
+        The latency of a message is the time from being passed to event_message until its
+        handling ends, which includes the time it waited in its channel's queue.
+
+        :param messages: messages replayed in order
+        :param messages_per_second: rate the messages are passed at, None to pass them as fast as possible
+        :param initial_balance: coins of every user before the replay
+        """
+        # Prefixes and users are loaded before replaying, like the bot does at event_ready
+        channels = {message.channel for message in messages}
+        self._prefix_cache.put_many((name, self.DEFAULT_PREFIX) for name in channels)
+        await AsyncBotUserDao.save(
+            *(
+                BotUser(id=self.bench_user(name).id, balance=initial_balance)
+                for name in {message.user for message in messages}.union(channels)
+            )
+        )
+        self._balance_buffer.start()
+
+        twitchio_messages = [
+            self.to_twitchio_message(i, message) for i, message in enumerate(messages)
+        ]
+        labels = [self.label(message) for message in twitchio_messages]
+        # When each message was passed to event_message and when event_message returned
+        passed_at: list[float] = []
+        returned_at: list[float] = []
+
+        start = time.perf_counter()
+
+        for i, message in enumerate(twitchio_messages):
+            if messages_per_second is not None:
+                await asyncio.sleep(
+                    start + i / messages_per_second - time.perf_counter()
+                )
+            else:
+                # Let the handlers run between messages, like when reading them from the socket
+                await asyncio.sleep(0)
+
+            passed_at.append(time.perf_counter())
+            await self.event_message(message)
+            returned_at.append(time.perf_counter())
+
+        await self._message_queues.join()
+        duration = time.perf_counter() - start
+
+        latencies: dict[str, list[float]] = defaultdict(list)
+
+        for message, label, passed, returned in zip(
+            twitchio_messages, labels, passed_at, returned_at
+        ):
+            # Messages that were not queued were handled by event_message itself
+            handled = self._handled_at.get(message.id, returned)
+            latencies[label].append(handled - passed)
+
+        return BenchReport(
+            message_count=len(messages),
+            duration_in_seconds=duration,
+            latencies=dict(latencies),
+            sent_count=self._websocket.sent_count,
+            dropped_count=self._message_queues.dropped,
+            error_count=self.error_count,
+        )
+
+
+@contextmanager
+def _without_irc_rate_limits() -> Iterator[None]:
+    """
+    Disable the per-channel rate limit twitchio checks before sending a message, which would
+    raise for most of the replies, since no messages are actually sent.
+    """
+    check_bucket = Messageable.check_bucket
+    Messageable.check_bucket = lambda self, channel: None
+
+    try:
+        yield
+    finally:
+        Messageable.check_bucket = check_bucket
+
+
+def _bind_in_memory_database() -> None:
+    """
+    Bind the persistence Session to a new in-memory SQLite database, so the benchmark runs the
+    real DAOs without a Postgres server.
+
+    The database only lives as long as its single connection, which is shared by the threads of
+    the database thread pool. The pool hands it to one session at a time, since SQLite
+    connections can't run concurrent transactions.
+    """
+    engine = create_engine(
+        "sqlite://",
+        future=True,
+        poolclass=QueuePool,
+        pool_size=1,
+        max_overflow=0,
+        connect_args={"check_same_thread": False},
+    )
+    mapper_registry.metadata.create_all(engine)
+    Session.configure(bind=engine)
+    bot_user_cache.clear()
+
+
+async def run_bench(
+    messages: Iterable[BenchMessage],
+    messages_per_second: Optional[float] = None,
+) -> BenchReport:
+    """
+    Replay the messages through a BenchBot backed by an in-memory database.
+
+    :param messages: messages replayed in order
+    :param messages_per_second: rate the messages are passed at, None to pass them as fast as possible
+    """
+    _bind_in_memory_database()
+    bot = BenchBot()
+
+    try:
+        with _without_irc_rate_limits():
+            return await bot.replay(list(messages), messages_per_second)
+    finally:
+        await bot.close()
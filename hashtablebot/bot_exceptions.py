@@ -21,3 +21,9 @@ class PointConversionError(ExceptionWithChatMessage):
     @staticmethod
     def get_chat_message() -> str:
         return "An invalid point amount was passed elisLookingAtYou"
+
+
+class DuelInProgressError(ExceptionWithChatMessage):
+    @staticmethod
+    def get_chat_message() -> str:
+        return "You can't start a duel with someone already in one elisLookingAtYou"
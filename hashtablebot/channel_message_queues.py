@@ -0,0 +1,241 @@
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+
+@dataclass
+class _QueuedMessage:
+    # Coroutine function that handles the message
+    handle: Callable[[], Awaitable]
+    # Whether the message can be dropped when the queue is full, like chat messages that are only translated
+    droppable: bool
+
+
+@dataclass
+class _ChannelQueue:
+    messages: deque[_QueuedMessage] = field(default_factory=deque)
+    # Futures of the messages waiting for room, woken in the order they started waiting
+    waiters: deque[asyncio.Future] = field(default_factory=deque)
+    # Number of woken waiters that have room saved for their message but didn't queue it yet
+    reserved: int = 0
+    worker: Optional[asyncio.Task] = None
+
+
+class ChannelMessageQueues:
+    """
+    Handles the messages of each channel in the order they arrive, without a slow handler in one
+    channel delaying the others.
+
+    Each channel has a queue of at most max_queue_size messages, drained by its own worker task,
+    which only exists while the queue has messages. At most max_concurrency handlers run at once
+    across every channel, and a worker waits for the cap before starting the next handler.
+
+    When a queue is full, the oldest droppable message is dropped to make room. If there are
+    none, a droppable message is dropped itself, while any other message, like a command, waits
+    for room. Waiting messages are queued in the order they arrived, and at most
+    max_waiting_messages of them wait per channel, the ones after that being dropped too.
+
+    A worker stops waiting for a handler after detach_after_in_seconds and starts the next one,
+    so commands that wait on purpose, like duels, don't block their channel. The detached handler
+    keeps running but gives its slot back, so handlers waiting for chat don't take the slots
+    of every channel.
+
+    Handlers of droppable messages, which are only translated, are detached as soon as they
+    start, so messages behind them don't wait for their translation batch. They keep their slot
+    until they're done, and may finish in any order.
+    """
+
+    DEFAULT_MAX_QUEUE_SIZE = 100
+    DEFAULT_MAX_CONCURRENCY = 50
+    DEFAULT_DETACH_AFTER_IN_SECONDS = 1.0
+    DEFAULT_MAX_WAITING_MESSAGES = 100
+
+    def __init__(
+        self,
+        max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        detach_after_in_seconds: float = DEFAULT_DETACH_AFTER_IN_SECONDS,
+        max_waiting_messages: int = DEFAULT_MAX_WAITING_MESSAGES,
+    ):
+        """
+        :param max_queue_size: maximum number of messages waiting in a channel's queue
+        :param max_concurrency: maximum number of handlers running at once across every channel,
+            not counting the detached ones
+        :param detach_after_in_seconds: seconds a worker waits for a handler before starting the next
+        :param max_waiting_messages: maximum number of messages waiting for room in a channel's
+            queue, after which they're dropped
+        """
+        self.max_queue_size = max_queue_size
+        self.detach_after_in_seconds = detach_after_in_seconds
+        self.max_waiting_messages = max_waiting_messages
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Maps channel name to its queue, only while it has messages or a worker
+        self._queues: dict[str, _ChannelQueue] = dict()
+        # References to the running handlers, so they're not garbage collected
+        self._handlers: set[asyncio.Task] = set()
+        self._depth = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        """
+        :return: number of messages waiting in every queue
+        """
+        return self._depth
+
+    def depth(self, channel_name: str) -> int:
+        """
+        :return: number of messages waiting in the channel's queue
+        """
+        queue = self._queues.get(channel_name)
+        return len(queue.messages) if queue is not None else 0
+
+    async def put(
+        self,
+        channel_name: str,
+        handle: Callable[[], Awaitable],
+        droppable: bool = False,
+    ) -> bool:
+        """
+        Queue a message to be handled by the channel's worker.
+        If the queue is full, waits for room unless the message is droppable or too many
+        messages are already waiting.
+
+        :param channel_name: channel the message was sent in
+        :param handle: coroutine function that handles the message
+        :param droppable: whether the message can be dropped when the queue is full
+        :return: whether the message was queued, False if it was dropped
+        """
+        if (queue := self._queues.get(channel_name)) is None:
+            queue = self._queues[channel_name] = _ChannelQueue()
+
+        # Messages that are already waiting get the room first
+        is_full = len(queue.messages) + queue.reserved >= self.max_queue_size
+        if queue.waiters or (is_full and not self._drop_oldest_droppable(queue)):
+            if droppable or len(queue.waiters) >= self.max_waiting_messages:
+                self.dropped += 1
+                return False
+
+            await self._wait_for_room(queue)
+
+        queue.messages.append(_QueuedMessage(handle, droppable))
+        self._depth += 1
+
+        if queue.worker is None:
+            queue.worker = asyncio.create_task(self._drain(channel_name, queue))
+
+        return True
+
+    async def join(self) -> None:
+        """
+        Wait until every queued message is handled, including the handlers that were detached.
+        """
+        while tasks := [
+            *(queue.worker for queue in self._queues.values() if queue.worker),
+            *self._handlers,
+        ]:
+            await asyncio.wait(tasks)
+
+    async def close(self) -> None:
+        """
+        Stop the workers and handlers. Queued messages are discarded.
+        """
+        for queue in self._queues.values():
+            if queue.worker is not None:
+                queue.worker.cancel()
+
+            for waiter in queue.waiters:
+                waiter.cancel()
+
+        for handler in list(self._handlers):
+            handler.cancel()
+
+        self._queues.clear()
+        self._depth = 0
+
+    async def _wait_for_room(self, queue: _ChannelQueue) -> None:
+        """
+        Wait until a message leaves the queue and the room is saved for this one.
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        queue.waiters.append(waiter)
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The room was saved for this message, so it's given to the next one
+                queue.reserved -= 1
+                self._wake_next_waiter(queue)
+            elif waiter in queue.waiters:
+                queue.waiters.remove(waiter)
+            raise
+
+        queue.reserved -= 1
+
+    def _wake_next_waiter(self, queue: _ChannelQueue) -> None:
+        """
+        Save the room of a message that left the queue for the first message waiting for it.
+        """
+        while queue.waiters:
+            waiter = queue.waiters.popleft()
+
+            if not waiter.done():
+                waiter.set_result(None)
+                queue.reserved += 1
+                return
+
+    def _drop_oldest_droppable(self, queue: _ChannelQueue) -> bool:
+        """
+        :return: whether a message was dropped
+        """
+        for message in queue.messages:
+            if message.droppable:
+                queue.messages.remove(message)
+                self._depth -= 1
+                self.dropped += 1
+                return True
+
+        return False
+
+    async def _drain(self, channel_name: str, queue: _ChannelQueue) -> None:
+        while queue.messages:
+            await self._semaphore.acquire()
+
+            # Messages could have been dropped while waiting
+            if not queue.messages:
+                self._semaphore.release()
+                break
+
+            message = queue.messages.popleft()
+            self._depth -= 1
+            self._wake_next_waiter(queue)
+
+            handler = asyncio.create_task(self._run_handler(message.handle))
+            self._handlers.add(handler)
+            handler.add_done_callback(self._handlers.discard)
+
+            if message.droppable:
+                # Translations wait for their batch to fill, so they're detached right away,
+                # holding their slot until they're done
+                handler.add_done_callback(lambda _: self._semaphore.release())
+                continue
+
+            try:
+                await asyncio.wait((handler,), timeout=self.detach_after_in_seconds)
+            finally:
+                # Released once the handler is done or detached
+                self._semaphore.release()
+
+        queue.worker = None
+
+        is_empty = not (queue.messages or queue.waiters or queue.reserved)
+        if self._queues.get(channel_name) is queue and is_empty:
+            del self._queues[channel_name]
+
+    async def _run_handler(self, handle: Callable[[], Awaitable]) -> None:
+        try:
+            await handle()
+        except Exception as e:
+            logging.exception(e)
@@ -0,0 +1,74 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from hashtablebot.persistence.balance_write_buffer import BalanceWriteBuffer
+
+
+class ChatRewardEngine:
+    """
+    Rewards chatters with coins for their messages.
+
+    A user gets the reward for at most one message per cooldown_in_seconds in each channel,
+    so spamming doesn't earn more coins. Rewards are added to a BalanceWriteBuffer, which
+    credits every rewarded user with a single bulk write, so handling a message never waits
+    for I/O and only takes a few dictionary operations.
+    """
+
+    DEFAULT_COOLDOWN_IN_SECONDS = 60.0
+
+    def __init__(
+        self,
+        balance_buffer: BalanceWriteBuffer,
+        reward: int,
+        cooldown_in_seconds: float = DEFAULT_COOLDOWN_IN_SECONDS,
+    ):
+        """
+        :param balance_buffer: buffer the rewards are added to
+        :param reward: coins given for a rewarded message
+        :param cooldown_in_seconds: minimum time between two rewards of a user in the same channel
+        """
+        self._balance_buffer = balance_buffer
+        self.reward = reward
+        self.cooldown_in_seconds = cooldown_in_seconds
+        # Maps (channel name, user id) to the time of their last reward, from oldest to newest
+        self._last_rewards: OrderedDict[tuple[str, int], float] = OrderedDict()
+
+    def reward_message(
+        self, channel_name: str, user_id: int, now: Optional[float] = None
+    ) -> bool:
+        """
+        Reward the user for a message sent in the channel, unless they're in cooldown.
+
+        :param now: time the message was received, from time.monotonic
+        :return: whether the user was rewarded
+        """
+        now = time.monotonic() if now is None else now
+        self._forget_expired_cooldowns(now)
+
+        key = channel_name, int(user_id)
+        if key in self._last_rewards:
+            return False
+
+        self._last_rewards[key] = now
+        self._balance_buffer.add(int(user_id), self.reward)
+        return True
+
+    def _forget_expired_cooldowns(self, now: float) -> None:
+        """
+        Remove the rewards older than the cooldown, which are always the first ones,
+        so memory only grows with the number of users rewarded during the last cooldown.
+        """
+        while self._last_rewards:
+            key, rewarded_at = next(iter(self._last_rewards.items()))
+
+            if now - rewarded_at < self.cooldown_in_seconds:
+                break
+
+            del self._last_rewards[key]
+
+    def __len__(self) -> int:
+        """
+        :return: number of users in cooldown
+        """
+        return len(self._last_rewards)
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from enum import Enum, auto
+from typing import Awaitable, Callable, Optional
+
+from twitchio import Message
+
+from hashtablebot.bot_exceptions import DuelInProgressError
+
+
+class DuelState(Enum):
+    """
+    States of a duel, in the order they happen.
+    """
+
+    # Participants were told to wait until GO, answers are ignored
+    WAITING_FOR_GO = auto()
+    # GO was sent, the first message of each participant is their answer
+    ACCEPTING_ANSWERS = auto()
+    # Both participants answered or the timeout was reached
+    FINISHED = auto()
+
+
+@dataclass
+class Duel:
+    channel_name: str
+    author_id: str
+    target_id: str
+    state: DuelState = DuelState.WAITING_FOR_GO
+    # Maps participant id to their answer
+    answers: dict[str, str] = field(default_factory=dict)
+    all_answered: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def participant_ids(self) -> tuple[str, ...]:
+        # A user dueling themselves only has one answer
+        return tuple(dict.fromkeys((self.author_id, self.target_id)))
+
+    def store_answer(self, user_id: str, answer: str) -> None:
+        self.answers.setdefault(user_id, answer)
+        logging.debug(f"Duel answer of {user_id} set to {self.answers[user_id]}")
+
+        if len(self.answers) == len(self.participant_ids):
+            self.all_answered.set()
+
+
+class DuelManager:
+    """
+    Runs rock, paper, scissors duels without blocking the bot.
+
+    Any number of duels can run at the same time across channels, as long as each user is in a
+    single duel per channel. Instead of waiting for messages once per duel, every message is passed
+    to dispatch, which finds the duel of its author with a dictionary lookup.
+    """
+
+    VALID_ANSWERS = "rock", "paper", "scissors"
+
+    def __init__(
+        self, wait_until_go_in_seconds: float, answer_timeout_in_seconds: float
+    ):
+        self.wait_until_go_in_seconds = wait_until_go_in_seconds
+        self.answer_timeout_in_seconds = answer_timeout_in_seconds
+        # Maps (channel name, participant id) to the duel the participant is in
+        self._duels: dict[tuple[str, str], Duel] = dict()
+
+    def __len__(self) -> int:
+        """
+        :return: number of duels in progress
+        """
+        return len({id(duel) for duel in self._duels.values()})
+
+    def is_dueling(self, channel_name: str, user_id: str | int) -> bool:
+        return (channel_name, str(user_id)) in self._duels
+
+    async def run(
+        self,
+        channel_name: str,
+        author_id: str | int,
+        target_id: str | int,
+        send: Callable[[str], Awaitable],
+        prompt: str,
+    ) -> tuple[Optional[str], Optional[str]]:
+        """
+        Send the prompt, then send GO after wait_until_go_in_seconds and collect the participants' answers.
+
+        :param channel_name: channel the duel happens in
+        :param author_id: id of the user that started the duel
+        :param target_id: id of the user that was challenged
+        :param send: coroutine function that sends a message to the channel
+        :param prompt: message telling the participants how to answer
+        :return: the lowercase answers of the author and target, None for the ones not given in time
+        :raises: DuelInProgressError if one of the participants is already in a duel in the channel
+        """
+        duel = Duel(channel_name, str(author_id), str(target_id))
+
+        if any(self.is_dueling(channel_name, i) for i in duel.participant_ids):
+            raise DuelInProgressError(f"A participant is already in a duel: {duel}")
+
+        for participant_id in duel.participant_ids:
+            self._duels[(channel_name, participant_id)] = duel
+
+        try:
+            await send(prompt)
+            await asyncio.sleep(self.wait_until_go_in_seconds)
+
+            duel.state = DuelState.ACCEPTING_ANSWERS
+            await send("GO!!!!!!!!!!!!!!!!!!")
+
+            try:
+                await asyncio.wait_for(
+                    duel.all_answered.wait(), self.answer_timeout_in_seconds
+                )
+            except asyncio.TimeoutError:
+                logging.debug(f"Duel timed out with answers {duel.answers}")
+        finally:
+            duel.state = DuelState.FINISHED
+            for participant_id in duel.participant_ids:
+                del self._duels[(channel_name, participant_id)]
+
+        return duel.answers.get(duel.author_id), duel.answers.get(duel.target_id)
+
+    def dispatch(self, message: Message) -> bool:
+        """
+        Store the message as an answer if its author is in a duel accepting answers in the channel.
+
+        :return: whether the message was an answer to a duel
+        """
+        if message.author is None:
+            return False
+
+        duel = self._duels.get((message.channel.name, str(message.author.id)))
+
+        if duel is None or duel.state != DuelState.ACCEPTING_ANSWERS:
+            return False
+
+        duel.store_answer(str(message.author.id), message.content.lower())
+        return True
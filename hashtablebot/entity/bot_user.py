@@ -1,4 +1,5 @@
 import dataclasses
+from typing import Optional
 
 from sqlalchemy import Boolean, Column, Integer, String, Table
 from sqlalchemy.orm import registry
@@ -15,9 +16,11 @@ class BotUser:
         "botuser",
         mapper_registry.metadata,
         Column("id", Integer, primary_key=True),
-        Column("balance", Integer),
+        Column("balance", Integer, index=True),
         Column("bot_joined_channel", Boolean),
         Column("bot_command_prefix", String),
+        Column("login_name", String, index=True, unique=True),
+        Column("display_name", String),
     )
 
     id: int = dataclasses.field(init=True)
@@ -35,6 +38,19 @@ class BotUser:
     """
     bot_command_prefix: str = "$"
 
+    """
+    The user's lowercase Twitch login name, stored so joined channels
+    don't have to be looked up by id on every startup. Unique, so a name
+    taken over after a rename is only stored for its new owner.
+    """
+    login_name: Optional[str] = None
+
+    """
+    The user's Twitch display name, kept up to date from their messages
+    along with their login name.
+    """
+    display_name: Optional[str] = None
+
     def deposit(self, amount: int):
         self.balance += amount
 
@@ -45,8 +61,10 @@ class BotUser:
         self.balance -= amount
 
     def name(self) -> str:
-        # TODO: add name attribute to bot_user
-        return str(self.id)
+        """
+        :return: the user's display name, or their id if no name was stored yet
+        """
+        return self.display_name or self.login_name or str(self.id)
 
     def get_balance(self) -> int:
         return self.balance
@@ -0,0 +1,40 @@
+import dataclasses
+
+from sqlalchemy import Column, Integer, String, Table
+
+from hashtablebot.entity.bot_user import mapper_registry
+from hashtablebot.memory_entity.no_prefix_command import DefaultNoPrefix
+
+
+@mapper_registry.mapped
+@dataclasses.dataclass
+class ChannelNoPrefixCommand:
+    """
+    Command without a prefix added by a moderator, that only works in one channel.
+    """
+
+    __table__ = Table(
+        "channelnoprefixcommand",
+        mapper_registry.metadata,
+        Column("channel_id", Integer, primary_key=True),
+        Column("names", String, primary_key=True),
+        Column("response", String, nullable=False),
+    )
+
+    """
+    Id of the user whose channel the command works in
+    """
+    channel_id: int
+
+    """
+    Space separated words a message has to start with to invoke the command
+    """
+    names: str
+
+    """
+    Message the bot sends when the command is invoked
+    """
+    response: str
+
+    def to_no_prefix_command(self) -> DefaultNoPrefix:
+        return DefaultNoPrefix(self.names, self.response)
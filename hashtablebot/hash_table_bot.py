@@ -1,28 +1,105 @@
+import asyncio
+import contextlib
+import dataclasses
+import functools
 import logging
+import os
 import random
+import signal
 import sys
 import time
 from asyncio import CancelledError
 from datetime import datetime, timedelta
+from typing import Iterator, Optional
 
 from sqlalchemy.exc import NoResultFound
-from twitchio import Channel, Message, User
+from twitchio import Channel, Chatter, Message
 from twitchio.ext import commands
 from twitchio.ext.commands import BadArgument, Bot, MissingRequiredArgument
 
 from hashtablebot.banking.bank import Bank
-from hashtablebot.banking.commands import Batch, Deposit, Withdrawal
+from hashtablebot.banking.commands import Deposit, Transfer, Withdrawal
+from hashtablebot.banking.persisted_bank_user import PersistedBankUser
+from hashtablebot.banking.transaction import Transaction
 from hashtablebot.bot_exceptions import (
     ExceptionWithChatMessage,
     NotEnoughCoinError,
     PointConversionError,
 )
+from hashtablebot.channel_message_queues import ChannelMessageQueues
+from hashtablebot.chat_rewards import ChatRewardEngine
+from hashtablebot.duel_manager import DuelManager
 from hashtablebot.entity.bot_user import BotUser
-from hashtablebot.memory_entity.no_prefix_command import DefaultNoPrefix
+from hashtablebot.entity.channel_no_prefix_command import ChannelNoPrefixCommand
+from hashtablebot.irc_shards import ChannelShards, JoinRateLimiter
+from hashtablebot.leaderboard import Leaderboard
+from hashtablebot.lru_cache import LRUCache
+from hashtablebot.memory_entity.no_prefix_command import (
+    DefaultNoPrefix,
+    NoPrefixCommand,
+    NoPrefixCommandIndex,
+)
 from hashtablebot.memory_entity.point_amount import PointAmountConverter
+from hashtablebot.message_scheduler import MessageScheduler, Priority, message_priority
+from hashtablebot.metrics import (
+    MetricsServer,
+    command_duration,
+    messages_processed,
+    metrics,
+)
+from hashtablebot.persistence.async_bot_user_dao import AsyncBotUserDao
+from hashtablebot.persistence.async_channel_no_prefix_command_dao import (
+    AsyncChannelNoPrefixCommandDao,
+)
+from hashtablebot.persistence.async_dao import run_blocking
+from hashtablebot.persistence.balance_write_buffer import BalanceWriteBuffer
+from hashtablebot.persistence.bot_user_cache import bot_user_cache
 from hashtablebot.persistence.bot_user_dao import BotUserDao
-from hashtablebot.translation import Translator
+from hashtablebot.persistence.user_name_write_buffer import UserNameWriteBuffer
+from hashtablebot.translation import TranslationBackend, TranslationCache, Translator
 from hashtablebot.user_checks import is_bot_admin, is_bot_admin_or_mod
+from hashtablebot.user_resolver import ResolvedUser, UserResolver
+from hashtablebot.workers import ChannelPartition
+
+
+@contextlib.contextmanager
+def _log_duration(phase: str) -> Iterator[None]:
+    """
+    Log the seconds taken by a phase of the bot's startup.
+    """
+    start = time.perf_counter()
+    yield
+    logging.info(f"{phase} in {time.perf_counter() - start:.2f}s")
+
+
+async def _convert_user(ctx: commands.Context, arg: str) -> ResolvedUser:
+    """
+    Command argument converter resolving a user by name, used for ResolvedUser arguments
+    instead of twitchio's User converter, so users with a stored name are found without
+    requesting Helix.
+
+    :raises: BadArgument if no user has the name
+    """
+    name = arg.lstrip("@")
+    user = await ctx.bot._user_resolver.get_user_by_name(name)
+
+    if user is None:
+        raise BadArgument(f"User '{name}' was not found.")
+
+    return user
+
+
+class _UserConvertingCommand(commands.Command):
+    """
+    Command converting its ResolvedUser arguments with _convert_user,
+    since twitchio only looks up the converters of its own types.
+    """
+
+    def _resolve_converter(self, converter):
+        if converter is ResolvedUser:
+            return _convert_user
+
+        return super()._resolve_converter(converter)
 
 
 class HashTableBot(Bot):
@@ -37,32 +114,243 @@ class HashTableBot(Bot):
 
     DEFAULT_COOLDOWN_RATE = 2
     DEFAULT_COOLDOWN_TIME = 30
-
-    def __init__(self, token, initial_channels):
+    DEFAULT_PREFIX = "$"
+    PREFIX_CACHE_SIZE = 10_000
+    PREFIX_CACHE_TTL_IN_SECONDS = 60 * 60
+    TRANSLATION_CACHE_TTL_IN_SECONDS = 7 * 24 * 60 * 60
+    LEADERBOARD_SIZE = 5
+    MAX_LEADERBOARD_SIZE = 20
+    PARTITION_SYNC_INTERVAL_IN_SECONDS = 30
+
+    def __init__(
+        self,
+        token,
+        initial_channels,
+        balance_flush_interval_in_seconds: Optional[float] = None,
+        translation_cache_path: Optional[str] = None,
+        user_cache_warm_size: int = 0,
+        channels_per_connection: int = ChannelShards.DEFAULT_CHANNELS_PER_CONNECTION,
+        channel_partition: Optional[ChannelPartition] = None,
+        metrics_port: Optional[int] = None,
+        translation_backend: Optional[TranslationBackend] = None,
+    ):
         super().__init__(token=token, prefix=self._get_bot_prefix)
-        self._no_prefix_commands = (
-            DefaultNoPrefix("Robert", "NekoPray Robert"),
-            DefaultNoPrefix("NekoPray Robert", "NekoPray Robert"),
-            DefaultNoPrefix("elisElis elisTime", "elisElis elisTime"),
-            DefaultNoPrefix("elisElis", "elisElis"),
+        self._no_prefix_commands = NoPrefixCommandIndex(
+            (
+                DefaultNoPrefix("Robert", "NekoPray Robert"),
+                DefaultNoPrefix("NekoPray Robert", "NekoPray Robert"),
+                DefaultNoPrefix("elisElis elisTime", "elisElis elisTime"),
+                DefaultNoPrefix("elisElis", "elisElis"),
+            )
         )
+        # Maps channel name to the commands without a prefix added by its moderators
+        self._channel_no_prefix_commands: dict[str, NoPrefixCommandIndex] = dict()
         self._startup_time = datetime.now()
         self._chatting_message_reward = 1
-        self._initial_channels = initial_channels
+        # Channel names are lowercase, like the names returned by the Twitch API
+        self._initial_channels = [channel.lower() for channel in initial_channels]
         self._join_channel_message = ""
         self._pyramid_length_bounds = (1, 10)
-        self._translator = Translator()
-        self._duel_wait_until_go_in_seconds = 6
-        self._duel_timeout_in_seconds = 2
+        # Resolves user ids and names from the database, or with cached and batched Helix requests.
+        # twitchio's own user cache is skipped, since it scans every cached user on each lookup
+        self._user_resolver = UserResolver(
+            functools.partial(self.fetch_users, force=True),
+            fetch_stored_users=self._fetch_stored_users,
+        )
+        # Names of the users that chat, written behind in batches so they can be resolved locally
+        self._name_buffer = UserNameWriteBuffer()
+        self._translator = Translator(
+            backend=translation_backend,
+            cache=TranslationCache(
+                ttl=self.TRANSLATION_CACHE_TTL_IN_SECONDS,
+                database_path=translation_cache_path,
+            ),
+            user_resolver=self._user_resolver,
+        )
+        self._duel_manager = DuelManager(
+            wait_until_go_in_seconds=6, answer_timeout_in_seconds=2
+        )
+        # Maps channel name to the bot's command prefix in that channel
+        self._prefix_cache: LRUCache[str, str] = LRUCache(
+            max_size=self.PREFIX_CACHE_SIZE, ttl=self.PREFIX_CACHE_TTL_IN_SECONDS
+        )
+        # Balance changes written behind in batches instead of once per change, like chat rewards
+        self._balance_buffer = BalanceWriteBuffer(
+            balance_flush_interval_in_seconds
+            or BalanceWriteBuffer.DEFAULT_FLUSH_INTERVAL_IN_SECONDS
+        )
+        self._chat_rewards = ChatRewardEngine(
+            self._balance_buffer, reward=self._chatting_message_reward
+        )
+        # Commands never undo transactions, so no history is kept
+        self._bank = Bank(history_size=0)
+        # Rankings of the leaderboard commands, updated by every balance change
+        self._leaderboard = Leaderboard()
+        BotUserDao.balance_listeners.append(self._leaderboard.update_balances)
+        # Number of users loaded into the user cache at event_ready
+        self._user_cache_warm_size = user_cache_warm_size
+        # Workers share the account's rate limits with the other workers
+        process_count = channel_partition.count if channel_partition is not None else 1
+        # IRC connections the joined channels are spread across
+        # Sends the chat messages of every connection within Twitch's rate limits
+        self._message_scheduler = MessageScheduler(process_count=process_count)
+        self._channel_shards = ChannelShards(
+            self,
+            channels_per_connection,
+            join_rate_limiter=JoinRateLimiter(process_count=process_count),
+            message_scheduler=self._message_scheduler,
+        )
+        # Channels joined by this process when running as a worker, None to join every channel
+        self._channel_partition = channel_partition
+        self._partition_sync_task: Optional[asyncio.Task] = None
+        if channel_partition is not None:
+            # Other workers write users too, so they're always read from the database
+            bot_user_cache.enabled = False
+        # Serves the metrics over HTTP on localhost, None if they're not served
+        self._metrics_server = (
+            MetricsServer(metrics, metrics_port) if metrics_port is not None else None
+        )
+        # Messages waiting to be handled, in one queue per channel
+        self._message_queues = ChannelMessageQueues()
+        metrics.gauge(
+            "hashtablebot_outbound_queue_depth",
+            "Chat messages waiting to be sent by the message scheduler",
+            lambda: len(self._message_scheduler),
+        )
+        metrics.gauge(
+            "hashtablebot_message_queue_depth",
+            "Received messages waiting to be handled in the channel queues",
+            lambda: len(self._message_queues),
+        )
+        metrics.gauge(
+            "hashtablebot_message_queue_dropped_messages",
+            "Received messages dropped from full channel queues since the bot started",
+            lambda: self._message_queues.dropped,
+        )
 
     @staticmethod
-    async def _get_bot_prefix(_: Bot, message: Message):
+    async def _get_bot_prefix(bot: "HashTableBot", message: Message):
+        """
+        Return the command prefix for the message's channel.
+
+        Prefixes are loaded in bulk at event_ready, so this is usually a cache lookup.
+        The channel user and database are only queried when the channel is not cached.
+        """
+        channel_name = message.channel.name
+
+        if (prefix := bot._prefix_cache.get(channel_name)) is not None:
+            return prefix
+
         try:
             channel_id = (await message.channel.user()).id
-            return BotUserDao.get_by_id(channel_id).bot_command_prefix
+            channel_bot_user = await AsyncBotUserDao.get_by_id(channel_id)
+            prefix = channel_bot_user.bot_command_prefix or bot.DEFAULT_PREFIX
+        except NoResultFound:
+            prefix = bot.DEFAULT_PREFIX
         except Exception as e:
             logging.exception(e)
-            return "$"
+            return bot.DEFAULT_PREFIX
+
+        bot._prefix_cache.put(channel_name, prefix)
+        return prefix
+
+    async def _get_bot_user(self, user_id: int) -> BotUser:
+        """
+        Return the BotUser with user_id, including balance changes that were not written yet.
+
+        :raises: NoResultFound
+        """
+        user_id = int(user_id)
+
+        async def read() -> Optional[BotUser]:
+            try:
+                return await AsyncBotUserDao.get_by_id(user_id)
+            except NoResultFound:
+                return None
+
+        bot_user, pending_balances = await self._balance_buffer.read_with_pending(
+            read, (user_id,)
+        )
+        pending_balance = pending_balances[user_id]
+
+        if bot_user is None:
+            # The user only exists in the buffer until it's flushed
+            if not pending_balance:
+                raise NoResultFound(f"User {user_id} doesn't exist")
+            bot_user = BotUser(id=user_id)
+
+        # A copy is changed, so the pending changes are never written by update
+        return dataclasses.replace(bot_user, balance=bot_user.balance + pending_balance)
+
+    async def _get_bot_users(self, *user_ids: int) -> dict[int, BotUser]:
+        """
+        Return the BotUsers with user_ids fetched in a single query, including balance changes that
+        were not written yet. Users that don't exist are left out.
+
+        :return: dictionary mapping each found user id to its BotUser
+        """
+        int_user_ids = [int(user_id) for user_id in user_ids]
+        bot_users, pending_balances = await self._balance_buffer.read_with_pending(
+            functools.partial(AsyncBotUserDao.get_by_ids, int_user_ids), int_user_ids
+        )
+        id_to_bot_user = {bot_user.id: bot_user for bot_user in bot_users}
+
+        for user_id, pending_balance in pending_balances.items():
+            bot_user = id_to_bot_user.get(user_id)
+
+            # The user only exists in the buffer until it's flushed
+            if bot_user is None and not pending_balance:
+                continue
+            bot_user = bot_user or BotUser(id=user_id)
+
+            # A copy is changed, like in _get_bot_user
+            id_to_bot_user[user_id] = dataclasses.replace(
+                bot_user, balance=bot_user.balance + pending_balance
+            )
+
+        return id_to_bot_user
+
+    async def _execute_bank_transaction(self, transaction: Transaction, *user_ids: int):
+        """
+        Execute a transaction of PersistedBankUsers in the database thread pool.
+
+        Buffered balance changes of the users are written first, so the database
+        checks their balance with every change included.
+
+        :param transaction: the transaction to be executed
+        :param user_ids: ids of the users the transaction changes
+        :raises: NotEnoughCoinError
+        """
+        if any(self._balance_buffer.pending(int(user_id)) for user_id in user_ids):
+            await self._balance_buffer.flush()
+
+        await run_blocking(self._bank.execute, transaction)
+
+    async def close(self):
+        if self._partition_sync_task is not None:
+            self._partition_sync_task.cancel()
+
+        await self._message_queues.close()
+        await self._balance_buffer.close()
+        await self._name_buffer.close()
+        await self._channel_shards.close()
+        await self._message_scheduler.close()
+        # Waits for the translation cache's queued writes in another thread
+        await asyncio.get_running_loop().run_in_executor(None, self._translator.close)
+
+        if self._metrics_server is not None:
+            await self._metrics_server.close()
+
+        BotUserDao.balance_listeners.remove(self._leaderboard.update_balances)
+
+        logging.info(
+            f"User cache hit rate was {bot_user_cache.hit_rate:.1%} "
+            f"with {len(bot_user_cache)} of {bot_user_cache.max_size} users cached"
+        )
+
+        # A bot that never logged in, like the one of the benchmark, has no connection to close
+        if self._connection._keeper is not None:
+            await super().close()
 
     async def event_ready(self):
         """
@@ -71,33 +359,283 @@ class HashTableBot(Bot):
         logging.info(f"Logged in as {self.nick}")
         logging.info(f"User id is {self.user_id}")
 
-        joined_channel_bot_users = BotUserDao.get_all_joined_channels()
+        self._balance_buffer.start()
+        self._name_buffer.start()
 
-        joined_channel_ttv_users = await self.fetch_users(
-            ids=[bot_user.id for bot_user in joined_channel_bot_users]
-        )
+        if self._metrics_server is not None:
+            await self._metrics_server.start()
+
+        startup_start = time.perf_counter()
 
-        # Create database entries for channels without an existing one
-        channels_without_db_entry = set(self._initial_channels).difference(
-            [channel.name for channel in joined_channel_ttv_users]
+        with _log_duration("Loaded users from the database"):
+            joined_channel_bot_users, *_ = await asyncio.gather(
+                AsyncBotUserDao.get_all_joined_channels(),
+                self._load_leaderboard(self._leaderboard.load_size),
+                self._warm_user_cache(),
+            )
+
+        # Initial channels whose name is stored already have a database entry, so only the
+        # other ones are looked up. Workers only look up the initial channels they join
+        stored_channel_names = {
+            bot_user.login_name
+            for bot_user in joined_channel_bot_users
+            if bot_user.login_name
+        }
+        unknown_initial_channels = [
+            name
+            for name in self._initial_channels
+            if self._owns_channel(name) and name not in stored_channel_names
+        ]
+
+        with _log_duration("Looked up channels without a stored name"):
+            # Both lookups are fetched together by the user resolver
+            id_to_channel_name, name_to_initial_channel_user = await asyncio.gather(
+                self._get_channel_names(joined_channel_bot_users),
+                self._user_resolver.get_users_by_names(unknown_initial_channels),
+            )
+
+        # Create database entries for channels without an existing one.
+        # Workers only create the entries of their channels, so no entry is created twice
+        channels_without_db_entry = set(unknown_initial_channels).difference(
+            id_to_channel_name.values()
         )
-        if channels_without_db_entry:
-            new_channels = [
-                BotUser(id=user.id, bot_joined_channel=True)
-                for user in await self.fetch_users(
-                    names=list(channels_without_db_entry)
-                )
-            ]
+        new_channel_users = [
+            user
+            for name, user in name_to_initial_channel_user.items()
+            if name in channels_without_db_entry
+        ]
+
+        if new_channel_users:
             logging.info(
                 f"Added bot entries for initial channels: {', '.join(channels_without_db_entry)}"
             )
-            BotUserDao.save(*new_channels)
+            await AsyncBotUserDao.save(
+                *(
+                    BotUser(id=user.id, bot_joined_channel=True)
+                    for user in new_channel_users
+                )
+            )
+            # Saved separately, since the names may have to be taken from stale entries
+            await AsyncBotUserDao.save_names(
+                {user.id: (user.name, user.display_name) for user in new_channel_users}
+            )
+
+        with _log_duration("Loaded channel commands"):
+            await self._load_channel_no_prefix_commands(id_to_channel_name)
+
+        # Load the prefixes of every joined channel so prefix lookups don't need any I/O
+        self._prefix_cache.put_many(
+            (
+                id_to_channel_name[bot_user.id],
+                bot_user.bot_command_prefix or self.DEFAULT_PREFIX,
+            )
+            for bot_user in joined_channel_bot_users
+            if bot_user.id in id_to_channel_name
+        )
+        self._prefix_cache.put_many(
+            (name, self.DEFAULT_PREFIX) for name in channels_without_db_entry
+        )
 
         # Use a set to remove any duplicate names
-        names = {ttv_user.name for ttv_user in joined_channel_ttv_users}
-        names = names.union(self._initial_channels)
+        names = set(id_to_channel_name.values()).union(self._initial_channels)
+
+        if self._channel_partition is not None:
+            self._partition_sync_task = asyncio.create_task(
+                self._sync_partition_channels_periodically()
+            )
+
+        with _log_duration("Joined channels"):
+            await self._channel_shards.join(*filter(self._owns_channel, names))
+
+        logging.info(
+            f"Started up with {len(self._channel_shards)} channels "
+            f"in {time.perf_counter() - startup_start:.2f}s"
+        )
+
+    async def _warm_user_cache(self):
+        if self._user_cache_warm_size and bot_user_cache.enabled:
+            await AsyncBotUserDao.warm_cache(self._user_cache_warm_size)
+
+    async def _get_channel_names(self, bot_users: list[BotUser]) -> dict[int, str]:
+        """
+        Return the names of the users' channels. Only the users without a stored name are
+        looked up, and the names found are stored for the next time.
+
+        :return: dictionary mapping user ids to channel names, leaving out the users that
+            no longer exist
+        """
+        id_to_channel_name = {
+            bot_user.id: bot_user.login_name
+            for bot_user in bot_users
+            if bot_user.login_name
+        }
+        id_to_ttv_user = await self._user_resolver.get_users_by_ids(
+            bot_user.id for bot_user in bot_users if not bot_user.login_name
+        )
+
+        if id_to_ttv_user:
+            await AsyncBotUserDao.save_names(
+                {
+                    user_id: (ttv_user.name, ttv_user.display_name)
+                    for user_id, ttv_user in id_to_ttv_user.items()
+                }
+            )
+            id_to_channel_name.update(
+                (user_id, ttv_user.name) for user_id, ttv_user in id_to_ttv_user.items()
+            )
+
+        return id_to_channel_name
+
+    @staticmethod
+    async def _fetch_stored_users(
+        ids: list[int], names: list[str]
+    ) -> list[ResolvedUser]:
+        """
+        Return the users among ids and names whose names are stored in the database,
+        so they're resolved without requesting Helix.
+        """
+        bot_users = []
+
+        if ids:
+            bot_users.extend(await AsyncBotUserDao.get_by_ids(ids))
+        if names:
+            bot_users.extend(await AsyncBotUserDao.get_by_login_names(names))
+
+        return [
+            ResolvedUser(
+                bot_user.id,
+                bot_user.login_name,
+                bot_user.display_name or bot_user.login_name,
+            )
+            for bot_user in bot_users
+            if bot_user.login_name
+        ]
+
+    def _owns_channel(self, channel_name: str) -> bool:
+        """
+        :return: whether this process joins the channel, always True unless running as a worker
+        """
+        return self._channel_partition is None or self._channel_partition.owns(
+            channel_name
+        )
+
+    async def _sync_partition_channels_periodically(self):
+        """
+        Join and part the channels of the worker's partition, since join and leave commands
+        are handled by the worker that owns the channel the command was sent in.
+        """
+        while True:
+            await asyncio.sleep(self.PARTITION_SYNC_INTERVAL_IN_SECONDS)
+
+            try:
+                await self._sync_partition_channels()
+            except Exception as e:
+                logging.exception(e)
+
+    async def _sync_partition_channels(self):
+        joined_channel_bot_users = await AsyncBotUserDao.get_all_joined_channels()
+        names = set((await self._get_channel_names(joined_channel_bot_users)).values())
+        names = set(filter(self._owns_channel, names.union(self._initial_channels)))
+
+        await self._channel_shards.part(
+            *(name for name in self._channel_shards if name not in names)
+        )
+        await self._channel_shards.join(*names)
+
+    async def _load_channel_no_prefix_commands(
+        self, id_to_channel_name: dict[int, str]
+    ):
+        """
+        Load the commands without a prefix of every channel into memory,
+        so finding the command invoked by a message doesn't need any I/O.
+
+        The indexes are built before replacing the current ones, so messages
+        keep being handled with the old commands while loading.
+
+        :param id_to_channel_name: dictionary mapping channel user ids to channel names
+        """
+        channel_indexes: dict[str, NoPrefixCommandIndex] = dict()
+
+        for command in await AsyncChannelNoPrefixCommandDao.get_by_channel_ids(
+            id_to_channel_name
+        ):
+            channel_name = id_to_channel_name[command.channel_id]
+            channel_indexes.setdefault(channel_name, NoPrefixCommandIndex()).add(
+                command.to_no_prefix_command()
+            )
+
+        self._channel_no_prefix_commands = channel_indexes
+        logging.info(
+            f"Loaded commands without a prefix of {len(channel_indexes)} channels"
+        )
+
+    async def _load_leaderboard(self, limit: int):
+        """
+        Load the limit users with the highest balances into the leaderboard.
+        """
+        self._leaderboard.load(
+            await AsyncBotUserDao.get_until_limit_order_by_balance_desc(limit), limit
+        )
+
+    async def _get_leaderboard(
+        self, size: int, channel_name: Optional[str] = None
+    ) -> str:
+        """
+        Return the leaderboard message, answered from memory unless users have to be loaded.
+
+        :param size: number of users in the leaderboard
+        :param channel_name: channel whose chatters are ranked, None to rank every user
+        """
+        size = min(max(size, 1), self.MAX_LEADERBOARD_SIZE)
+
+        if self._channel_partition is not None:
+            # Other workers change balances too, so rankings are read from the database
+            self._leaderboard.forget_balances()
+
+        entries = self._leaderboard.top(size, channel_name)
+
+        if entries is None:
+            if channel_name is None:
+                await self._load_leaderboard(max(size, self._leaderboard.load_size))
+            else:
+                unknown_ids = self._leaderboard.unknown_channel_members(channel_name)
+                # Users without an entry don't have any coins
+                balances = dict.fromkeys(unknown_ids, 0)
+                balances.update(
+                    (bot_user.id, bot_user.balance)
+                    for bot_user in await AsyncBotUserDao.get_by_ids(unknown_ids)
+                )
+                self._leaderboard.update_balances(balances)
+
+            entries = self._leaderboard.top(size, channel_name) or []
+
+        id_to_name = {
+            user_id: user.display_name
+            for user_id, user in (
+                await self._user_resolver.get_users_by_ids(
+                    user_id for user_id, _ in entries
+                )
+            ).items()
+        }
+
+        return " ".join(
+            f"{i}. {id_to_name.get(user_id, user_id)}: {balance}"
+            for i, (user_id, balance) in enumerate(entries, start=1)
+        )
+
+    def _find_no_prefix_command(self, message: Message) -> Optional[NoPrefixCommand]:
+        """
+        Return the command without a prefix invoked by the message, if any.
+        Commands of the message's channel take precedence over the default ones.
+        """
+        channel_index = self._channel_no_prefix_commands.get(message.channel.name)
+
+        if channel_index is not None and (
+            command := channel_index.find(message.content)
+        ):
+            return command
 
-        await self.join_channels(list(names))
+        return self._no_prefix_commands.find(message.content)
 
     async def event_channel_joined(self, channel: Channel):
         """
@@ -112,10 +650,31 @@ class HashTableBot(Bot):
         if self._join_channel_message:
             await channel.send(f"{self._join_channel_message}")
 
+    async def global_before_invoke(self, ctx: commands.Context):
+        """
+        Called before every command is invoked.
+        """
+        ctx.invoked_at = time.perf_counter()
+
+    async def global_after_invoke(self, ctx: commands.Context):
+        """
+        Called after every command is invoked, even if it raised.
+        """
+        command_duration.observe(time.perf_counter() - ctx.invoked_at, ctx.command.name)
+
+    async def event_userstate(self, user: Chatter):
+        """
+        Event called when the bot joins a channel or sends a message, with the bot's badges in the channel.
+        """
+        self._message_scheduler.set_privileged(
+            user.channel.name, user.is_mod or user.is_vip
+        )
+
     async def event_message(self, message: Message):
         """
         Event called when a message is received.
-        Used to check for commands without a prefix and give point rewards.
+        Gives point rewards and takes duel answers right away, then queues the commands and
+        translations in the channel's message queue.
 
         :param message:
         """
@@ -123,14 +682,62 @@ class HashTableBot(Bot):
         if message.echo:
             return
 
-        # Process command-decorated functions and custom commands with no prefix
-        invoked_no_prefix_command = False
+        messages_processed.inc()
+
+        if message.author is not None:
+            self._user_resolver.remember(
+                message.author.id, message.author.name, message.author.display_name
+            )
+            self._name_buffer.add(
+                message.author.id, message.author.name, message.author.display_name
+            )
+            self._leaderboard.add_channel_member(
+                message.channel.name, message.author.id
+            )
+            self._chat_rewards.reward_message(message.channel.name, message.author.id)
+
+        # Answers to duels are not handled as commands
+        if self._duel_manager.dispatch(message):
+            return
+
+        no_prefix_command = self._find_no_prefix_command(message)
+        # Channels whose prefix isn't cached could be using any prefix
+        prefix = self._prefix_cache.get(message.channel.name)
+        may_be_command = (
+            no_prefix_command is not None
+            or prefix is None
+            or message.content.startswith(prefix)
+        )
+
+        # Other chat messages only have work left if they're translated
+        if not may_be_command and (
+            message.author is None
+            or not self._translator.is_translated(
+                message.channel.name, message.author.id
+            )
+        ):
+            return
+
+        # When the channel's queue is full, translations are dropped before commands
+        await self._message_queues.put(
+            message.channel.name,
+            functools.partial(self._handle_message, message, no_prefix_command),
+            droppable=not may_be_command,
+        )
+
+    async def _handle_message(
+        self, message: Message, no_prefix_command: Optional[NoPrefixCommand]
+    ):
+        """
+        Respond to the command without a prefix, handle the message as a command or translate it,
+        called by the channel's message queue.
 
-        for cmd in self._no_prefix_commands:
-            if await cmd.is_a_match(message):
-                invoked_no_prefix_command = True
-                await cmd.respond(message)
-                break
+        :param no_prefix_command: command without a prefix matching the message, if any
+        """
+        invoked_no_prefix_command = no_prefix_command is not None
+
+        if invoked_no_prefix_command:
+            await no_prefix_command.respond(message)
 
         message_is_not_command = (
             not invoked_no_prefix_command
@@ -157,8 +764,8 @@ class HashTableBot(Bot):
         per=DEFAULT_COOLDOWN_TIME,
         bucket=commands.Bucket.channel,
     )
-    @commands.command()
-    async def bonk(self, ctx: commands.Context, target: User):
+    @commands.command(cls=_UserConvertingCommand)
+    async def bonk(self, ctx: commands.Context, target: ResolvedUser):
         """
         Command to bonk the target user(pings the user with some bonk emotes)
         :param ctx:
@@ -180,7 +787,7 @@ class HashTableBot(Bot):
         author: BotUser
 
         try:
-            author = BotUserDao.get_by_id(int(ctx.author.id))
+            author = await AsyncBotUserDao.get_by_id(int(ctx.author.id))
         except NoResultFound:
             author = BotUser(id=int(ctx.author.id))
 
@@ -189,9 +796,15 @@ class HashTableBot(Bot):
             return
 
         author.bot_joined_channel = True
-        BotUserDao.update(author)
+        await AsyncBotUserDao.update(author)
+        # Saved separately, since the name may have to be taken from a stale entry
+        await AsyncBotUserDao.save_names(
+            {author.id: (ctx.author.name, ctx.author.display_name)}
+        )
 
-        await self.join_channels((ctx.author.name,))
+        # Otherwise the worker that owns the channel joins it when it syncs its channels
+        if self._owns_channel(ctx.author.name):
+            await self._channel_shards.join(ctx.author.name)
         await ctx.reply(f"joined channel '{ctx.author.name}'")
 
     @commands.cooldown(
@@ -218,15 +831,103 @@ class HashTableBot(Bot):
         channel_bot_user: BotUser
 
         try:
-            channel_bot_user = BotUserDao.get_by_id(int(channel_ttv_user.id))
+            channel_bot_user = await AsyncBotUserDao.get_by_id(int(channel_ttv_user.id))
         except NoResultFound:
             channel_bot_user = BotUser(id=int(ctx.author.id))
 
         channel_bot_user.bot_command_prefix = prefix
-        BotUserDao.update(channel_bot_user)
+        await AsyncBotUserDao.update(channel_bot_user)
+        self._prefix_cache.put(ctx.channel.name, prefix)
 
         await ctx.reply(f"prefix set to '{prefix}'.")
 
+    @commands.cooldown(
+        rate=DEFAULT_COOLDOWN_RATE,
+        per=DEFAULT_COOLDOWN_TIME,
+        bucket=commands.Bucket.channel,
+    )
+    @commands.command()
+    async def addtrigger(self, ctx: commands.Context, names: str, *response_words):
+        """
+        Add a command without a prefix to this channel, replacing the one with the same names.
+        Multiple names have to be quoted, like: addtrigger "elisElis elisTime" elisTime
+
+        :param ctx:
+        :param names: words a message has to start with to invoke the command
+        :param response_words: words of the message the bot responds with
+        """
+        if not is_bot_admin_or_mod(ctx.author):
+            await ctx.reply("only moderators are allowed to add triggers.")
+            return
+
+        names = " ".join(names.split())
+        response = " ".join(response_words)
+
+        if not names or not response:
+            await ctx.reply("the trigger and its response can't be empty.")
+            return
+
+        # Twitch runs messages starting with these as chat commands, like /ban or .timeout
+        if response.startswith(("/", ".")):
+            await ctx.reply("the response can't be a chat command.")
+            return
+
+        try:
+            channel_ttv_user = await ctx.channel.user()
+        except Exception as e:
+            logging.exception(e)
+            await ctx.reply("could not fetch channel user.")
+            return
+
+        command = ChannelNoPrefixCommand(
+            channel_id=int(channel_ttv_user.id), names=names, response=response
+        )
+        await AsyncChannelNoPrefixCommandDao.save(command)
+        self._channel_no_prefix_commands.setdefault(
+            ctx.channel.name, NoPrefixCommandIndex()
+        ).add(command.to_no_prefix_command())
+
+        await ctx.reply(f"added trigger '{names}'.")
+
+    @commands.cooldown(
+        rate=DEFAULT_COOLDOWN_RATE,
+        per=DEFAULT_COOLDOWN_TIME,
+        bucket=commands.Bucket.channel,
+    )
+    @commands.command()
+    async def removetrigger(self, ctx: commands.Context, names: str):
+        """
+        Remove a command without a prefix from this channel.
+        Multiple names have to be quoted, like: removetrigger "elisElis elisTime"
+
+        :param ctx:
+        :param names: words a message has to start with to invoke the command
+        """
+        if not is_bot_admin_or_mod(ctx.author):
+            await ctx.reply("only moderators are allowed to remove triggers.")
+            return
+
+        names = " ".join(names.split())
+
+        try:
+            channel_ttv_user = await ctx.channel.user()
+        except Exception as e:
+            logging.exception(e)
+            await ctx.reply("could not fetch channel user.")
+            return
+
+        if not await AsyncChannelNoPrefixCommandDao.delete(
+            int(channel_ttv_user.id), names
+        ):
+            await ctx.reply(f"there is no trigger '{names}'.")
+            return
+
+        channel_index = self._channel_no_prefix_commands.get(ctx.channel.name)
+        if channel_index is not None:
+            channel_index.remove(names.split(" "))
+
+        await ctx.reply(f"removed trigger '{names}'.")
+
     @commands.cooldown(
         rate=DEFAULT_COOLDOWN_RATE,
         per=DEFAULT_COOLDOWN_TIME,
@@ -238,17 +939,18 @@ class HashTableBot(Bot):
         Leave message author's channel. The joined status is persisted.
         """
         try:
-            author: BotUser = BotUserDao.get_by_id(int(ctx.author.id))
+            author: BotUser = await AsyncBotUserDao.get_by_id(int(ctx.author.id))
             assert author.bot_joined_channel is True
         except (NoResultFound, AssertionError):
             await ctx.reply("I have not joined your channel.")
             return
 
         author.bot_joined_channel = False
-        BotUserDao.update(author)
+        await AsyncBotUserDao.update(author)
 
         await ctx.reply(f"left channel '{ctx.author.name}'.")
-        await self.part_channels((ctx.author.name,))
+        if self._owns_channel(ctx.author.name):
+            await self._channel_shards.part(ctx.author.name)
 
     @commands.cooldown(
         rate=DEFAULT_COOLDOWN_RATE,
@@ -264,7 +966,7 @@ class HashTableBot(Bot):
         :return:
         """
         try:
-            author: BotUser = BotUserDao.get_by_id(int(ctx.author.id))
+            author: BotUser = await self._get_bot_user(ctx.author.id)
         except NoResultFound as e:
             # If the user is not in the database, they have no coin
             exception = NotEnoughCoinError(e)
@@ -279,13 +981,19 @@ class HashTableBot(Bot):
             logging.exception(e)
             return
 
+        bank_user = PersistedBankUser.from_bot_user(author)
+
         try:
             if random.randint(0, 1):
-                Bank().execute(Deposit(bank_user=author, amount=amount))
-                message = f"{ctx.author.name} won {amount} coins elisCoin !!! POGGERS They now have {author.balance}"
+                await self._execute_bank_transaction(
+                    Deposit(bank_user=bank_user, amount=amount), bank_user.id
+                )
+                message = f"{ctx.author.name} won {amount} coins elisCoin !!! POGGERS They now have {bank_user.balance}"
             else:
-                Bank().execute(Withdrawal(bank_user=author, amount=amount))
-                message = f"{ctx.author.name} lost {amount} coins...  peepoSad They now have {author.balance}"
+                await self._execute_bank_transaction(
+                    Withdrawal(bank_user=bank_user, amount=amount), bank_user.id
+                )
+                message = f"{ctx.author.name} lost {amount} coins...  peepoSad They now have {bank_user.balance}"
 
         except ExceptionWithChatMessage as e:
             await ctx.reply(e.get_chat_message())
@@ -296,7 +1004,6 @@ class HashTableBot(Bot):
             logging.exception(e)
             return
 
-        BotUserDao.update(author)
         await ctx.send(message)
 
     @commands.cooldown(
@@ -304,8 +1011,10 @@ class HashTableBot(Bot):
         per=DEFAULT_COOLDOWN_TIME,
         bucket=commands.Bucket.channel,
     )
-    @commands.command(aliases=["eliscoin", "points", "coin", "coins"])
-    async def eliscoins(self, ctx: commands.Context, target: User = None):
+    @commands.command(
+        cls=_UserConvertingCommand, aliases=["eliscoin", "points", "coin", "coins"]
+    )
+    async def eliscoins(self, ctx: commands.Context, target: ResolvedUser = None):
         """
         Tells you how many coins the target user has.
         If no target was specified, tells how many the author has.
@@ -317,7 +1026,7 @@ class HashTableBot(Bot):
             target = ctx.message.author
 
         try:
-            author: BotUser = BotUserDao.get_by_id(target.id)
+            author: BotUser = await self._get_bot_user(target.id)
         except NoResultFound:
             eliscoins = 0
         else:
@@ -337,23 +1046,28 @@ class HashTableBot(Bot):
         per=DEFAULT_COOLDOWN_TIME,
         bucket=commands.Bucket.channel,
     )
-    @commands.command()
-    async def setpoints(self, ctx: commands.Context, target_user: User, amount: int):
+    @commands.command(cls=_UserConvertingCommand)
+    async def setpoints(
+        self, ctx: commands.Context, target_user: ResolvedUser, amount: int
+    ):
         if not ctx.author.is_mod:
             await ctx.reply("you're not a moderator...")
             return
 
         target_bot_user: BotUser
 
+        # Buffered changes would be added on top of the new balance
+        await self._balance_buffer.flush()
+
         try:
-            target_bot_user = BotUserDao.get_by_id(target_user.id)
+            target_bot_user = await AsyncBotUserDao.get_by_id(target_user.id)
         except NoResultFound:
             # If the target user doesn't exist, we should create it
             target_bot_user = BotUser(id=target_user.id)
 
         target_bot_user.balance = amount
 
-        BotUserDao.update(target_bot_user)
+        await AsyncBotUserDao.update(target_bot_user)
 
         await ctx.send(f"{ctx.message.author.name} now has {amount} points!")
 
@@ -363,25 +1077,41 @@ class HashTableBot(Bot):
         bucket=commands.Bucket.channel,
     )
     @commands.command(aliases=["leaderboards", "lb"])
-    async def leaderboard(self, ctx: commands.Context):
-        bot_users: list[BotUser] = BotUserDao.get_until_limit_order_by_balance_desc(5)
-        twitch_users: list[User] = await self.fetch_users(
-            ids=[user.id for user in bot_users]
-        )
-        id_to_name = {user.id: user.name for user in twitch_users}
-        leaderboard_list = [
-            f"{i}. {id_to_name[bot_user.id]}: {bot_user.balance}"
-            for i, bot_user in enumerate(bot_users, start=1)
-        ]
-        await ctx.send(" ".join(leaderboard_list))
+    async def leaderboard(self, ctx: commands.Context, size: int = LEADERBOARD_SIZE):
+        """
+        Send the users with the most coins
+        :param ctx:
+        :param size: number of users in the leaderboard, at most MAX_LEADERBOARD_SIZE
+        :return:
+        """
+        await ctx.send(await self._get_leaderboard(size))
 
     @commands.cooldown(
         rate=DEFAULT_COOLDOWN_RATE,
         per=DEFAULT_COOLDOWN_TIME,
         bucket=commands.Bucket.channel,
     )
-    @commands.command()
-    async def give(self, ctx: commands.Context, target_user: User, amount_str: str):
+    @commands.command(aliases=["channelleaderboards", "clb"])
+    async def channelleaderboard(
+        self, ctx: commands.Context, size: int = LEADERBOARD_SIZE
+    ):
+        """
+        Send the users with the most coins among the ones that chatted in this channel since the bot started
+        :param ctx:
+        :param size: number of users in the leaderboard, at most MAX_LEADERBOARD_SIZE
+        :return:
+        """
+        await ctx.send(await self._get_leaderboard(size, ctx.channel.name))
+
+    @commands.cooldown(
+        rate=DEFAULT_COOLDOWN_RATE,
+        per=DEFAULT_COOLDOWN_TIME,
+        bucket=commands.Bucket.channel,
+    )
+    @commands.command(cls=_UserConvertingCommand)
+    async def give(
+        self, ctx: commands.Context, target_user: ResolvedUser, amount_str: str
+    ):
         """
         Give the amount of coins to the target user
         :param ctx:
@@ -392,7 +1122,7 @@ class HashTableBot(Bot):
         author_id = ctx.message.author.id
 
         try:
-            author_bot_user: BotUser = BotUserDao.get_by_id(author_id)
+            author_bot_user: BotUser = await self._get_bot_user(author_id)
         except NoResultFound as e:
             # If the user is not in the database, they have no coin
             exception = NotEnoughCoinError(e)
@@ -407,24 +1137,22 @@ class HashTableBot(Bot):
             await ctx.reply(e.get_chat_message())
             return
 
-        target_bot_user: BotUser
+        # The target user is created by the transfer if it doesn't exist
+        from_bank_user = PersistedBankUser.from_bot_user(author_bot_user)
+        to_bank_user = PersistedBankUser(
+            id=int(target_user.id), display_name=target_user.display_name
+        )
 
         try:
-            target_bot_user = BotUserDao.get_by_id(target_user.id)
-        except NoResultFound:
-            # If the target user doesn't exist, we should create it
-            target_bot_user = BotUser(id=target_user.id)
-
-        Bank().execute(
-            Batch(
-                [
-                    Withdrawal(bank_user=author_bot_user, amount=amount),
-                    Deposit(bank_user=target_bot_user, amount=amount),
-                ]
+            await self._execute_bank_transaction(
+                Transfer(from_bank_user, to_bank_user, amount),
+                from_bank_user.id,
+                to_bank_user.id,
             )
-        )
-
-        BotUserDao.update(target_bot_user, author_bot_user)
+        except ExceptionWithChatMessage as e:
+            logging.exception(e)
+            await ctx.reply(e.get_chat_message())
+            return
 
         await ctx.send(
             f"{ctx.message.author.name} gave {amount} elisCoin to {target_user.name} POGGERS"
@@ -450,6 +1178,10 @@ class HashTableBot(Bot):
             commands_name_list += [
                 f"'{' '.join(cmd.names)}'" for cmd in self._no_prefix_commands
             ]
+            commands_name_list += [
+                f"'{' '.join(cmd.names)}'"
+                for cmd in self._channel_no_prefix_commands.get(ctx.channel.name, ())
+            ]
             await ctx.reply(f" Commands: {', '.join(commands_name_list)}.")
         except Exception as e:
             logging.exception(e)
@@ -470,8 +1202,10 @@ class HashTableBot(Bot):
         per=DEFAULT_COOLDOWN_TIME,
         bucket=commands.Bucket.channel,
     )
-    @commands.command()
-    async def duel(self, ctx: commands.Context, duel_target: User, amount_str: str):
+    @commands.command(cls=_UserConvertingCommand)
+    async def duel(
+        self, ctx: commands.Context, duel_target: ResolvedUser, amount_str: str
+    ):
         """
         Duel with target user on rock, paper scissors
         :param ctx:
@@ -479,13 +1213,14 @@ class HashTableBot(Bot):
         :param amount_str:
         :return:
         """
-        author_id = ctx.message.author.id
+        author_id, duel_target_id = int(ctx.message.author.id), int(duel_target.id)
+        id_to_bot_user = await self._get_bot_users(author_id, duel_target_id)
 
         try:
-            author_bot_user: BotUser = BotUserDao.get_by_id(author_id)
-        except NoResultFound as e:
+            author_bot_user: BotUser = id_to_bot_user[author_id]
+        except KeyError:
             # If the user is not in the database, they have no coin
-            exception = NotEnoughCoinError(e)
+            exception = NotEnoughCoinError(f"User {author_id} is not in the database")
             logging.exception(exception)
             await ctx.reply(exception.get_chat_message())
             return
@@ -497,13 +1232,10 @@ class HashTableBot(Bot):
             await ctx.reply(e.get_chat_message())
             return
 
-        duel_target_bot_user: BotUser
-
-        try:
-            duel_target_bot_user = BotUserDao.get_by_id(duel_target.id)
-        except NoResultFound:
-            # If the target user doesn't exist, we should create it
-            duel_target_bot_user = BotUser(id=duel_target.id)
+        # If the target user doesn't exist, it's created by the transfer to the winner
+        duel_target_bot_user = id_to_bot_user.get(
+            duel_target_id, BotUser(id=duel_target_id)
+        )
 
         for bot_user, name in (duel_target_bot_user, duel_target.name), (
             author_bot_user,
@@ -513,42 +1245,25 @@ class HashTableBot(Bot):
                 await ctx.reply(f"user {name} only has {bot_user.balance} points!")
                 return
 
-        valid_answers = "rock", "paper", "scissors"
-        await ctx.send(
-            f"@{duel_target.name} @{ctx.author.name} write your answer as {', '.join(valid_answers)} "
-            f"and wait until I say GO to sent it."
-        )
-
-        time.sleep(self._duel_wait_until_go_in_seconds)
-
-        await ctx.send("GO!!!!!!!!!!!!!!!!!!")
-
-        target_answer = None
-        author_answer = None
-
-        def store_answer(msg: Message):
-            nonlocal target_answer
-            nonlocal author_answer
-
-            if msg.echo:
-                return False
-
-            if msg.author.id == str(duel_target.id):
-                target_answer = msg.content.lower()
-                logging.debug(f"target answer set to {target_answer}")
-            elif msg.author.id == ctx.author.id:
-                author_answer = msg.content.lower()
-                logging.debug(f"author answer set to {author_answer}")
-
-            return target_answer and author_answer
-
-        timeout_time = self._duel_timeout_in_seconds
+        valid_answers = DuelManager.VALID_ANSWERS
 
         try:
-            await self.wait_for("message", store_answer, timeout=timeout_time)
-        except TimeoutError:
+            author_answer, target_answer = await self._duel_manager.run(
+                ctx.channel.name,
+                ctx.author.id,
+                duel_target.id,
+                ctx.send,
+                prompt=f"@{duel_target.name} @{ctx.author.name} write your answer as {', '.join(valid_answers)} "
+                f"and wait until I say GO to send it.",
+            )
+        except ExceptionWithChatMessage as e:
+            logging.exception(e)
+            await ctx.reply(e.get_chat_message())
+            return
+
+        if author_answer is None or target_answer is None:
             await ctx.send(
-                f"Answers were not given in {timeout_time} seconds, duel cancelled."
+                f"Answers were not given in {self._duel_manager.answer_timeout_in_seconds} seconds, duel cancelled."
             )
 
         for name, answer in (duel_target.name, target_answer), (
@@ -569,35 +1284,30 @@ class HashTableBot(Bot):
 
         wins = {("rock", "scissors"), ("paper", "rock"), ("scissors", "paper")}
 
-        answer = author_answer, target_answer
-        author_won = answer in wins
-
-        if author_won:
-            Bank().execute(
-                Batch(
-                    [
-                        Deposit(bank_user=author_bot_user, amount=amount),
-                        Withdrawal(bank_user=duel_target_bot_user, amount=amount),
-                    ]
-                )
-            )
+        answers = author_answer, target_answer
+        author_won = answers in wins
 
-            BotUserDao.update(duel_target_bot_user, author_bot_user)
+        author_bank_user = PersistedBankUser.from_bot_user(author_bot_user)
+        target_bank_user = PersistedBankUser.from_bot_user(duel_target_bot_user)
 
-            await ctx.send(f"@{ctx.author.name} won the duel and got {amount} points!")
+        if author_won:
+            winner_name, loser_name = ctx.author.name, duel_target.name
+            transfer = Transfer(target_bank_user, author_bank_user, amount)
         else:
-            Bank().execute(
-                Batch(
-                    [
-                        Withdrawal(bank_user=author_bot_user, amount=amount),
-                        Deposit(bank_user=duel_target_bot_user, amount=amount),
-                    ]
-                )
-            )
+            winner_name, loser_name = duel_target.name, ctx.author.name
+            transfer = Transfer(author_bank_user, target_bank_user, amount)
 
-            BotUserDao.update(duel_target_bot_user, author_bot_user)
+        try:
+            # Balances may have changed while waiting for answers, the database checks them again
+            await self._execute_bank_transaction(
+                transfer, author_bank_user.id, target_bank_user.id
+            )
+        except ExceptionWithChatMessage as e:
+            logging.exception(e)
+            await ctx.send(f"@{loser_name} {e.get_chat_message()}")
+            return
 
-            await ctx.send(f"@{duel_target.name} won the duel and got {amount} points!")
+        await ctx.send(f"@{winner_name} won the duel and got {amount} points!")
 
     @commands.cooldown(
         rate=DEFAULT_COOLDOWN_RATE,
@@ -606,8 +1316,9 @@ class HashTableBot(Bot):
     )
     @commands.command()
     async def catarrive(self, ctx: commands.Context, emote: str):
-        for message in ("catArrive", emote, "catLeave"):
-            await ctx.send(message)
+        with message_priority(Priority.BULK):
+            for message in ("catArrive", emote, "catLeave"):
+                await ctx.send(message)
 
     @commands.cooldown(
         rate=DEFAULT_COOLDOWN_RATE,
@@ -617,8 +1328,9 @@ class HashTableBot(Bot):
     @commands.command()
     async def padoru(self, ctx: commands.Context, emote: str):
         lyrics = "HASHIRE SORI YO", "KAZE NO YOU NI", "TSUKIMIHARA WO", "PADORU PADORU"
-        for line in lyrics:
-            await ctx.send(f"/me {emote} {line} {emote}")
+        with message_priority(Priority.BULK):
+            for line in lyrics:
+                await ctx.send(f"/me {emote} {line} {emote}")
 
     @commands.cooldown(
         rate=DEFAULT_COOLDOWN_RATE,
@@ -643,14 +1355,12 @@ class HashTableBot(Bot):
 
         first_half = [" ".join([emote] * i) for i in range(1, length + 1)]
 
-        for line in first_half:
-            await ctx.send(line)
-
         reversed_iter = reversed(first_half)
         next(reversed_iter)
 
-        for line in reversed_iter:
-            await ctx.send(line)
+        with message_priority(Priority.BULK):
+            for line in (*first_half, *reversed_iter):
+                await ctx.send(line)
 
     @commands.cooldown(
         rate=DEFAULT_COOLDOWN_RATE,
@@ -665,7 +1375,7 @@ class HashTableBot(Bot):
             uptime.seconds // 3600,
             (uptime.seconds // 60) % 60,
         )
-        n_channels = len(self.connected_channels)
+        n_channels = len(self._channel_shards)
         await ctx.reply(
             f"Pong! Uptime: {days}d{hours}h{minutes}m  | Channels: {n_channels}"
         )
@@ -673,13 +1383,21 @@ class HashTableBot(Bot):
     @commands.command()
     async def shutdown(self, ctx: commands.Context):
         """
-        Turn off the bot
+        Turn off the bot. Workers ask the worker coordinator to stop every worker instead,
+        which closes each of them.
         :param ctx:
         :return:
         """
         try:
             if is_bot_admin(ctx.author):
                 await ctx.reply("elisLost bye")
+
+                if self._channel_partition is not None:
+                    os.kill(os.getppid(), signal.SIGTERM)
+                    return
+
+                await self._balance_buffer.close()
+                await self._name_buffer.close()
                 sys.exit(0)
         except Exception as e:
             logging.exception(e)
@@ -0,0 +1,324 @@
+import asyncio
+import functools
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Iterable, Iterator, Optional
+
+from twitchio import Client
+from twitchio.websocket import WSConnection
+
+from hashtablebot.message_scheduler import MessageScheduler
+
+
+class JoinRateLimiter:
+    """
+    Limits the channels joined by every connection of the bot to max_joins per period_in_seconds,
+    Twitch's limit for an account. Joins over the limit wait for the oldest join to expire.
+
+    Processes sharing the account, like workers, each get an equal share of the limit by passing
+    their number as process_count.
+    """
+
+    DEFAULT_MAX_JOINS = 20
+    DEFAULT_PERIOD_IN_SECONDS = 10.0
+
+    def __init__(
+        self,
+        max_joins: int = DEFAULT_MAX_JOINS,
+        period_in_seconds: float = DEFAULT_PERIOD_IN_SECONDS,
+        process_count: int = 1,
+    ):
+        """
+        :param process_count: number of processes joining channels with the same account
+        """
+        # At least one join is allowed, over a longer period if there are more processes than joins
+        shared_max_joins = max(1, max_joins // process_count)
+        self.max_joins = shared_max_joins
+        self.period_in_seconds = (
+            period_in_seconds * shared_max_joins * process_count / max_joins
+        )
+        # time.monotonic of the last max_joins joins, from oldest to newest
+        self._join_times: deque[float] = deque(maxlen=self.max_joins)
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """
+        Wait until another channel can be joined without going over the limit.
+        """
+        async with self._lock:
+            if len(self._join_times) == self.max_joins:
+                delay = self._join_times[0] + self.period_in_seconds - time.monotonic()
+
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            self._join_times.append(time.monotonic())
+
+
+class ShardConnection(WSConnection):
+    """
+    IRC connection holding some of the bot's channels.
+
+    Its channels are joined by ChannelShards instead of twitchio, which only rejoins the channels
+    given when the connection was created, so they're joined again through the rate limiter every
+    time the connection reconnects. Messages are dispatched to the bot like the ones of its main
+    connection, except for the ready event, so event_ready only runs once.
+
+    Chat messages sent through the connection, with send, reply or twitchio's Channel and
+    Context methods that call them, are sent by the message scheduler.
+    """
+
+    def __init__(
+        self,
+        *,
+        on_connect: Callable[["ShardConnection"], Awaitable[None]],
+        message_scheduler: Optional[MessageScheduler] = None,
+        **kwargs,
+    ):
+        """
+        :param on_connect: coroutine function called with the connection after every (re)connection
+        :param message_scheduler: scheduler of the chat messages, None to write them right away
+        :param kwargs: arguments of WSConnection
+        """
+        super().__init__(**kwargs)
+        # Names of the channels assigned to this connection
+        self.channels: set[str] = set()
+        self._on_connect = on_connect
+        self._message_scheduler = message_scheduler
+
+    async def _connect(self):
+        await super()._connect()
+
+        if self.is_alive:
+            await self._on_connect(self)
+
+    async def send(self, message: str):
+        await self._schedule(message, functools.partial(super().send, message))
+
+    async def reply(self, msg_id: str, message: str):
+        await self._schedule(message, functools.partial(super().reply, msg_id, message))
+
+    async def _schedule(self, message: str, write: Callable[[], Awaitable]) -> None:
+        """
+        Write the IRC message through the scheduler if it's a chat message, otherwise right away.
+        """
+        message = message.strip()
+
+        if self._message_scheduler is None or not message.startswith("PRIVMSG #"):
+            await write()
+            return
+
+        channel_name, _, content = message.removeprefix("PRIVMSG #").partition(" ")
+        await self._message_scheduler.send(
+            channel_name, content.removeprefix(":"), write
+        )
+
+    def dispatch(self, event: str, *args, **kwargs):
+        if event != "ready":
+            super().dispatch(event, *args, **kwargs)
+
+    async def close(self) -> None:
+        """
+        Close the websocket without reconnecting. The HTTP session is shared with the bot and left open.
+        """
+        if self._keeper is not None:
+            await self._close()
+
+
+class ChannelShards:
+    """
+    Spreads the channels the bot is in across IRC connections with at most channels_per_connection
+    channels each, so a single connection doesn't receive the messages of every channel.
+
+    Channels are assigned to the connection with the fewest channels, and a connection is opened
+    when all of them are full. Joins are staged through a JoinRateLimiter shared by every
+    connection. When parted channels leave enough room, the connection with the fewest channels
+    is closed and its channels are moved to the others.
+
+    The bot's main connection logs in and receives whispers, but joins no channels.
+    """
+
+    DEFAULT_CHANNELS_PER_CONNECTION = 100
+
+    def __init__(
+        self,
+        bot: Optional[Client],
+        channels_per_connection: int = DEFAULT_CHANNELS_PER_CONNECTION,
+        join_rate_limiter: Optional[JoinRateLimiter] = None,
+        message_scheduler: Optional[MessageScheduler] = None,
+    ):
+        """
+        :param bot: the bot the connections dispatch their events to
+        :param channels_per_connection: maximum number of channels joined by a connection
+        :param join_rate_limiter: limiter of the joins of every connection, Twitch's limit by default
+        :param message_scheduler: scheduler of the chat messages of every connection, None to write them right away
+        """
+        if channels_per_connection < 1:
+            raise ValueError("A connection must be able to join at least one channel")
+
+        self._bot = bot
+        self.channels_per_connection = channels_per_connection
+        self._join_rate_limiter = join_rate_limiter or JoinRateLimiter()
+        self._message_scheduler = message_scheduler
+        self._connections: list[ShardConnection] = []
+        # Maps channel name to the connection it's assigned to
+        self._channel_connections: dict[str, ShardConnection] = dict()
+        # Held while channels are assigned, but not while they're joined
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        """
+        :return: number of channels assigned to a connection
+        """
+        return len(self._channel_connections)
+
+    def __contains__(self, channel_name: str) -> bool:
+        return self._normalize(channel_name) in self._channel_connections
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        :return: iterator over the names of the channels assigned to a connection
+        """
+        return iter(list(self._channel_connections))
+
+    @property
+    def connection_count(self) -> int:
+        return len(self._connections)
+
+    async def join(self, *channel_names: str) -> None:
+        """
+        Join the channels that were not joined yet, opening connections when needed.
+        Returns once every channel was joined, which can take a while if over the rate limit.
+        """
+        assigned = []
+
+        async with self._lock:
+            for channel_name in self._normalize_all(channel_names):
+                if channel_name in self._channel_connections:
+                    continue
+
+                connection = await self._get_connection_with_room()
+                self._assign(channel_name, connection)
+                assigned.append((connection, channel_name))
+
+        await self._join_assigned(assigned)
+
+    async def part(self, *channel_names: str) -> None:
+        """
+        Part the channels, then close the connections no longer needed to hold the remaining channels.
+        """
+        async with self._lock:
+            for channel_name in self._normalize_all(channel_names):
+                connection = self._channel_connections.pop(channel_name, None)
+
+                if connection is not None:
+                    connection.channels.discard(channel_name)
+                    await connection.part_channels(channel_name)
+
+            moved = await self._rebalance()
+
+        await self._join_assigned(moved)
+
+    async def close(self) -> None:
+        async with self._lock:
+            connections = self._connections
+            self._connections = []
+            self._channel_connections.clear()
+
+        for connection in connections:
+            await connection.close()
+
+    async def _rebalance(self) -> list[tuple[ShardConnection, str]]:
+        """
+        Close the connections with the fewest channels while the others have room for their channels,
+        assigning their channels to the others.
+
+        :return: list of (connection, channel name) of the moved channels, which must be joined
+        """
+        moved = []
+
+        while self._connections and len(self._channel_connections) <= (
+            self.channels_per_connection * (len(self._connections) - 1)
+        ):
+            closed = min(self._connections, key=lambda c: len(c.channels))
+            self._connections.remove(closed)
+            # Closed before its channels are joined by the others, so no message is received twice
+            await closed.close()
+            logging.info(
+                f"Closed an IRC connection, moving its {len(closed.channels)} channels. "
+                f"{len(self._connections)} connections left"
+            )
+
+            for channel_name in closed.channels:
+                connection = self._get_least_loaded_connection()
+                self._assign(channel_name, connection)
+                moved.append((connection, channel_name))
+
+            closed.channels.clear()
+
+        return moved
+
+    async def _join_assigned(
+        self, assigned: Iterable[tuple[ShardConnection, str]]
+    ) -> None:
+        for connection, channel_name in assigned:
+            await self._join_rate_limiter.acquire()
+
+            # The channel could have been parted or moved while waiting
+            if self._channel_connections.get(channel_name) is connection:
+                await connection.join_channels(channel_name)
+
+    async def _rejoin(self, connection: ShardConnection) -> None:
+        """
+        Join the channels of a connection again, called after it (re)connected.
+        """
+        await connection.wait_until_ready()
+        await self._join_assigned(
+            [(connection, channel_name) for channel_name in list(connection.channels)]
+        )
+
+    async def _get_connection_with_room(self) -> ShardConnection:
+        if self._connections:
+            connection = self._get_least_loaded_connection()
+
+            if len(connection.channels) < self.channels_per_connection:
+                return connection
+
+        connection = await self._open_connection()
+        self._connections.append(connection)
+        logging.info(f"Opened IRC connection number {len(self._connections)}")
+
+        return connection
+
+    def _get_least_loaded_connection(self) -> ShardConnection:
+        return min(self._connections, key=lambda c: len(c.channels))
+
+    def _assign(self, channel_name: str, connection: ShardConnection) -> None:
+        connection.channels.add(channel_name)
+        self._channel_connections[channel_name] = connection
+
+    async def _open_connection(self) -> ShardConnection:
+        # Same arguments as the bot's main connection, see twitchio.Client.__init__
+        connection = ShardConnection(
+            client=self._bot,
+            token=self._bot._connection._token,
+            loop=self._bot.loop,
+            heartbeat=self._bot._heartbeat,
+            on_connect=self._rejoin,
+            message_scheduler=self._message_scheduler,
+        )
+        # Private, but the only way to open a connection that isn't the main one
+        await connection._connect()
+        await connection.wait_until_ready()
+
+        return connection
+
+    @staticmethod
+    def _normalize(channel_name: str) -> str:
+        return channel_name.lower().lstrip("#")
+
+    @classmethod
+    def _normalize_all(cls, channel_names: Iterable[str]) -> list[str]:
+        # dict keeps the order while removing duplicates
+        return list(dict.fromkeys(cls._normalize(name) for name in channel_names))
@@ -0,0 +1,292 @@
+import bisect
+import heapq
+import threading
+from collections import Counter, OrderedDict
+from typing import Iterable, Optional
+
+from hashtablebot.entity.bot_user import BotUser
+
+
+class Leaderboard:
+    """
+    In-memory ranking of users by balance, kept up to date incrementally instead of
+    querying the database and the Twitch API for every leaderboard command.
+
+    Users are kept sorted by balance as their balances change, which is done by registering
+    update_balances as a BotUserDao balance listener. Since only users whose balances were seen
+    are ranked, the highest balances are loaded from the database with load. Users that are not
+    ranked have at most the floor, so rankings are only answered from memory while they have
+    enough entries above the floor.
+
+    Only the capacity highest balances are ranked. Users pushed out of the ranking raise the
+    floor to their balance, and users whose balance falls below the floor leave the ranking,
+    so the memory used doesn't grow with the number of users whose balances change.
+
+    Per-channel rankings only include the max_channel_members users most recently seen chatting
+    in the channel, added with add_channel_member. Updates happen in database worker threads,
+    hence the lock.
+    """
+
+    DEFAULT_LOAD_SIZE = 100
+    DEFAULT_CAPACITY = 200
+    DEFAULT_MAX_CHANNEL_MEMBERS = 1_000
+    # Number of users that stopped being tracked whose last write is remembered
+    DROPPED_USERS_SIZE = 10_000
+
+    def __init__(
+        self,
+        load_size: int = DEFAULT_LOAD_SIZE,
+        capacity: int = DEFAULT_CAPACITY,
+        max_channel_members: int = DEFAULT_MAX_CHANNEL_MEMBERS,
+    ):
+        """
+        :param load_size: number of users with the highest balances loaded from the database at once
+        :param capacity: maximum number of users ranked, at least load_size
+        :param max_channel_members: maximum number of users ranked in each channel's ranking
+        """
+        self.load_size = load_size
+        self.capacity = max(capacity, load_size)
+        self.max_channel_members = max_channel_members
+        self._lock = threading.Lock()
+        # Maps the id of every ranked user and channel member to their last seen balance
+        self._balances: dict[int, int] = dict()
+        # Maps user id to the version of the write their last seen balance came from
+        self._versions: dict[int, int] = dict()
+        # Maps the ids of users that stopped being tracked to the version and balance of their
+        # last write, so notifications arriving out of order are still ignored.
+        # Ordered from least to most recently dropped.
+        self._dropped: OrderedDict[int, tuple[int, int]] = OrderedDict()
+        # (-balance, user id) of the ranked users, in ranking order
+        self._ranking: list[tuple[int, int]] = []
+        self._ranked: set[int] = set()
+        # Users that are not ranked have at most this balance, None until the first load
+        self._floor: Optional[float] = None
+        # Highest balance pushed out of the ranking before the first load
+        self._unloaded_floor = float("-inf")
+        # Maps channel name to the ids of the users seen chatting in it, from least to most recent
+        self._channel_members: dict[str, OrderedDict[int, None]] = dict()
+        # Maps user id to the number of channels they are a member of
+        self._memberships: Counter[int] = Counter()
+
+    def load(self, bot_users: Iterable[BotUser], limit: int) -> None:
+        """
+        Rank the users with the highest balances, read from the database.
+
+        Like the balances read by update_balances, the read balances may be older than the ones
+        written since, so the balances of users whose writes were seen are kept instead.
+
+        :param bot_users: the users with the limit highest balances, in descending order
+        :param limit: limit of the query that returned bot_users
+        """
+        bot_users = list(bot_users)
+
+        with self._lock:
+            # If less than limit users were returned, there are no users left to load
+            self._floor = (
+                bot_users[-1].balance if len(bot_users) == limit else float("-inf")
+            )
+            self._unloaded_floor = float("-inf")
+
+            # Users above the new floor must be ranked and the ones below it are no longer
+            # needed, so the ranking is rebuilt from every balance known
+            for user_id in list(self._balances):
+                # Users can be dropped while others are ranked
+                if user_id in self._balances:
+                    self._set_balance(
+                        user_id, self._balances[user_id], self._versions.get(user_id)
+                    )
+            for user_id, (version, balance) in list(self._dropped.items()):
+                if balance >= self._floor:
+                    self._set_balance(user_id, balance, version)
+
+            for bot_user in bot_users:
+                user_id = int(bot_user.id)
+                if user_id not in self._balances and user_id not in self._dropped:
+                    self._set_balance(user_id, bot_user.balance, None)
+
+    def update_balances(
+        self, balances: dict[int, int], version: Optional[int] = None
+    ) -> None:
+        """
+        Move the users to their new positions in the ranking.
+
+        Listeners are called after the writes are committed, so the balances of a user can
+        arrive out of order. Balances older than the last version seen for the user are ignored.
+
+        :param balances: dictionary mapping user ids to their new balances
+        :param version: version of the write that changed the balances, None for balances
+            read from the database, which are only added for users whose balances were never seen
+        """
+        with self._lock:
+            for user_id, balance in balances.items():
+                user_id = int(user_id)
+
+                if version is None:
+                    if user_id not in self._balances and user_id not in self._dropped:
+                        self._set_balance(user_id, balance, None)
+                    continue
+
+                last_version = self._versions.get(user_id)
+                if last_version is None and user_id in self._dropped:
+                    last_version, _ = self._dropped[user_id]
+                if last_version is not None and last_version > version:
+                    continue
+
+                self._set_balance(user_id, balance, version)
+
+    def forget_balances(self) -> None:
+        """
+        Remove every user from the ranking, so the next rankings are loaded from the database.
+        The channel members are kept.
+        """
+        with self._lock:
+            self._balances.clear()
+            self._versions.clear()
+            self._dropped.clear()
+            self._ranking.clear()
+            self._ranked.clear()
+            self._floor = None
+            self._unloaded_floor = float("-inf")
+
+    def add_channel_member(self, channel_name: str, user_id: int) -> None:
+        """
+        Include the user in the channel's ranking, removing the least recently seen member
+        if the channel has max_channel_members.
+        """
+        user_id = int(user_id)
+
+        with self._lock:
+            members = self._channel_members.setdefault(channel_name, OrderedDict())
+
+            if user_id in members:
+                members.move_to_end(user_id)
+                return
+
+            members[user_id] = None
+            self._memberships[user_id] += 1
+
+            if user_id not in self._balances and user_id in self._dropped:
+                version, balance = self._dropped[user_id]
+                self._set_balance(user_id, balance, version)
+
+            if len(members) > self.max_channel_members:
+                old_member, _ = members.popitem(last=False)
+                self._memberships[old_member] -= 1
+
+                if self._memberships[old_member] == 0:
+                    del self._memberships[old_member]
+                    if old_member not in self._ranked:
+                        self._drop(old_member)
+
+    def unknown_channel_members(self, channel_name: str) -> list[int]:
+        """
+        :return: ids of the members of the channel whose balances were never seen
+        """
+        with self._lock:
+            return [
+                user_id
+                for user_id in self._channel_members.get(channel_name, ())
+                if user_id not in self._balances
+            ]
+
+    def top(
+        self, size: int, channel_name: Optional[str] = None
+    ) -> Optional[list[tuple[int, int]]]:
+        """
+        :param size: maximum number of users in the ranking
+        :param channel_name: channel whose members are ranked, None to rank every user
+        :return: list of (user id, balance) in ranking order, None if it can't be answered from memory
+            because the users with the highest balances have to be loaded or there are channel members
+            whose balances were never seen
+        """
+        with self._lock:
+            if channel_name is not None:
+                members = self._channel_members.get(channel_name, ())
+
+                if any(user_id not in self._balances for user_id in members):
+                    return None
+
+                return [
+                    (user_id, self._balances[user_id])
+                    for user_id in heapq.nsmallest(
+                        size,
+                        members,
+                        key=lambda user_id: (-self._balances[user_id], user_id),
+                    )
+                ]
+
+            if self._floor is None:
+                return None
+
+            entries = [
+                (user_id, -negative_balance)
+                for negative_balance, user_id in self._ranking[:size]
+            ]
+
+            # Users that are not ranked could be ranked after the entries
+            if self._floor != float("-inf") and len(entries) < size:
+                return None
+
+            return entries
+
+    def _set_balance(
+        self, user_id: int, balance: Optional[int], version: Optional[int]
+    ) -> None:
+        """
+        Store the user's balance, ranking them if it's not below the floor.
+        Users that are neither ranked nor channel members are dropped.
+        """
+        balance = balance or 0
+        floor = self._floor if self._floor is not None else self._unloaded_floor
+
+        if user_id in self._ranked:
+            old_balance = self._balances[user_id]
+            del self._ranking[
+                bisect.bisect_left(self._ranking, (-old_balance, user_id))
+            ]
+            self._ranked.remove(user_id)
+
+        self._balances[user_id] = balance
+        if version is not None:
+            self._versions[user_id] = version
+        self._dropped.pop(user_id, None)
+
+        if balance >= floor:
+            bisect.insort(self._ranking, (-balance, user_id))
+            self._ranked.add(user_id)
+            self._trim_ranking()
+
+        if user_id not in self._ranked and user_id not in self._memberships:
+            self._drop(user_id)
+
+    def _trim_ranking(self) -> None:
+        """
+        Remove the lowest balances from the ranking until it has at most capacity users,
+        raising the floor to them.
+        """
+        while len(self._ranking) > self.capacity:
+            negative_balance, user_id = self._ranking.pop()
+            self._ranked.remove(user_id)
+
+            if self._floor is not None:
+                self._floor = max(self._floor, -negative_balance)
+            else:
+                self._unloaded_floor = max(self._unloaded_floor, -negative_balance)
+
+            if user_id not in self._memberships:
+                self._drop(user_id)
+
+    def _drop(self, user_id: int) -> None:
+        """
+        Stop tracking the user, remembering the version of their last write.
+        """
+        balance = self._balances.pop(user_id, None)
+        version = self._versions.pop(user_id, None)
+
+        if version is None:
+            return
+
+        self._dropped[user_id] = (version, balance)
+        self._dropped.move_to_end(user_id)
+        if len(self._dropped) > self.DROPPED_USERS_SIZE:
+            self._dropped.popitem(last=False)
@@ -0,0 +1,96 @@
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, Iterable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """
+    Bounded in-memory cache with least-recently-used eviction and an optional time-to-live.
+
+    Lookups and insertions are O(1). When the cache is full, inserting a new key evicts the
+    least recently used one. If ttl is set, entries older than ttl seconds are treated as missing.
+    """
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        """
+        :param max_size: maximum number of entries kept in the cache
+        :param ttl: seconds an entry stays valid after being stored, None to never expire
+        """
+        if max_size <= 0:
+            raise ValueError("max_size must be a positive integer")
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Maps key to (expiry time, value), ordered from least to most recently used
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """
+        Return the value stored for key, or default if it's missing or expired.
+        """
+        try:
+            expires_at, value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: K, value: V) -> None:
+        """
+        Store value for key, evicting the least recently used entry if the cache is full.
+        """
+        expires_at = (
+            time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        )
+
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def put_many(self, items: Iterable[tuple[K, V]]) -> None:
+        for key, value in items:
+            self.put(key, value)
+
+    def invalidate(self, *keys: K) -> None:
+        """
+        Remove keys from the cache, ignoring the ones that are not stored.
+        """
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        :return: fraction of lookups that were hits, 0.0 if there were no lookups
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __contains__(self, key: K) -> bool:
+        try:
+            expires_at, _ = self._entries[key]
+        except KeyError:
+            return False
+
+        return expires_at >= time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,25 +1,38 @@
+import asyncio
+import functools
 import logging
+import signal
+from typing import Optional
 
 import click
 from twitchio import AuthenticationError
 
+from hashtablebot.bench import (
+    DEFAULT_COMMAND_MIX,
+    MESSAGE_TEMPLATES,
+    parse_command_mix,
+    read_chat_log,
+    run_bench,
+    synthetic_messages,
+)
 from hashtablebot.hash_table_bot import HashTableBot
+from hashtablebot.irc_shards import ChannelShards
+from hashtablebot.workers import ChannelPartition, WorkerCoordinator
 
 
-@click.command(help="HashTableBot")
+@click.group(help="HashTableBot", invoke_without_command=True)
+@click.pass_context
 @click.option(
     "--token",
     envvar="TOKEN",
     help="OAuth Access Token provided by twitch(see https://dev.twitch.tv/docs/authentication/getting-tokens-oauth). "
-    "Can also be passed with the TOKEN environment variable",
-    required=True,
+    "Can also be passed with the TOKEN environment variable. Required to run the bot",
 )
 @click.option(
     "--channels",
     envvar="CHANNELS",
     help="A comma-separated list of twitch channels the bot should join. "
-    "Can also be passed with the CHANNELS environment variable.",
-    required=True,
+    "Can also be passed with the CHANNELS environment variable. Required to run the bot",
 )
 @click.option(
     "--log_level",
@@ -30,7 +43,71 @@ from hashtablebot.hash_table_bot import HashTableBot
         click.Choice(("CRITICAL", "FATAL", "ERROR", "WARN", "WARNING", "INFO", "DEBUG"))
     ),
 )
-def main(token, channels, log_level):
+@click.option(
+    "--balance_flush_interval",
+    envvar="BALANCE_FLUSH_INTERVAL",
+    default=None,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Seconds between the batched writes of balance changes, like chat rewards, to the database. Default is 5. "
+    "Changes made since the last write are lost if the bot crashes. "
+    "Can also be passed with the BALANCE_FLUSH_INTERVAL environment variable.",
+)
+@click.option(
+    "--translation_cache_path",
+    envvar="TRANSLATION_CACHE_PATH",
+    default=None,
+    type=click.Path(dir_okay=False),
+    help="Path of an SQLite database used to keep cached translations between restarts. "
+    "Can also be passed with the TRANSLATION_CACHE_PATH environment variable.",
+)
+@click.option(
+    "--user_cache_warm_size",
+    envvar="USER_CACHE_WARM_SIZE",
+    default=0,
+    type=click.IntRange(min=0),
+    help="Load this many users with the highest balances into the user cache when the bot starts. "
+    "Can also be passed with the USER_CACHE_WARM_SIZE environment variable.",
+)
+@click.option(
+    "--channels_per_connection",
+    envvar="CHANNELS_PER_CONNECTION",
+    default=ChannelShards.DEFAULT_CHANNELS_PER_CONNECTION,
+    type=click.IntRange(min=1),
+    help=f"Maximum number of channels joined by each IRC connection, "
+    f"default is {ChannelShards.DEFAULT_CHANNELS_PER_CONNECTION}. "
+    "Can also be passed with the CHANNELS_PER_CONNECTION environment variable.",
+)
+@click.option(
+    "--workers",
+    envvar="WORKERS",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of bot processes, each joining the channels in its partition of the channel names. "
+    "Dead workers are replaced, and the shutdown command stops every worker. "
+    "Default is 1, which runs the bot in this process. "
+    "Can also be passed with the WORKERS environment variable.",
+)
+@click.option(
+    "--metrics_port",
+    envvar="METRICS_PORT",
+    default=None,
+    type=click.IntRange(min=1, max=65535),
+    help="Serve Prometheus metrics on http://127.0.0.1:<port>/metrics. Disabled by default. "
+    "With several workers, each worker uses the port plus its partition index. "
+    "Can also be passed with the METRICS_PORT environment variable.",
+)
+def main(
+    ctx: click.Context,
+    token,
+    channels,
+    log_level,
+    balance_flush_interval,
+    translation_cache_path,
+    user_cache_warm_size,
+    channels_per_connection,
+    workers,
+    metrics_port,
+):
     """
     The entry point for the bot's code.
 
@@ -38,16 +115,159 @@ def main(token, channels, log_level):
     as specified in the project's `setup file <https://github.com/douglascdev/hashtablebot/blob/343154016d1e32002ab417ab8f52456e967fe803/setup.py#L21>`_
 
     The parameters/environment variables are gathered here by `Click <https://click.palletsprojects.com/en/8.1.x/>`_
-    and passed to the HashTableBot class.
+    and passed to the HashTableBot class, unless a subcommand like "bench" is invoked.
 
+    :param ctx: the click context, used to know if a subcommand was invoked
     :param token: the `OAuth Access Token<https://dev.twitch.tv/docs/authentication/getting-tokens-oauth>`_ given by twitch.
     :param channels: A comma-separated list of twitch channels the bot should join
     :param log_level: set the `logging level <https://docs.python.org/3/library/logging.html#levels>`_
+    :param balance_flush_interval: seconds between batched balance writes, None for the default
+    :param translation_cache_path: path of the SQLite database with cached translations, None to only cache in memory
+    :param user_cache_warm_size: number of users loaded into the user cache at startup
+    :param channels_per_connection: maximum number of channels joined by each IRC connection
+    :param workers: number of worker processes, 1 to run the bot in this process
+    :param metrics_port: port the metrics are served on, None to not serve them
     :return:
     """
     logging.basicConfig(level=log_level)
 
-    bot = HashTableBot(token, channels.split(","))
+    if ctx.invoked_subcommand is not None:
+        return
+
+    for name, value in (("--token", token), ("--channels", channels)):
+        if not value:
+            raise click.UsageError(f"Missing option '{name}'.", ctx=ctx)
+
+    bot_kwargs = dict(
+        token=token,
+        initial_channels=channels.split(","),
+        balance_flush_interval_in_seconds=balance_flush_interval,
+        translation_cache_path=translation_cache_path,
+        user_cache_warm_size=user_cache_warm_size,
+        channels_per_connection=channels_per_connection,
+        metrics_port=metrics_port,
+    )
+
+    if workers == 1:
+        run_bot(bot_kwargs, log_level)
+    else:
+        logging.info(f"Starting {workers} workers")
+        WorkerCoordinator(
+            workers, functools.partial(run_bot, bot_kwargs, log_level)
+        ).run()
+
+
+@main.command(help="Measure how many messages per second the bot handles")
+@click.option(
+    "--chat_log",
+    default=None,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Replay a recorded chat log instead of generating messages, "
+    "with a tab-separated channel, user and message per line, or a JSON object with these keys.",
+)
+@click.option(
+    "--message_count",
+    default=10_000,
+    type=click.IntRange(min=1),
+    help="Number of generated messages, default is 10000.",
+)
+@click.option(
+    "--channel_count",
+    default=10,
+    type=click.IntRange(min=1),
+    help="Number of channels the generated messages are sent in, default is 10.",
+)
+@click.option(
+    "--user_count",
+    default=1000,
+    type=click.IntRange(min=1),
+    help="Number of users sending the generated messages, default is 1000.",
+)
+@click.option(
+    "--command_mix",
+    default=DEFAULT_COMMAND_MIX,
+    help=f"Comma-separated weights of each kind of generated message, default is {DEFAULT_COMMAND_MIX}. "
+    f"The kinds are {', '.join(MESSAGE_TEMPLATES)}.",
+)
+@click.option(
+    "--seed",
+    default=0,
+    type=int,
+    help="Seed of the generated messages, so runs can be compared. Default is 0.",
+)
+@click.option(
+    "--rate",
+    default=None,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Messages passed to the bot per second. By default they're passed as fast as possible.",
+)
+def bench(chat_log, message_count, channel_count, user_count, command_mix, seed, rate):
+    """
+    Replay chat messages through the bot's event_message with fake twitchio messages and print
+    the throughput and the latency percentiles of each command.
+
+    Nothing connects to Twitch: the database is an in-memory SQLite database, users are made up
+    and translations are echoed back.
+
+    :param chat_log: path of the chat log, None to generate the messages
+    :param message_count: number of generated messages
+    :param channel_count: number of channels of the generated messages
+    :param user_count: number of users of the generated messages
+    :param command_mix: weights of each kind of generated message, like "chat=90,ping=10"
+    :param seed: seed of the generated messages
+    :param rate: messages passed per second, None to pass them as fast as possible
+    """
+    if chat_log is not None:
+        messages = read_chat_log(chat_log)
+    else:
+        try:
+            weights = parse_command_mix(command_mix)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--command_mix")
+
+        messages = synthetic_messages(
+            message_count, channel_count, user_count, weights, seed
+        )
+
+    try:
+        report = asyncio.run(run_bench(messages, rate))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    click.echo(report.format())
+
+
+def run_bot(
+    bot_kwargs: dict,
+    log_level: str,
+    channel_partition: Optional[ChannelPartition] = None,
+):
+    """
+    Run the bot until it's closed, called in each worker process in worker mode.
+
+    :param bot_kwargs: arguments of HashTableBot
+    :param log_level: set the `logging level <https://docs.python.org/3/library/logging.html#levels>`_
+    :param channel_partition: channels joined by the worker, None to join every channel
+    """
+    logging.basicConfig(level=log_level)
+
+    if channel_partition is not None and bot_kwargs["metrics_port"] is not None:
+        # Every worker serves its own metrics
+        bot_kwargs = dict(
+            bot_kwargs,
+            metrics_port=bot_kwargs["metrics_port"] + channel_partition.index,
+        )
+
+    bot = HashTableBot(**bot_kwargs, channel_partition=channel_partition)
+
+    async def close_bot():
+        await bot.close()
+        bot.loop.stop()
+
+    # The worker coordinator stops workers with SIGTERM, so pending writes are flushed first
+    bot.loop.add_signal_handler(
+        signal.SIGTERM, lambda: bot.loop.create_task(close_bot())
+    )
 
     try:
         bot.run()
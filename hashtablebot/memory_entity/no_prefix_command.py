@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Iterable, Iterator, Optional, Sequence
 
 from twitchio import Message
 
@@ -46,3 +47,91 @@ class DefaultNoPrefix(NoPrefixCommand):
 
     async def respond(self, message):
         await message.channel.send(self.response)
+
+
+class _TrieNode:
+    __slots__ = ("children", "command")
+
+    def __init__(self):
+        self.children: dict[str, _TrieNode] = dict()
+        self.command: Optional[NoPrefixCommand] = None
+
+
+class NoPrefixCommandIndex:
+    """
+    Token trie of commands without a prefix, used to find the command a message invokes.
+
+    The message is split once and its words are walked down the trie, so finding a command
+    takes time proportional to the length of the longest name instead of the number of commands.
+    When the names of several commands match the start of a message, the longest one wins.
+    """
+
+    def __init__(self, commands: Iterable[NoPrefixCommand] = ()):
+        self._root = _TrieNode()
+        # Maps names to their command, in the order they were added
+        self._commands: dict[tuple[str, ...], NoPrefixCommand] = dict()
+
+        for command in commands:
+            self.add(command)
+
+    def add(self, command: NoPrefixCommand) -> None:
+        """
+        Add the command, replacing the one with the same names if it exists.
+        """
+        node = self._root
+
+        for name in command.names:
+            node = node.children.setdefault(name, _TrieNode())
+
+        node.command = command
+        self._commands[tuple(command.names)] = command
+
+    def remove(self, names: Sequence[str]) -> Optional[NoPrefixCommand]:
+        """
+        Remove the command with names, pruning the branches left without commands.
+
+        :return: the removed command, None if there was no command with these names
+        """
+        path = [self._root]
+
+        for name in names:
+            if (node := path[-1].children.get(name)) is None:
+                return None
+            path.append(node)
+
+        command, path[-1].command = path[-1].command, None
+
+        if command is None:
+            return None
+
+        del self._commands[tuple(names)]
+
+        for parent, name, node in reversed(list(zip(path, names, path[1:]))):
+            if node.children or node.command is not None:
+                break
+            del parent.children[name]
+
+        return command
+
+    def find(self, content: str) -> Optional[NoPrefixCommand]:
+        """
+        :param content: content of the message
+        :return: the command with the longest names matching the start of content, None if no command matches
+        """
+        node = self._root
+        match = None
+
+        for word in content.split(" "):
+            if (node := node.children.get(word)) is None:
+                break
+
+            if node.command is not None:
+                match = node.command
+
+        return match
+
+    def __iter__(self) -> Iterator[NoPrefixCommand]:
+        return iter(self._commands.values())
+
+    def __len__(self) -> int:
+        return len(self._commands)
@@ -0,0 +1,329 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Awaitable, Callable, Iterator, Optional
+
+
+class Priority(IntEnum):
+    """
+    Lanes of the outgoing messages. Lower values are sent first.
+    """
+
+    # Replies to commands and other single messages
+    REPLY = 0
+    # Bursts of messages, like the lines of a pyramid
+    BULK = 1
+
+
+_message_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar(
+    "message_priority", default=Priority.REPLY
+)
+
+
+@contextmanager
+def message_priority(priority: Priority) -> Iterator[None]:
+    """
+    Send the messages of the block with the priority, including the ones sent with ctx.send or channel.send.
+    """
+    token = _message_priority.set(priority)
+
+    try:
+        yield
+    finally:
+        _message_priority.reset(token)
+
+
+class TokenBucket:
+    """
+    Allows capacity events at once, then refill_per_second events per second.
+    """
+
+    def __init__(
+        self, capacity: float, refill_per_second: float, now: Optional[float] = None
+    ):
+        """
+        :param now: time the bucket is full at, from time.monotonic
+        """
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._updated_at = time.monotonic() if now is None else now
+
+    def wait_time(self, now: float) -> float:
+        """
+        :return: seconds until an event is allowed, 0.0 if it's allowed now
+        """
+        self._refill(now)
+        return max(0.0, (1 - self._tokens) / self.refill_per_second)
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self._tokens -= 1
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._updated_at)
+        self._tokens = min(
+            self.capacity, self._tokens + elapsed * self.refill_per_second
+        )
+        self._updated_at = now
+
+
+@dataclass
+class _OutgoingMessage:
+    content: str
+    # Coroutine function that writes the message to the connection
+    write: Callable[[], Awaitable]
+    # Set to True once written
+    sent: asyncio.Future
+
+
+@dataclass
+class _ChannelState:
+    bucket: TokenBucket
+    # Whether the bot is a moderator or VIP in the channel, who have higher limits
+    privileged: bool = False
+    lanes: dict[Priority, deque[_OutgoingMessage]] = field(
+        default_factory=lambda: {priority: deque() for priority in Priority}
+    )
+    last_content: Optional[str] = None
+    last_content_at: float = float("-inf")
+
+
+class MessageScheduler:
+    """
+    Sends the bot's chat messages as fast as Twitch's rate limits allow, instead of writing
+    bursts that get dropped or throttled.
+
+    Messages wait in one lane per priority, and a single task sends them. It always sends the
+    highest priority message allowed by these token buckets:
+
+    - one shared by every message, with Twitch's limit for moderators and VIPs
+    - one shared by the messages to channels where the bot isn't a moderator or VIP, with
+      Twitch's limit for regular users
+    - one per channel where the bot isn't a moderator or VIP, for their per-channel limit
+
+    Channels with messages in the same lane take turns. In those same channels, a message
+    identical to the previous one within DUPLICATE_WINDOW_IN_SECONDS is dropped without using
+    the limits, since Twitch would drop it anyway.
+
+    The shared limits are per account, so processes sending messages with the same account, like
+    workers, each get an equal share of them by passing their number as process_count.
+    """
+
+    PERIOD_IN_SECONDS = 30.0
+    # Messages per period in channels where the bot isn't a moderator or VIP
+    GLOBAL_LIMIT = 20
+    # Messages per period in every channel
+    PRIVILEGED_GLOBAL_LIMIT = 100
+    # Messages per second in a channel where the bot isn't a moderator or VIP
+    CHANNEL_MESSAGES_PER_SECOND = 1.0
+    DUPLICATE_WINDOW_IN_SECONDS = 30.0
+
+    def __init__(
+        self,
+        global_limit: int = GLOBAL_LIMIT,
+        privileged_global_limit: int = PRIVILEGED_GLOBAL_LIMIT,
+        period_in_seconds: float = PERIOD_IN_SECONDS,
+        channel_messages_per_second: float = CHANNEL_MESSAGES_PER_SECOND,
+        process_count: int = 1,
+    ):
+        """
+        :param process_count: number of processes sending messages with the same account
+        """
+        # Each process can still send a message at once, even with more processes than messages
+        self._global_bucket = TokenBucket(
+            max(1.0, global_limit / process_count),
+            global_limit / process_count / period_in_seconds,
+        )
+        self._privileged_global_bucket = TokenBucket(
+            max(1.0, privileged_global_limit / process_count),
+            privileged_global_limit / process_count / period_in_seconds,
+        )
+        self.channel_messages_per_second = channel_messages_per_second
+        # Maps channel name to its limits and queued messages
+        self._channels: dict[str, _ChannelState] = dict()
+        # Maps each priority to the channels with messages in its lane, in the order they take turns
+        self._lanes: dict[Priority, OrderedDict[str, None]] = {
+            priority: OrderedDict() for priority in Priority
+        }
+        self._pending_count = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        """
+        :return: number of messages waiting to be sent
+        """
+        return self._pending_count
+
+    def set_privileged(self, channel_name: str, privileged: bool) -> None:
+        """
+        Set whether the bot is a moderator or VIP in the channel.
+        """
+        self._get_channel(channel_name).privileged = privileged
+
+    async def send(
+        self,
+        channel_name: str,
+        content: str,
+        write: Callable[[], Awaitable],
+        priority: Optional[Priority] = None,
+    ) -> bool:
+        """
+        Queue a message, then wait until it's written.
+
+        :param channel_name: channel the message is sent to
+        :param content: text of the message
+        :param write: coroutine function that writes the message to the connection
+        :param priority: lane of the message, by default the one set with message_priority
+        :return: whether the message was written, False if it was dropped as a duplicate
+        """
+        now = time.monotonic()
+        channel = self._get_channel(channel_name)
+
+        if (
+            not channel.privileged
+            and content == channel.last_content
+            and now - channel.last_content_at < self.DUPLICATE_WINDOW_IN_SECONDS
+        ):
+            logging.debug(f"Dropped duplicate message to {channel_name}: {content}")
+            return False
+
+        channel.last_content, channel.last_content_at = content, now
+
+        priority = _message_priority.get() if priority is None else priority
+        message = _OutgoingMessage(
+            content, write, asyncio.get_running_loop().create_future()
+        )
+        channel.lanes[priority].append(message)
+        self._lanes[priority][channel_name] = None
+        self._pending_count += 1
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._send_queued_messages())
+        self._wakeup.set()
+
+        return await message.sent
+
+    async def close(self) -> None:
+        """
+        Stop sending messages. The messages still waiting are cancelled.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        for channel in self._channels.values():
+            for lane in channel.lanes.values():
+                for message in lane:
+                    message.sent.cancel()
+                lane.clear()
+
+        for channel_names in self._lanes.values():
+            channel_names.clear()
+        self._pending_count = 0
+
+    async def _send_queued_messages(self) -> None:
+        while True:
+            message, wait_time = self._pop_next_message(time.monotonic())
+
+            if message is None:
+                self._wakeup.clear()
+
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait_time)
+                except asyncio.TimeoutError:
+                    pass
+
+                continue
+
+            try:
+                await message.write()
+            except Exception as e:
+                if not message.sent.done():
+                    message.sent.set_exception(e)
+            else:
+                if not message.sent.done():
+                    message.sent.set_result(True)
+
+    def _pop_next_message(
+        self, now: float
+    ) -> tuple[Optional[_OutgoingMessage], Optional[float]]:
+        """
+        Remove the next message allowed by the limits from its lane, taking its tokens.
+
+        :return: the message, or None and the seconds until one is allowed, None if there are no messages
+        """
+        wait_time = None
+
+        for priority in Priority:
+            lane = self._lanes[priority]
+
+            for channel_name in list(lane):
+                channel = self._channels[channel_name]
+                messages = channel.lanes[priority]
+
+                # Messages whose senders stopped waiting are not sent
+                while messages and messages[0].sent.cancelled():
+                    messages.popleft()
+                    self._pending_count -= 1
+
+                if not messages:
+                    del lane[channel_name]
+                    continue
+
+                channel_wait_time = self._get_wait_time(channel, now)
+
+                if channel_wait_time > 0:
+                    wait_time = (
+                        channel_wait_time
+                        if wait_time is None
+                        else min(wait_time, channel_wait_time)
+                    )
+                    continue
+
+                self._take_tokens(channel, now)
+                message = messages.popleft()
+                self._pending_count -= 1
+
+                # The channel takes its next turn after the other channels in the lane
+                if messages:
+                    lane.move_to_end(channel_name)
+                else:
+                    del lane[channel_name]
+
+                return message, None
+
+        return None, wait_time
+
+    def _get_wait_time(self, channel: _ChannelState, now: float) -> float:
+        wait_time = self._privileged_global_bucket.wait_time(now)
+
+        if not channel.privileged:
+            wait_time = max(
+                wait_time,
+                self._global_bucket.wait_time(now),
+                channel.bucket.wait_time(now),
+            )
+
+        return wait_time
+
+    def _take_tokens(self, channel: _ChannelState, now: float) -> None:
+        self._privileged_global_bucket.take(now)
+
+        if not channel.privileged:
+            self._global_bucket.take(now)
+            channel.bucket.take(now)
+
+    def _get_channel(self, channel_name: str) -> _ChannelState:
+        if (channel := self._channels.get(channel_name)) is None:
+            channel = self._channels[channel_name] = _ChannelState(
+                TokenBucket(1, self.channel_messages_per_second)
+            )
+
+        return channel
@@ -0,0 +1,306 @@
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+# Upper bounds of the histogram buckets in seconds, from a millisecond to 10 seconds
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    return str(value)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+
+    escaped_values = (
+        str(v).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+        for v in values
+    )
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped_values)) + "}"
+
+
+class Counter:
+    """
+    Value that only goes up, like the number of messages processed, with one value per set of labels.
+    """
+
+    def __init__(
+        self, name: str, documentation: str, label_names: tuple[str, ...] = ()
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        # Maps label values to the counter's value
+        self._values: dict[tuple[str, ...], float] = dict()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def get(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+
+        with self._lock:
+            values = list(self._values.items())
+
+        for label_values, value in values:
+            labels = _format_labels(self.label_names, label_values)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Histogram:
+    """
+    Distribution of observed values, like latencies, counted in buckets with one distribution per set of labels.
+
+    Observing a value is a binary search and three additions, so it can be done for every message.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # Maps label values to the count of each bucket, with an extra +Inf bucket, not cumulative
+        self._bucket_counts: dict[tuple[str, ...], list[int]] = dict()
+        # Maps label values to the sum of the observed values
+        self._sums: dict[tuple[str, ...], float] = dict()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            if (counts := self._bucket_counts.get(label_values)) is None:
+                counts = self._bucket_counts[label_values] = [0] * (
+                    len(self.buckets) + 1
+                )
+
+            counts[index] += 1
+            self._sums[label_values] = self._sums.get(label_values, 0.0) + value
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        """
+        Observe the seconds the block took, even if it raises.
+        """
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def count(self, *label_values: str) -> int:
+        return sum(self._bucket_counts.get(label_values, ()))
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+
+        with self._lock:
+            distributions = [
+                (label_values, list(counts), self._sums[label_values])
+                for label_values, counts in self._bucket_counts.items()
+            ]
+
+        bucket_label_names = (*self.label_names, "le")
+
+        for label_values, counts, total in distributions:
+            cumulative_count = 0
+
+            for upper_bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative_count += count
+                labels = _format_labels(
+                    bucket_label_names, (*label_values, _format_value(upper_bound))
+                )
+                yield f"{self.name}_bucket{labels} {cumulative_count}"
+
+            labels = _format_labels(self.label_names, label_values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative_count}"
+
+
+class Gauge:
+    """
+    Value that goes up and down, like a queue's depth, read from a callback when the metrics are rendered,
+    so it costs nothing between scrapes.
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {_format_value(self.callback())}"
+
+
+class MetricsRegistry:
+    """
+    The metrics exposed by the bot, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        # Maps metric name to the metric, in the order they were registered
+        self._metrics: dict[str, Counter | Histogram | Gauge] = dict()
+
+    def counter(
+        self, name: str, documentation: str, label_names: tuple[str, ...] = ()
+    ) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def gauge(
+        self, name: str, documentation: str, callback: Callable[[], float]
+    ) -> Gauge:
+        """
+        Register a gauge, replacing the one with the same name, like the gauges of a previous bot.
+        """
+        gauge = self._metrics[name] = Gauge(name, documentation, callback)
+        return gauge
+
+    def render(self) -> str:
+        lines: list[str] = []
+
+        for metric in list(self._metrics.values()):
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logging.exception(e)
+
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+
+        self._metrics[metric.name] = metric
+        return metric
+
+
+class MetricsServer:
+    """
+    Minimal HTTP server answering GET /metrics with the rendered registry, for Prometheus to scrape.
+    It listens on localhost by default, since the metrics are not meant to be public.
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, registry: "MetricsRegistry", port: int, host: str = "127.0.0.1"):
+        """
+        :param port: port to listen on, 0 to pick a free one
+        """
+        self._registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        if self._server is not None:
+            return
+
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logging.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request_line = await reader.readline()
+
+            # The headers are not used, but are read so the client doesn't get a reset
+            while (await reader.readline()).strip():
+                pass
+
+            method, path, *_ = request_line.decode("latin-1").split(" ") + ["", ""]
+
+            if method == "GET" and path.split("?")[0] == "/metrics":
+                status, body = "200 OK", self._registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: {self.CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+# Registry shared by the whole process, so modules without a reference to the bot, like the DAOs, can record metrics
+metrics = MetricsRegistry()
+
+messages_processed = metrics.counter(
+    "hashtablebot_messages_total", "Chat messages processed by the bot"
+)
+command_duration = metrics.histogram(
+    "hashtablebot_command_duration_seconds",
+    "Time taken to run each command, including sending its replies",
+    ("command",),
+)
+db_query_duration = metrics.histogram(
+    "hashtablebot_db_query_duration_seconds",
+    "Time taken by each DAO method in the database thread pool",
+    ("method",),
+)
+translation_duration = metrics.histogram(
+    "hashtablebot_translation_duration_seconds",
+    "Time taken by each call to the translation backend",
+    ("call",),
+)
@@ -0,0 +1,117 @@
+from typing import Iterable
+
+from hashtablebot.entity.bot_user import BotUser
+from hashtablebot.persistence.async_dao import AsyncDao, run_blocking
+from hashtablebot.persistence.bot_user_cache import bot_user_cache
+from hashtablebot.persistence.bot_user_dao import BotUserDao
+
+
+class AsyncBotUserDao(AsyncDao[BotUser]):
+    """
+    Runs the BotUserDao queries in the database thread pool instead of blocking the event loop.
+
+    Users returned by get_by_id are read through bot_user_cache, so repeated lookups of the same
+    users don't query the database until they're written again. Every caller gets its own copy,
+    so changes are only seen by others once update commits them.
+    """
+
+    @staticmethod
+    async def get_by_id(obj_id: int) -> BotUser:
+        """
+        Return object with obj_id or raise an exception.
+
+        :raises: NoResultFound
+        """
+        if (bot_user := bot_user_cache.get(obj_id)) is not None:
+            return bot_user
+
+        generation = bot_user_cache.generation
+        bot_user = await run_blocking(BotUserDao.get_by_id, obj_id)
+        bot_user_cache.put(bot_user, generation)
+        return bot_user
+
+    @staticmethod
+    async def warm_cache(limit: int):
+        """
+        Load the limit users with the highest balances into bot_user_cache.
+        """
+        generation = bot_user_cache.generation
+        bot_users = await run_blocking(
+            BotUserDao.get_until_limit_order_by_balance_desc, limit
+        )
+        bot_user_cache.put_many(bot_users, generation)
+
+    @staticmethod
+    async def get_by_ids(obj_ids: Iterable[int]) -> list[BotUser]:
+        """
+        Return list with objects in obj_ids, ignoring the ids without an object.
+        The ids that are not cached are queried in a single round-trip.
+        """
+        bot_users = []
+        missing_ids = []
+
+        for obj_id in dict.fromkeys(int(obj_id) for obj_id in obj_ids):
+            if (bot_user := bot_user_cache.get(obj_id)) is not None:
+                bot_users.append(bot_user)
+            else:
+                missing_ids.append(obj_id)
+
+        if missing_ids:
+            generation = bot_user_cache.generation
+            missing_bot_users = await run_blocking(BotUserDao.get_by_ids, missing_ids)
+            bot_user_cache.put_many(missing_bot_users, generation)
+            bot_users.extend(missing_bot_users)
+
+        return bot_users
+
+    @staticmethod
+    async def get_all() -> list[BotUser]:
+        return await run_blocking(BotUserDao.get_all)
+
+    @staticmethod
+    async def save(*objs: BotUser):
+        await run_blocking(BotUserDao.save, *objs)
+
+    @staticmethod
+    async def update(*objs: BotUser):
+        await run_blocking(BotUserDao.update, *objs)
+
+    @staticmethod
+    async def delete(*objs: BotUser):
+        await run_blocking(BotUserDao.delete, *objs)
+
+    @staticmethod
+    async def get_all_joined_channels() -> list[BotUser]:
+        return await run_blocking(BotUserDao.get_all_joined_channels)
+
+    @staticmethod
+    async def get_by_login_names(login_names: Iterable[str]) -> list[BotUser]:
+        return await run_blocking(BotUserDao.get_by_login_names, list(login_names))
+
+    @staticmethod
+    async def save_names(id_to_names: dict[int, tuple[str, str]]):
+        await run_blocking(BotUserDao.save_names, id_to_names)
+
+    @staticmethod
+    async def get_until_limit_order_by_balance_desc(limit: int) -> list[BotUser]:
+        return await run_blocking(
+            BotUserDao.get_until_limit_order_by_balance_desc, limit
+        )
+
+    @staticmethod
+    async def add_to_balances(balance_deltas: dict[int, int]) -> dict[int, int]:
+        return await run_blocking(BotUserDao.add_to_balances, balance_deltas)
+
+    @staticmethod
+    async def deposit(user_id: int, amount: int) -> int:
+        return await run_blocking(BotUserDao.deposit, user_id, amount)
+
+    @staticmethod
+    async def withdraw(user_id: int, amount: int) -> int:
+        return await run_blocking(BotUserDao.withdraw, user_id, amount)
+
+    @staticmethod
+    async def transfer(
+        from_user_id: int, to_user_id: int, amount: int
+    ) -> tuple[int, int]:
+        return await run_blocking(BotUserDao.transfer, from_user_id, to_user_id, amount)
@@ -0,0 +1,29 @@
+from typing import Iterable
+
+from hashtablebot.entity.channel_no_prefix_command import ChannelNoPrefixCommand
+from hashtablebot.persistence.async_dao import run_blocking
+from hashtablebot.persistence.channel_no_prefix_command_dao import (
+    ChannelNoPrefixCommandDao,
+)
+
+
+class AsyncChannelNoPrefixCommandDao:
+    """
+    Runs the ChannelNoPrefixCommandDao queries in the database thread pool instead of blocking the event loop.
+    """
+
+    @staticmethod
+    async def get_by_channel_ids(
+        channel_ids: Iterable[int],
+    ) -> list[ChannelNoPrefixCommand]:
+        return await run_blocking(
+            ChannelNoPrefixCommandDao.get_by_channel_ids, list(channel_ids)
+        )
+
+    @staticmethod
+    async def save(command: ChannelNoPrefixCommand):
+        await run_blocking(ChannelNoPrefixCommandDao.save, command)
+
+    @staticmethod
+    async def delete(channel_id: int, names: str) -> bool:
+        return await run_blocking(ChannelNoPrefixCommandDao.delete, channel_id, names)
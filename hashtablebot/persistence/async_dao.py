@@ -0,0 +1,74 @@
+import asyncio
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Generic, Iterable, TypeVar
+
+from hashtablebot.metrics import db_query_duration
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+"""
+Matches the size of SQLAlchemy's default connection pool plus its overflow, so every
+worker thread can hold a connection and queries queue up here instead of in the pool.
+"""
+DB_WORKER_THREADS = 15
+
+_executor = ThreadPoolExecutor(
+    max_workers=DB_WORKER_THREADS, thread_name_prefix="hashtablebot-db"
+)
+
+
+async def run_blocking(func: Callable[..., R], *args, **kwargs) -> R:
+    """
+    Run a blocking database call in the database thread pool, so the event loop
+    keeps processing messages while the query is in flight.
+
+    :param func: blocking function to be called
+    :return: the value returned by func
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(_timed, func, *args, **kwargs))
+
+
+def _timed(func: Callable[..., R], *args, **kwargs) -> R:
+    # Timed in the worker thread, so the time waiting for a free thread isn't included
+    with db_query_duration.time(getattr(func, "__qualname__", repr(func))):
+        return func(*args, **kwargs)
+
+
+class AsyncDao(Generic[T], ABC):
+    """
+    Awaitable counterpart of Dao, for use inside coroutines.
+    """
+
+    @staticmethod
+    @abstractmethod
+    async def get_by_id(obj_id: int) -> T:
+        pass
+
+    @staticmethod
+    @abstractmethod
+    async def get_by_ids(obj_ids: Iterable[int]) -> list[T]:
+        pass
+
+    @staticmethod
+    @abstractmethod
+    async def get_all() -> list[T]:
+        pass
+
+    @staticmethod
+    @abstractmethod
+    async def save(*objs: T):
+        pass
+
+    @staticmethod
+    @abstractmethod
+    async def update(*objs: T):
+        pass
+
+    @staticmethod
+    @abstractmethod
+    async def delete(*objs: T):
+        pass
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Awaitable, Callable, Iterable, Optional, TypeVar
+
+from hashtablebot.persistence.async_bot_user_dao import AsyncBotUserDao
+
+T = TypeVar("T")
+
+
+class BalanceWriteBuffer:
+    """
+    Write-behind buffer for balance changes.
+
+    Instead of committing a transaction per command, balance changes are kept in memory,
+    coalesced into a single delta per user and written to the database in one statement by
+    BotUserDao.add_to_balances. A flush happens every flush_interval_in_seconds, as soon as
+    max_pending_users users have pending changes, and when the buffer is closed.
+
+    Crash safety:
+        - Pending changes only exist in memory. If the process is killed without close being
+          awaited, changes made since the last flush are lost, which is at most
+          flush_interval_in_seconds worth of changes or max_pending_users users.
+        - Closing the buffer flushes every pending change before returning, so a graceful
+          shutdown loses nothing.
+        - If a flush fails, its deltas are merged back into the buffer and retried on the
+          next flush, so a database outage does not lose changes while the process is alive.
+        - Deltas are added to the stored balance instead of overwriting it, so a flush never
+          discards changes written by other processes in the meantime.
+    """
+
+    DEFAULT_FLUSH_INTERVAL_IN_SECONDS = 5.0
+    DEFAULT_MAX_PENDING_USERS = 500
+
+    def __init__(
+        self,
+        flush_interval_in_seconds: float = DEFAULT_FLUSH_INTERVAL_IN_SECONDS,
+        max_pending_users: int = DEFAULT_MAX_PENDING_USERS,
+    ):
+        self.flush_interval_in_seconds = flush_interval_in_seconds
+        self.max_pending_users = max_pending_users
+        # Maps user id to the amount that still has to be added to their stored balance
+        self._pending: defaultdict[int, int] = defaultdict(int)
+        # Maps user id to the amount being written by the flush in progress
+        self._in_flight: dict[int, int] = dict()
+        # Incremented when a flush starts writing and when it's done, so it's odd during a write
+        self._flush_sequence = 0
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def add(self, user_id: int, delta: int) -> None:
+        """
+        Buffer a change of delta to the balance of the user with user_id.
+        Repeated changes to the same user are coalesced into one.
+        """
+        self._pending[user_id] += delta
+
+        if len(self._pending) >= self.max_pending_users:
+            self._flush_requested.set()
+
+    def pending(self, user_id: int) -> int:
+        """
+        :return: the sum of the changes to the user's balance that were not flushed yet,
+            including the ones the flush in progress is writing
+        """
+        return self._pending.get(user_id, 0) + self._in_flight.get(user_id, 0)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> None:
+        """
+        Write all pending changes to the database in one statement.
+
+        If the write fails the changes are kept to be retried by the next flush.
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return
+
+            deltas, self._pending = dict(self._pending), defaultdict(int)
+            self._in_flight = deltas
+            self._flush_sequence += 1
+
+            try:
+                await AsyncBotUserDao.add_to_balances(deltas)
+            except Exception as e:
+                logging.exception(e)
+                for user_id, delta in deltas.items():
+                    self._pending[user_id] += delta
+                return
+            finally:
+                self._in_flight = dict()
+                self._flush_sequence += 1
+
+            logging.debug(f"Flushed balance changes of {len(deltas)} users")
+
+    async def read_with_pending(
+        self, read: Callable[[], Awaitable[T]], user_ids: Iterable[int]
+    ) -> tuple[T, dict[int, int]]:
+        """
+        Await read, then return its result along with the pending changes of the users.
+
+        Reads run concurrently with each other and with flushes. A flush of the users' changes
+        that commits during the read may or may not be seen by it, so the users are read again
+        until no such flush happened, and balances read from the database and the pending
+        changes never both include the same change.
+
+        :param read: coroutine function reading the users' balances from the database
+        :return: the result of read and a dictionary mapping each user id to its pending changes
+        """
+        user_ids = list(user_ids)
+
+        while True:
+            sequence = self._flush_sequence
+            writing_users = any(user_id in self._in_flight for user_id in user_ids)
+
+            if writing_users:
+                # The users' rows are being written, so the read waits for the write to end
+                async with self._flush_lock:
+                    pass
+                continue
+
+            result = await read()
+
+            # Only the flush that was writing other users when the read started ended
+            only_other_users_flushed = (
+                sequence % 2 and self._flush_sequence == sequence + 1
+            )
+            if self._flush_sequence == sequence or only_other_users_flushed:
+                return result, {user_id: self.pending(user_id) for user_id in user_ids}
+
+    def start(self) -> None:
+        """
+        Start flushing the buffer periodically in the background.
+        """
+        if self._flush_task is None:
+            self._closing = False
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def close(self) -> None:
+        """
+        Stop the periodic flush and write every pending change.
+        """
+        if self._flush_task is not None:
+            # Cancelling the task could be swallowed by wait_for if the flush was requested at
+            # the same time, so the task is asked to stop after its next flush instead
+            self._closing = True
+            self._flush_requested.set()
+            await self._flush_task
+            self._flush_task = None
+
+        await self.flush()
+
+    async def _flush_periodically(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(
+                    self._flush_requested.wait(), self.flush_interval_in_seconds
+                )
+            except asyncio.TimeoutError:
+                pass
+
+            self._flush_requested.clear()
+            await self.flush()
@@ -0,0 +1,140 @@
+import dataclasses
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from hashtablebot.entity.bot_user import BotUser
+from hashtablebot.lru_cache import LRUCache
+
+
+class BotUserCache:
+    """
+    Thread-safe LRU cache of BotUsers by id, read through by AsyncBotUserDao.get_by_id.
+
+    Every BotUserDao method that writes users invalidates them after its transaction ends, so
+    the cache never returns a user older than the last write made by this process. Writes are
+    made in the database thread pool while reads happen in the event loop, hence the lock.
+
+    A read that started before an invalidation can't store the user it read, since it may
+    have read the row before the write was committed.
+
+    Users are copied when stored and when returned, so callers can change the users they get
+    before passing them to update without other callers seeing the uncommitted changes. The
+    copies are detached from any session, like the users returned by BotUserDao.
+
+    Writes made by other processes can't be seen, so processes sharing the database with others,
+    like workers, set enabled to False.
+    """
+
+    DEFAULT_MAX_SIZE = 10_000
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        self._cache: LRUCache[int, BotUser] = LRUCache(max_size=max_size)
+        self._lock = threading.Lock()
+        # Incremented on every invalidation, used to discard reads that raced with a write
+        self._generation = 0
+        # When False, nothing is stored and every lookup misses
+        self.enabled = True
+
+    @property
+    def generation(self) -> int:
+        """
+        :return: value to be passed to put by reads that started now
+        """
+        return self._generation
+
+    def get(self, user_id: int) -> Optional[BotUser]:
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            bot_user = self._cache.get(int(user_id))
+
+        return _detached_copy(bot_user) if bot_user is not None else None
+
+    def put(self, bot_user: BotUser, generation: Optional[int] = None) -> None:
+        """
+        Store bot_user, unless generation is given and users were invalidated since it was taken.
+
+        :param bot_user: the user that was read
+        :param generation: the generation taken before reading bot_user
+        """
+        self.put_many((bot_user,), generation)
+
+    def put_many(
+        self, bot_users: Iterable[BotUser], generation: Optional[int] = None
+    ) -> None:
+        if not self.enabled:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+
+            self._cache.put_many((int(u.id), _detached_copy(u)) for u in bot_users)
+
+    def invalidate(self, *user_ids: int) -> None:
+        with self._lock:
+            self._generation += 1
+            self._cache.invalidate(*(int(user_id) for user_id in user_ids))
+
+    @contextmanager
+    def invalidating(self, *user_ids: int) -> Iterator[None]:
+        """
+        Invalidate the users after the block ends, even if it raises.
+        Wraps the transactions that write the users.
+        """
+        try:
+            yield
+        finally:
+            self.invalidate(*user_ids)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+
+    @property
+    def max_size(self) -> int:
+        return self._cache.max_size
+
+    @property
+    def hits(self) -> int:
+        return self._cache.hits
+
+    @property
+    def misses(self) -> int:
+        return self._cache.misses
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        :return: fraction of lookups that were hits, 0.0 if there were no lookups
+        """
+        return self._cache.hit_rate
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+def _detached_copy(bot_user: BotUser) -> BotUser:
+    """
+    :return: a copy of bot_user with the same identity, whose changes are written by
+        BotUserDao.update like the ones of a user that was read
+    """
+    copy = BotUser(
+        **{
+            field.name: getattr(bot_user, field.name)
+            for field in dataclasses.fields(bot_user)
+        }
+    )
+    make_transient_to_detached(copy)
+    return copy
+
+
+"""
+Cache shared by every DAO, so writes made through any of them invalidate the users read by the others.
+"""
+bot_user_cache = BotUserCache()
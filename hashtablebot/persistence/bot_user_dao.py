@@ -1,13 +1,31 @@
-from typing import Iterable
+import itertools
+import logging
+from typing import Callable, Iterable, Optional
 
-from sqlalchemy import desc, select
+from sqlalchemy import desc, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session as OrmSession
 
+from hashtablebot.bot_exceptions import NotEnoughCoinError
 from hashtablebot.entity.bot_user import BotUser
+from hashtablebot.persistence.bot_user_cache import bot_user_cache
 from hashtablebot.persistence.dao import Dao
 from hashtablebot.persistence.session import Session
 
 
 class BotUserDao(Dao[BotUser]):
+    # Maximum number of users bound to a single statement by get_by_ids and add_to_balances,
+    # which stays well below the bound parameter limits of Postgres and SQLite
+    CHUNK_SIZE = 500
+
+    # Functions called with a dictionary mapping user ids to their new balances and the version
+    # of the write after every committed write that changes balances, from the thread that made
+    # the write. Versions are taken while the written rows are locked, so later writes of a user
+    # always have higher versions, even if their listeners are called first.
+    balance_listeners: list[Callable[[dict[int, int], int], None]] = []
+    # next() on a count is atomic, so versions are never repeated across threads
+    _balance_versions = itertools.count()
+
     @staticmethod
     def get_by_id(obj_id: int) -> BotUser:
         """
@@ -22,11 +40,22 @@ class BotUserDao(Dao[BotUser]):
     @staticmethod
     def get_by_ids(obj_ids: Iterable[int]) -> list[BotUser]:
         """
-        Return list with objects in obj_ids.
+        Return list with objects in obj_ids, ignoring the ids without an object.
+
+        The ids are queried in chunks of CHUNK_SIZE, all in the same transaction.
         """
+        obj_ids = list(dict.fromkeys(int(obj_id) for obj_id in obj_ids))
+        chunk_size = BotUserDao.CHUNK_SIZE
+        bot_users = []
+
         with Session.begin() as db_session:
-            statement = select(BotUser).filter(BotUser.id in obj_ids)
-            return db_session.scalars(statement).all()
+            for i in range(0, len(obj_ids), chunk_size):
+                statement = select(BotUser).filter(
+                    BotUser.__table__.c.id.in_(obj_ids[i : i + chunk_size])
+                )
+                bot_users.extend(db_session.scalars(statement))
+
+        return bot_users
 
     @staticmethod
     def get_all() -> list[BotUser]:
@@ -38,20 +67,33 @@ class BotUserDao(Dao[BotUser]):
 
     @staticmethod
     def save(*objs: BotUser):
-        with Session.begin() as db_session:
+        user_ids = [obj.id for obj in objs]
+        with bot_user_cache.invalidating(*user_ids), Session.begin() as db_session:
             db_session.add_all(objs)
+            balances = BotUserDao._written_balances(objs)
+            db_session.flush()
+            version = next(BotUserDao._balance_versions)
             db_session.commit()
 
+        BotUserDao._notify_balance_listeners(balances, version)
+
     @staticmethod
     def update(*objs: BotUser):
-        with Session.begin() as db_session:
+        user_ids = [obj.id for obj in objs]
+        with bot_user_cache.invalidating(*user_ids), Session.begin() as db_session:
             not_added_objs = [obj for obj in objs if obj not in db_session]
             db_session.add_all(not_added_objs)
+            balances = BotUserDao._written_balances(objs)
+            db_session.flush()
+            version = next(BotUserDao._balance_versions)
             db_session.commit()
 
+        BotUserDao._notify_balance_listeners(balances, version)
+
     @staticmethod
     def delete(*objs: BotUser):
-        with Session.begin() as db_session:
+        user_ids = [obj.id for obj in objs]
+        with bot_user_cache.invalidating(*user_ids), Session.begin() as db_session:
             for obj in objs:
                 db_session.delete(obj)
 
@@ -63,8 +105,328 @@ class BotUserDao(Dao[BotUser]):
             query = select(BotUser).filter(BotUser.bot_joined_channel)
             return list(db_session.execute(query).scalars())
 
+    @staticmethod
+    def get_by_login_names(login_names: Iterable[str]) -> list[BotUser]:
+        """
+        Return list with the objects whose login name is in login_names, ignoring the
+        names without an object.
+
+        The names are queried in chunks of CHUNK_SIZE, all in the same transaction.
+        """
+        login_names = list(dict.fromkeys(name.lower() for name in login_names))
+        chunk_size = BotUserDao.CHUNK_SIZE
+        bot_users = []
+
+        with Session.begin() as db_session:
+            for i in range(0, len(login_names), chunk_size):
+                statement = select(BotUser).filter(
+                    BotUser.__table__.c.login_name.in_(login_names[i : i + chunk_size])
+                )
+                bot_users.extend(db_session.scalars(statement))
+
+        return bot_users
+
+    @staticmethod
+    def save_names(id_to_names: dict[int, tuple[str, str]]):
+        """
+        Store the login and display name of each user, creating the users that don't exist
+        yet. All names are written in a single transaction, with one statement per
+        CHUNK_SIZE users.
+
+        Login names are unique, so a name taken over after a rename is removed from the
+        user who had it before. If several users have the same login name, the last one keeps it.
+
+        :param id_to_names: dictionary mapping a user id to their lowercase login name and
+            their display name
+        """
+        if not id_to_names:
+            return
+
+        login_name_to_id = {
+            login_name: user_id for user_id, (login_name, _) in id_to_names.items()
+        }
+        rows = [
+            BotUserDao._new_bot_user_row(user_id, 0)
+            | {
+                "login_name": (
+                    login_name if login_name_to_id[login_name] == user_id else None
+                ),
+                "display_name": display_name,
+            }
+            for user_id, (login_name, display_name) in id_to_names.items()
+        ]
+        login_names = list(login_name_to_id)
+        chunk_size = BotUserDao.CHUNK_SIZE
+        table = BotUser.__table__
+
+        with bot_user_cache.invalidating(*id_to_names), Session.begin() as db_session:
+            # Rows written below are cleared too, so users swapping names don't conflict
+            # with each other's old name while the rows are written one after the other
+            cleared_ids = []
+            for i in range(0, len(login_names), chunk_size):
+                cleared_ids.extend(
+                    db_session.execute(
+                        select(table.c.id).where(
+                            table.c.login_name.in_(login_names[i : i + chunk_size])
+                        )
+                    ).scalars()
+                )
+                db_session.execute(
+                    update(table)
+                    .where(table.c.login_name.in_(login_names[i : i + chunk_size]))
+                    .values(login_name=None)
+                )
+
+            for i in range(0, len(rows), chunk_size):
+                insert = BotUserDao._dialect_insert(db_session)
+                statement = insert(BotUser.__table__).values(rows[i : i + chunk_size])
+                db_session.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[BotUser.__table__.c.id],
+                        set_={
+                            "login_name": statement.excluded.login_name,
+                            "display_name": statement.excluded.display_name,
+                        },
+                    )
+                )
+
+        # The users who lost their login name are invalidated once it was committed
+        bot_user_cache.invalidate(*cleared_ids)
+
     @staticmethod
     def get_until_limit_order_by_balance_desc(limit: int) -> list[BotUser]:
         with Session.begin() as db_session:
             query = select(BotUser).order_by(desc(BotUser.balance)).limit(limit)
             return list(db_session.execute(query).scalars())
+
+    @staticmethod
+    def add_to_balances(balance_deltas: dict[int, int]) -> dict[int, int]:
+        """
+        Add each delta to the balance of the user with its id, creating the users that
+        don't exist yet. All changes are written in a single transaction, with one statement
+        per CHUNK_SIZE users.
+
+        The deltas are applied relative to the stored balance, so changes made by other
+        writers between reading and flushing the deltas are not overwritten.
+
+        :param balance_deltas: dictionary mapping a user id to the amount added to their balance
+        :return: dictionary mapping each user id to their new balance
+        """
+        if not balance_deltas:
+            return dict()
+
+        rows = [
+            BotUserDao._new_bot_user_row(user_id, delta)
+            for user_id, delta in balance_deltas.items()
+        ]
+        chunk_size = BotUserDao.CHUNK_SIZE
+        balances = dict()
+
+        with bot_user_cache.invalidating(
+            *balance_deltas
+        ), Session.begin() as db_session:
+            for i in range(0, len(rows), chunk_size):
+                statement = BotUserDao._add_to_balance_statement(db_session).values(
+                    rows[i : i + chunk_size]
+                )
+                balances.update(
+                    BotUserDao._execute_returning_balances(
+                        db_session,
+                        statement,
+                        [row["id"] for row in rows[i : i + chunk_size]],
+                    )
+                )
+
+            version = next(BotUserDao._balance_versions)
+
+        BotUserDao._notify_balance_listeners(balances, version)
+        return balances
+
+    @staticmethod
+    def deposit(user_id: int, amount: int) -> int:
+        """
+        Atomically add amount to the user's balance, creating the user if it doesn't exist.
+
+        :return: the user's new balance
+        """
+        with bot_user_cache.invalidating(user_id), Session.begin() as db_session:
+            balance = BotUserDao._deposit(db_session, user_id, amount)
+            version = next(BotUserDao._balance_versions)
+
+        BotUserDao._notify_balance_listeners({user_id: balance}, version)
+        return balance
+
+    @staticmethod
+    def withdraw(user_id: int, amount: int) -> int:
+        """
+        Atomically subtract amount from the user's balance, only if the balance is enough.
+
+        :return: the user's new balance
+        :raises: NotEnoughCoinError if the user doesn't exist or doesn't have enough coins
+        """
+        with bot_user_cache.invalidating(user_id), Session.begin() as db_session:
+            balance = BotUserDao._withdraw(db_session, user_id, amount)
+            version = next(BotUserDao._balance_versions)
+
+        BotUserDao._notify_balance_listeners({user_id: balance}, version)
+        return balance
+
+    @staticmethod
+    def transfer(from_user_id: int, to_user_id: int, amount: int) -> tuple[int, int]:
+        """
+        Atomically move amount from one user's balance to another's in a single transaction,
+        only if the sender has enough coins. The receiver is created if it doesn't exist.
+
+        :return: the new balances of the sender and receiver
+        :raises: NotEnoughCoinError if the sender doesn't exist or doesn't have enough coins
+        """
+        with bot_user_cache.invalidating(
+            from_user_id, to_user_id
+        ), Session.begin() as db_session:
+            from_balance = BotUserDao._withdraw(db_session, from_user_id, amount)
+            to_balance = BotUserDao._deposit(db_session, to_user_id, amount)
+            version = next(BotUserDao._balance_versions)
+
+        BotUserDao._notify_balance_listeners(
+            {from_user_id: from_balance, to_user_id: to_balance}, version
+        )
+        return from_balance, to_balance
+
+    @staticmethod
+    def _deposit(db_session: OrmSession, user_id: int, amount: int) -> int:
+        statement = BotUserDao._add_to_balance_statement(db_session).values(
+            BotUserDao._new_bot_user_row(user_id, amount)
+        )
+        return BotUserDao._execute_returning_balance(db_session, statement, user_id)
+
+    @staticmethod
+    def _withdraw(db_session: OrmSession, user_id: int, amount: int) -> int:
+        """
+        :raises: NotEnoughCoinError, rolling back the transaction of db_session
+        """
+        statement = (
+            update(BotUser.__table__)
+            .where(BotUser.__table__.c.id == user_id)
+            .where(BotUser.__table__.c.balance >= amount)
+            .values(balance=BotUser.__table__.c.balance - amount)
+        )
+        balance = BotUserDao._execute_returning_balance(db_session, statement, user_id)
+
+        if balance is None:
+            raise NotEnoughCoinError(f"User {user_id} has less than {amount} coins")
+
+        return balance
+
+    @staticmethod
+    def _execute_returning_balance(
+        db_session: OrmSession, statement, user_id: int
+    ) -> Optional[int]:
+        """
+        Execute an insert or update of a single user and return the user's new balance,
+        or None if no row was changed.
+
+        Uses RETURNING so no extra round-trip is needed. Dialects without RETURNING support
+        read the balance in the same transaction instead.
+        """
+        if db_session.get_bind().dialect.full_returning:
+            statement = statement.returning(BotUser.__table__.c.balance)
+            return db_session.execute(statement).scalar_one_or_none()
+
+        if db_session.execute(statement).rowcount == 0:
+            return None
+
+        return db_session.execute(
+            select(BotUser.__table__.c.balance).where(BotUser.__table__.c.id == user_id)
+        ).scalar_one()
+
+    @staticmethod
+    def _execute_returning_balances(
+        db_session: OrmSession, statement, user_ids: list[int]
+    ) -> dict[int, int]:
+        """
+        Execute an insert or update of multiple users and return their new balances.
+        Like _execute_returning_balance, the balances are read in the same transaction
+        by dialects without RETURNING support.
+
+        :return: dictionary mapping each changed user id to their new balance
+        """
+        table = BotUser.__table__
+
+        if db_session.get_bind().dialect.full_returning:
+            statement = statement.returning(table.c.id, table.c.balance)
+            return dict(db_session.execute(statement).all())
+
+        db_session.execute(statement)
+        return dict(
+            db_session.execute(
+                select(table.c.id, table.c.balance).where(table.c.id.in_(user_ids))
+            ).all()
+        )
+
+    @staticmethod
+    def _written_balances(objs: Iterable[BotUser]) -> dict[int, int]:
+        """
+        Return the balances the next flush writes, which are the ones of new users and of
+        users whose balance was changed. Must be called before the flush, which clears the
+        changes.
+
+        Users read earlier and updated for other fields keep the balance they were read with,
+        which may be older than the stored one, so it isn't sent to the balance listeners.
+        """
+        balances = dict()
+
+        for obj in objs:
+            state = inspect(obj)
+            if state.pending or state.attrs.balance.history.has_changes():
+                balances[obj.id] = obj.balance
+
+        return balances
+
+    @staticmethod
+    def _notify_balance_listeners(balances: dict[int, int], version: int) -> None:
+        if not balances:
+            return
+
+        for listener in BotUserDao.balance_listeners:
+            try:
+                listener(balances, version)
+            except Exception as e:
+                # The write was already committed, so a failing listener can't undo it
+                logging.exception(e)
+
+    @staticmethod
+    def _add_to_balance_statement(db_session: OrmSession):
+        """
+        Return an insert of new users that adds the inserted balance to the stored one
+        when the user already exists.
+        """
+        insert = BotUserDao._dialect_insert(db_session)
+        statement = insert(BotUser.__table__)
+        return statement.on_conflict_do_update(
+            index_elements=[BotUser.__table__.c.id],
+            set_={"balance": BotUser.__table__.c.balance + statement.excluded.balance},
+        )
+
+    @staticmethod
+    def _new_bot_user_row(user_id: int, balance: int) -> dict:
+        return {
+            "id": user_id,
+            "balance": balance,
+            "bot_joined_channel": False,
+            "bot_command_prefix": "$",
+            "login_name": None,
+            "display_name": None,
+        }
+
+    @staticmethod
+    def _dialect_insert(db_session: OrmSession):
+        """
+        Return the insert construct of the session's dialect, which supports ON CONFLICT.
+
+        SQLite is supported so the DAO can be used against an in-memory database.
+        """
+        match db_session.get_bind().dialect.name:
+            case "sqlite":
+                return sqlite.insert
+            case _:
+                return postgresql.insert
@@ -0,0 +1,57 @@
+from typing import Iterable
+
+from sqlalchemy import delete, select
+
+from hashtablebot.entity.channel_no_prefix_command import ChannelNoPrefixCommand
+from hashtablebot.persistence.bot_user_dao import BotUserDao
+from hashtablebot.persistence.session import Session
+
+
+class ChannelNoPrefixCommandDao:
+    @staticmethod
+    def get_by_channel_ids(
+        channel_ids: Iterable[int],
+    ) -> list[ChannelNoPrefixCommand]:
+        """
+        Return the commands of every channel in channel_ids.
+
+        Like BotUserDao.get_by_ids, the ids are queried in chunks of BotUserDao.CHUNK_SIZE,
+        all in the same transaction.
+        """
+        channel_ids = list(dict.fromkeys(int(channel_id) for channel_id in channel_ids))
+        chunk_size = BotUserDao.CHUNK_SIZE
+        commands = []
+
+        with Session.begin() as db_session:
+            for i in range(0, len(channel_ids), chunk_size):
+                statement = select(ChannelNoPrefixCommand).filter(
+                    ChannelNoPrefixCommand.__table__.c.channel_id.in_(
+                        channel_ids[i : i + chunk_size]
+                    )
+                )
+                commands.extend(db_session.scalars(statement))
+
+        return commands
+
+    @staticmethod
+    def save(command: ChannelNoPrefixCommand):
+        """
+        Save the command, replacing the response of the channel's command with the same names.
+        """
+        with Session.begin() as db_session:
+            db_session.merge(command)
+
+    @staticmethod
+    def delete(channel_id: int, names: str) -> bool:
+        """
+        Delete the channel's command with names.
+
+        :return: whether a command was deleted
+        """
+        with Session.begin() as db_session:
+            statement = (
+                delete(ChannelNoPrefixCommand)
+                .where(ChannelNoPrefixCommand.channel_id == channel_id)
+                .where(ChannelNoPrefixCommand.names == names)
+            )
+            return db_session.execute(statement).rowcount > 0
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from typing import Optional
+
+from hashtablebot.lru_cache import LRUCache
+from hashtablebot.persistence.async_bot_user_dao import AsyncBotUserDao
+
+
+class UserNameWriteBuffer:
+    """
+    Write-behind buffer keeping the stored names of users up to date from their messages.
+
+    Names are written by BotUserDao.save_names in one statement for every user whose names
+    changed since they were last written, every flush_interval_in_seconds, as soon as
+    max_pending_users users have new names, and when the buffer is closed.
+
+    The names written last are remembered for up to max_known_users users, so users who keep
+    chatting are only written again when they rename themselves or are evicted.
+    """
+
+    DEFAULT_FLUSH_INTERVAL_IN_SECONDS = 30.0
+    DEFAULT_MAX_PENDING_USERS = 500
+    DEFAULT_MAX_KNOWN_USERS = 100_000
+
+    def __init__(
+        self,
+        flush_interval_in_seconds: float = DEFAULT_FLUSH_INTERVAL_IN_SECONDS,
+        max_pending_users: int = DEFAULT_MAX_PENDING_USERS,
+        max_known_users: int = DEFAULT_MAX_KNOWN_USERS,
+    ):
+        self.flush_interval_in_seconds = flush_interval_in_seconds
+        self.max_pending_users = max_pending_users
+        # Maps user id to their login and display name, as they were last written
+        self._written: LRUCache[int, tuple[str, str]] = LRUCache(max_known_users)
+        # Maps user id to their login and display name that still have to be written
+        self._pending: dict[int, tuple[str, str]] = dict()
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def add(self, user_id: int, login_name: str, display_name: Optional[str]) -> None:
+        """
+        Buffer the names of the user with user_id, unless they were already written.
+        """
+        user_id = int(user_id)
+        names = (login_name.lower(), display_name or login_name)
+
+        if self._pending.get(user_id, self._written.get(user_id)) == names:
+            return
+
+        self._pending[user_id] = names
+
+        if len(self._pending) >= self.max_pending_users:
+            self._flush_requested.set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> None:
+        """
+        Write the names of every pending user to the database in one statement.
+
+        If the write fails the names are kept to be retried by the next flush.
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return
+
+            id_to_names, self._pending = self._pending, dict()
+
+            try:
+                await AsyncBotUserDao.save_names(id_to_names)
+            except Exception as e:
+                logging.exception(e)
+                # Names added since the flush started are newer, so they're kept
+                self._pending = id_to_names | self._pending
+                return
+
+            for user_id, names in id_to_names.items():
+                self._written.put(user_id, names)
+
+            logging.debug(f"Flushed names of {len(id_to_names)} users")
+
+    def start(self) -> None:
+        """
+        Start flushing the buffer periodically in the background.
+        """
+        if self._flush_task is None:
+            self._closing = False
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def close(self) -> None:
+        """
+        Stop the periodic flush and write every pending name.
+        """
+        if self._flush_task is not None:
+            self._closing = True
+            self._flush_requested.set()
+            await self._flush_task
+            self._flush_task = None
+
+        await self.flush()
+
+    async def _flush_periodically(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(
+                    self._flush_requested.wait(), self.flush_interval_in_seconds
+                )
+            except asyncio.TimeoutError:
+                pass
+
+            self._flush_requested.clear()
+            await self.flush()
@@ -1,11 +1,19 @@
+import asyncio
 import dataclasses
 import logging
+import sqlite3
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from enum import StrEnum, auto
+from typing import Awaitable, Callable, Optional, Protocol
 
-import translators as tss
-from translators.server import TranslatorError
 from twitchio import Channel, Message, User
 
+from hashtablebot.lru_cache import LRUCache
+from hashtablebot.metrics import translation_duration
+from hashtablebot.user_resolver import ResolvedUser, UserResolver
+
 DEFAULT_SOURCE_LANG = "auto"
 DEFAULT_TARGET_LANG = "en"
 
@@ -17,7 +25,7 @@ class TranslatedUser:
     translated by the bot from source to target language.
     """
 
-    user: User
+    user: User | ResolvedUser
     source_lang: str
     target_lang: str
     channel: Channel
@@ -45,30 +53,497 @@ class TranslationType(StrEnum):
         return ", ".join((t for t in TranslationType))
 
 
-def translate_text(
-    text, source_lang=DEFAULT_SOURCE_LANG, target_lang=DEFAULT_TARGET_LANG
-) -> str:
+class TranslationError(Exception):
+    """
+    Raised when a text could not be translated.
+    """
+
+
+class TranslationBackend(Protocol):
+    """
+    Service that does the actual translation. Its methods may block, so they're not called
+    from the event loop directly.
+    """
+
+    def translate(self, text: str, source_lang: str, target_lang: str) -> str:
+        """
+        :raises: TranslationError
+        """
+        ...
+
+    def translate_batch(
+        self, texts: list[str], source_lang: str, target_lang: str
+    ) -> list[str]:
+        """
+        Translate several texts with a single request.
+
+        :return: the translations, in the same order as texts
+        :raises: TranslationError
+        """
+        ...
+
+
+class GoogleTranslationBackend:
+    """
+    Translates with Google Translate through the translators package.
+    """
+
+    def translate(self, text: str, source_lang: str, target_lang: str) -> str:
+        # Importing translators connects to the internet, so it's only done when it's needed
+        import translators as tss
+
+        try:
+            return tss.server.google(text, source_lang, target_lang)
+        except Exception as e:
+            raise TranslationError(e) from e
+
+    def translate_batch(
+        self, texts: list[str], source_lang: str, target_lang: str
+    ) -> list[str]:
+        """
+        Translate the texts as a single one with a line per text. If the translation
+        doesn't keep the lines, each text is translated separately.
+        """
+        translation = self.translate("\n".join(texts), source_lang, target_lang)
+        translations = translation.split("\n")
+
+        if len(translations) == len(texts):
+            return translations
+
+        logging.debug("Batched translation changed the lines, translating separately")
+        return [self.translate(text, source_lang, target_lang) for text in texts]
+
+
+# (text, source_lang, target_lang)
+TranslationKey = tuple[str, str, str]
+
+
+class TranslationCache:
     """
-    Directly calls the translation API with text and source and target language, and returns
-    the translated text or gives an exception.
-    :param text: text to be translated
-    :param source_lang: language the text is in
-    :param target_lang: language to translate it to
-    :return: translated text
-    :raises TranslatorError
+    Cache of translated texts, since chat repeats the same messages a lot (emotes, copypastas).
+
+    Translations are kept in memory with LRU eviction and an optional TTL. If database_path is
+    passed, they're also stored in an SQLite database, so the cache is still warm after a restart.
+    Translations missing from memory are looked up in the database and moved back to memory.
+
+    The database is only used from a dedicated thread, so lookups and writes never block the
+    event loop. Writes are queued to that thread without being awaited.
     """
-    logging.debug(f"Translating from '{source_lang}' to '{target_lang}' text '{text}'.")
 
-    if not text:
-        raise TranslatorError
+    DEFAULT_MAX_SIZE = 10_000
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_MAX_SIZE,
+        ttl: Optional[float] = None,
+        database_path: Optional[str] = None,
+    ):
+        """
+        :param max_size: maximum number of translations kept in memory
+        :param ttl: seconds a translation stays valid, None to never expire
+        :param database_path: path of the SQLite database file, None to only cache in memory
+        """
+        self.ttl = ttl
+        self.database_hits = 0
+        self._memory: LRUCache[TranslationKey, str] = LRUCache(max_size, ttl)
+        self._database: Optional[sqlite3.Connection] = None
+        self._database_executor: Optional[ThreadPoolExecutor] = None
+
+        if database_path is not None:
+            # Only used by the single thread of the executor after this
+            self._database = sqlite3.connect(database_path, check_same_thread=False)
+            self._database.execute("PRAGMA journal_mode=WAL")
+            self._database.execute("PRAGMA synchronous=NORMAL")
+            self._database.execute(
+                "CREATE TABLE IF NOT EXISTS translation ("
+                "text TEXT, source_lang TEXT, target_lang TEXT, translation TEXT, created_at REAL, "
+                "PRIMARY KEY (text, source_lang, target_lang))"
+            )
+            if ttl is not None:
+                self._database.execute(
+                    "DELETE FROM translation WHERE created_at < ?", (time.time() - ttl,)
+                )
+            self._database.commit()
+            self._database_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="hashtablebot-translation-cache"
+            )
+
+    @property
+    def hits(self) -> int:
+        """
+        :return: lookups found in memory or in the database
+        """
+        return self._memory.hits + self.database_hits
+
+    @property
+    def misses(self) -> int:
+        return self._memory.misses - self.database_hits
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    async def get(self, key: TranslationKey) -> Optional[str]:
+        """
+        :return: the cached translation for (text, source_lang, target_lang), None if it's not cached
+        """
+        if (translation := self._memory.get(key)) is not None:
+            return translation
+
+        if self._database_executor is None:
+            return None
+
+        loop = asyncio.get_running_loop()
+        translation = await loop.run_in_executor(
+            self._database_executor, self._select, key
+        )
+
+        if translation is None:
+            return None
+
+        self.database_hits += 1
+        self._memory.put(key, translation)
+        return translation
+
+    def put(self, key: TranslationKey, translation: str) -> None:
+        """
+        Cache the translation in memory, and queue writing it to the database.
+        """
+        self._memory.put(key, translation)
+
+        if self._database_executor is not None:
+            self._database_executor.submit(self._insert, key, translation, time.time())
+
+    def _select(self, key: TranslationKey) -> Optional[str]:
+        row = self._database.execute(
+            "SELECT translation, created_at FROM translation "
+            "WHERE text = ? AND source_lang = ? AND target_lang = ?",
+            key,
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        translation, created_at = row
+
+        if self.ttl is not None and created_at < time.time() - self.ttl:
+            return None
+
+        return translation
+
+    def _insert(self, key: TranslationKey, translation: str, created_at: float) -> None:
+        try:
+            self._database.execute(
+                "INSERT OR REPLACE INTO translation VALUES (?, ?, ?, ?, ?)",
+                (*key, translation, created_at),
+            )
+            self._database.commit()
+        except sqlite3.Error as e:
+            # The translation is still cached in memory
+            logging.exception(e)
+
+    def __len__(self) -> int:
+        """
+        :return: number of translations in memory
+        """
+        return len(self._memory)
 
-    return tss.server.google(text, source_lang, target_lang)
+    def close(self) -> None:
+        """
+        Wait for the queued writes and close the database.
+
+        This blocks until the writes are done, so async code should run it in an executor.
+        """
+        if self._database_executor is not None:
+            self._database_executor.shutdown(wait=True)
+            self._database_executor = None
+
+        if self._database is not None:
+            self._database.close()
+            self._database = None
+
+
+@dataclasses.dataclass
+class _PendingBatch:
+    texts: list[str] = dataclasses.field(default_factory=list)
+    futures: list[asyncio.Future[str]] = dataclasses.field(default_factory=list)
+
+
+class TranslationBatcher:
+    """
+    Collects texts with the same source and target languages for up to max_latency_in_seconds
+    and translates them with a single batched request, then gives each caller its translation.
+
+    A batch is sent earlier if it reaches max_batch_size texts. At most max_concurrent_batches
+    batches are translated at once, and the next ones wait for them.
+    """
+
+    DEFAULT_MAX_LATENCY_IN_SECONDS = 0.25
+    DEFAULT_MAX_BATCH_SIZE = 20
+    DEFAULT_MAX_CONCURRENT_BATCHES = 4
+
+    def __init__(
+        self,
+        translate_batch: Callable[[list[str], str, str], Awaitable[list[str]]],
+        max_latency_in_seconds: float = DEFAULT_MAX_LATENCY_IN_SECONDS,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_concurrent_batches: int = DEFAULT_MAX_CONCURRENT_BATCHES,
+    ):
+        """
+        :param translate_batch: coroutine function translating a list of texts from source to target language
+        :param max_latency_in_seconds: maximum time a text waits for other texts to be batched with
+        :param max_batch_size: maximum number of texts in a batch
+        :param max_concurrent_batches: maximum number of batches translated at once
+        """
+        self._translate_batch = translate_batch
+        self.max_latency_in_seconds = max_latency_in_seconds
+        self.max_batch_size = max_batch_size
+        self._batch_semaphore = asyncio.Semaphore(max_concurrent_batches)
+        # Maps (source_lang, target_lang) to the batch being collected
+        self._batches: dict[tuple[str, str], _PendingBatch] = dict()
+        # References to running translations, so they're not garbage collected
+        self._tasks: set[asyncio.Task] = set()
+
+    async def translate(self, text: str, source_lang: str, target_lang: str) -> str:
+        """
+        :return: the translation of text, once its batch is translated
+        :raises: TranslationError
+        """
+        languages = source_lang, target_lang
+        loop = asyncio.get_running_loop()
+
+        if (batch := self._batches.get(languages)) is None:
+            batch = self._batches[languages] = _PendingBatch()
+            loop.call_later(self.max_latency_in_seconds, self._send, languages, batch)
+
+        future: asyncio.Future[str] = loop.create_future()
+        batch.texts.append(text)
+        batch.futures.append(future)
+
+        if len(batch.texts) >= self.max_batch_size:
+            self._send(languages, batch)
+
+        return await future
+
+    def _send(self, languages: tuple[str, str], batch: _PendingBatch) -> None:
+        # The batch may have been sent already for reaching the maximum size
+        if self._batches.get(languages) is not batch:
+            return
+
+        del self._batches[languages]
+        task = asyncio.create_task(self._translate(languages, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _translate(
+        self, languages: tuple[str, str], batch: _PendingBatch
+    ) -> None:
+        # Identical texts in the batch are only translated once
+        unique_texts = list(dict.fromkeys(batch.texts))
+        logging.debug(f"Translating batch of {len(unique_texts)} texts {languages}")
+
+        try:
+            async with self._batch_semaphore:
+                translated_texts = await self._translate_batch(unique_texts, *languages)
+
+            if len(translated_texts) != len(unique_texts):
+                raise TranslationError(
+                    f"Got {len(translated_texts)} translations for {len(unique_texts)} texts"
+                )
+        except Exception as e:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        translations = dict(zip(unique_texts, translated_texts))
+
+        for text, future in zip(batch.texts, batch.futures):
+            if not future.done():
+                future.set_result(translations[text])
 
 
 class Translator:
-    def __init__(self) -> None:
+    """
+    Handles the translate command and translates the messages of tracked users.
+
+    Backend calls run in a bounded thread pool so they don't block the event loop. Identical
+    translations requested while one is in flight share its result instead of calling the
+    backend again, and each channel can only have a limited number of translations running.
+    If a TranslationCache is passed, cached translations don't call the backend at all.
+
+    Messages of translated users are micro-batched by a TranslationBatcher, so users talking at
+    the same time in the same languages are translated with a single backend request.
+    """
+
+    DEFAULT_MAX_WORKERS = 8
+    DEFAULT_MAX_CONCURRENT_PER_CHANNEL = 2
+
+    def __init__(
+        self,
+        backend: Optional[TranslationBackend] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_concurrent_per_channel: int = DEFAULT_MAX_CONCURRENT_PER_CHANNEL,
+        cache: Optional[TranslationCache] = None,
+        batch_latency_in_seconds: float = TranslationBatcher.DEFAULT_MAX_LATENCY_IN_SECONDS,
+        user_resolver: Optional[UserResolver] = None,
+    ) -> None:
         # Dictionary mapping (channel_name, user_id) to TranslatedUser object
         self._translated_users: dict[tuple[str, int], TranslatedUser] = dict()
+        self._backend: TranslationBackend = backend or GoogleTranslationBackend()
+        self._cache = cache
+        # Resolves the users passed to adduser and rmuser, if not set they're fetched by the bot
+        self._user_resolver = user_resolver
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="hashtablebot-translation"
+        )
+        # Maps (text, source_lang, target_lang) to the task translating it
+        self._in_flight: dict[TranslationKey, asyncio.Task[str]] = dict()
+        self._channel_semaphores: defaultdict[
+            Optional[str], asyncio.Semaphore
+        ] = defaultdict(lambda: asyncio.Semaphore(max_concurrent_per_channel))
+        self._batcher = TranslationBatcher(
+            self._call_backend_batch, max_latency_in_seconds=batch_latency_in_seconds
+        )
+
+    async def translate_text(
+        self,
+        text: str,
+        source_lang: str = DEFAULT_SOURCE_LANG,
+        target_lang: str = DEFAULT_TARGET_LANG,
+        channel_name: Optional[str] = None,
+    ) -> str:
+        """
+        Translate text without blocking the event loop.
+
+        Cached translations are returned directly. If the same translation is already in flight,
+        its result is awaited instead.
+
+        :param text: text to be translated
+        :param source_lang: language the text is in
+        :param target_lang: language to translate it to
+        :param channel_name: channel the translation was requested in, used to limit concurrency
+        :return: translated text
+        :raises TranslationError
+        """
+        if not text:
+            raise TranslationError("No text was given")
+
+        key = (text, source_lang, target_lang)
+
+        if self._cache is not None and (translation := await self._cache.get(key)):
+            return translation
+
+        if (task := self._in_flight.get(key)) is None:
+            task = asyncio.create_task(
+                self._call_backend(text, source_lang, target_lang, channel_name)
+            )
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            logging.debug(f"Awaiting in-flight translation of '{text}'")
+
+        # Shielded so a cancelled requester doesn't cancel the translation for the others
+        return await asyncio.shield(task)
+
+    async def _call_backend(
+        self,
+        text: str,
+        source_lang: str,
+        target_lang: str,
+        channel_name: Optional[str],
+    ) -> str:
+        logging.debug(
+            f"Translating from '{source_lang}' to '{target_lang}' text '{text}'."
+        )
+
+        async with self._channel_semaphores[channel_name]:
+            loop = asyncio.get_running_loop()
+
+            with translation_duration.time("translate"):
+                translation = await loop.run_in_executor(
+                    self._executor,
+                    self._backend.translate,
+                    text,
+                    source_lang,
+                    target_lang,
+                )
+
+        if self._cache is not None:
+            self._cache.put((text, source_lang, target_lang), translation)
+
+        return translation
+
+    async def translate_batched(
+        self,
+        text: str,
+        source_lang: str,
+        target_lang: str,
+    ) -> str:
+        """
+        Translate text in a batch with other texts in the same languages, unless it's cached.
+
+        Like translate_text, a translation already in flight is awaited instead. Texts waiting
+        for a batch are not limited per channel, so the messages of a channel sent at the same
+        time share a batch. The batcher limits the batches translated at once instead.
+
+        :raises TranslationError
+        """
+        if not text:
+            raise TranslationError("No text was given")
+
+        key = (text, source_lang, target_lang)
+
+        if self._cache is not None and (translation := await self._cache.get(key)):
+            return translation
+
+        if (task := self._in_flight.get(key)) is None:
+            task = asyncio.create_task(
+                self._batcher.translate(text, source_lang, target_lang)
+            )
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            logging.debug(f"Awaiting in-flight translation of '{text}'")
+
+        return await asyncio.shield(task)
+
+    async def _call_backend_batch(
+        self, texts: list[str], source_lang: str, target_lang: str
+    ) -> list[str]:
+        loop = asyncio.get_running_loop()
+
+        with translation_duration.time("translate_batch"):
+            translations = await loop.run_in_executor(
+                self._executor,
+                self._backend.translate_batch,
+                texts,
+                source_lang,
+                target_lang,
+            )
+
+        if len(translations) != len(texts):
+            raise TranslationError(
+                f"Got {len(translations)} translations for {len(texts)} texts"
+            )
+
+        if self._cache is not None:
+            for text, translation in zip(texts, translations):
+                self._cache.put((text, source_lang, target_lang), translation)
+
+        return translations
+
+    def close(self) -> None:
+        """
+        Close the cache and stop the translation threads.
+
+        This blocks until the cache's queued writes are done.
+        """
+        self._executor.shutdown(wait=False)
+
+        if self._cache is not None:
+            self._cache.close()
 
     async def translate(self, ctx, args: tuple[str, ...]) -> str:
         """
@@ -96,7 +571,9 @@ class Translator:
                 Sending the translated message directly to chat allows users to execute
                 twitch commands using the bot. Don't remove the 'Translation' part.
                 """
-                return "Translation: " + await self._translate_message_text(other_args)
+                return "Translation: " + await self._translate_message_text(
+                    other_args, ctx.channel.name
+                )
 
             case TranslationType.adduser:
                 return await self._add_translated_user(ctx, other_args)
@@ -112,6 +589,12 @@ class Translator:
                 logging.error(error)
                 return error
 
+    def is_translated(self, channel_name: str, user_id: int) -> bool:
+        """
+        :return: whether the messages of the user in the channel are translated
+        """
+        return (channel_name, int(user_id)) in self._translated_users
+
     async def translate_user_message(self, message: Message) -> None:
         """
         Checks if message author is in the _translated_users list and
@@ -130,7 +613,7 @@ class Translator:
             logging.debug(
                 f"Translating '{message.content}' from '{user.source_lang}' to '{user.target_lang}'"
             )
-            translated_msg = tss.server.google(
+            translated_msg = await self.translate_batched(
                 message.content, user.source_lang, user.target_lang
             )
         except Exception as e:
@@ -139,7 +622,9 @@ class Translator:
 
         await message.channel.send(f"{message.author.name}: {translated_msg}")
 
-    async def _translate_message_text(self, other_args) -> str:
+    async def _translate_message_text(
+        self, other_args, channel_name: Optional[str] = None
+    ) -> str:
         try:
             source_lang, target_lang, *text = other_args
             text = " ".join(text)
@@ -156,8 +641,10 @@ class Translator:
             text = " ".join(other_args)
 
         try:
-            return translate_text(text, source_lang, target_lang)
-        except TranslatorError:
+            return await self.translate_text(
+                text, source_lang, target_lang, channel_name
+            )
+        except TranslationError:
             logging.debug("Initial translation failed, attempting with default values")
 
             """
@@ -169,8 +656,10 @@ class Translator:
             text = " ".join(other_args)
 
             try:
-                return translate_text(text, source_lang, target_lang)
-            except TranslatorError:
+                return await self.translate_text(
+                    text, source_lang, target_lang, channel_name
+                )
+            except TranslationError:
                 return "an unexpected error occurred on translation."
 
     async def _add_translated_user(self, ctx, other_args):
@@ -180,7 +669,7 @@ class Translator:
             return "not enough arguments. Include user, source language and target language"
 
         try:
-            (target_user,) = await ctx.bot.fetch_users(names=[target_user_name])
+            (target_user,) = await self._get_users_by_name(ctx, target_user_name)
         except Exception:
             return "user not found."
 
@@ -188,7 +677,7 @@ class Translator:
         self._translated_users[(ctx.channel.name, target_user.id)] = new_user
         return (
             f"Now translating user {new_user.user.name}. "
-            f"Use {await ctx.bot._prefix(self, ctx.message)}tl rmuser <user> to stop translating."
+            f"Use {await ctx.bot._prefix(ctx.bot, ctx.message)}tl rmuser <user> to stop translating."
         )
 
     async def _remove_translated_user(self, ctx, other_args):
@@ -198,7 +687,7 @@ class Translator:
             return "please include the target user."
 
         try:
-            (target_user,) = await ctx.bot.fetch_users(names=[target_user_name])
+            (target_user,) = await self._get_users_by_name(ctx, target_user_name)
         except Exception:
             return f"could not find user {target_user_name}"
 
@@ -210,6 +699,18 @@ class Translator:
             logging.exception(msg)
             return msg
 
+    async def _get_users_by_name(
+        self, ctx, name: str
+    ) -> list[User] | list[ResolvedUser]:
+        """
+        :return: list with the user with name, empty if there's no such user
+        """
+        if self._user_resolver is None:
+            return await ctx.bot.fetch_users(names=[name])
+
+        user = await self._user_resolver.get_user_by_name(name)
+        return [user] if user is not None else []
+
     async def _remove_all_translated_users(self, ctx):
         if not ctx.author.is_mod:
             return "you're not a moderator."
@@ -0,0 +1,220 @@
+import asyncio
+import dataclasses
+import logging
+from typing import Awaitable, Callable, Iterable, Optional, cast
+
+from twitchio import User
+
+from hashtablebot.lru_cache import LRUCache
+
+
+@dataclasses.dataclass(frozen=True)
+class ResolvedUser:
+    """
+    Id and names of a Twitch user.
+    """
+
+    id: int
+    # Lowercase login name, used in commands and channel names
+    name: str
+    display_name: str
+
+
+# ("id", user id) or ("login", lowercase login name)
+UserKey = tuple[str, int | str]
+
+
+class UserResolver:
+    """
+    Resolves Twitch user ids and names, caching the id to name mappings for ttl seconds.
+
+    Lookups that miss the cache wait up to batch_window_in_seconds for other lookups, then all
+    ids and names requested in the meantime are fetched with as few requests as possible, each
+    with up to MAX_USERS_PER_REQUEST users, which is the Helix maximum. Concurrent lookups of
+    the same user share a single request.
+
+    If fetch_stored_users is given, the users are first looked up in the local store, like the
+    database, and only the ones that aren't stored are requested from Helix.
+    """
+
+    MAX_USERS_PER_REQUEST = 100
+    DEFAULT_TTL_IN_SECONDS = 24 * 60 * 60
+    DEFAULT_BATCH_WINDOW_IN_SECONDS = 0.05
+    DEFAULT_MAX_SIZE = 100_000
+
+    def __init__(
+        self,
+        fetch_users: Callable[..., Awaitable[list[User]]],
+        ttl: Optional[float] = DEFAULT_TTL_IN_SECONDS,
+        batch_window_in_seconds: float = DEFAULT_BATCH_WINDOW_IN_SECONDS,
+        max_size: int = DEFAULT_MAX_SIZE,
+        fetch_stored_users: Optional[
+            Callable[[list[int], list[str]], Awaitable[list[ResolvedUser]]]
+        ] = None,
+    ):
+        """
+        :param fetch_users: coroutine function with the signature of Bot.fetch_users
+        :param ttl: seconds a mapping stays cached, None to keep it until evicted
+        :param batch_window_in_seconds: maximum time a lookup waits for others to be fetched with
+        :param max_size: maximum number of users cached
+        :param fetch_stored_users: coroutine function returning the stored users among the
+            ids and lowercase names it's called with
+        """
+        self._fetch_users = fetch_users
+        self._fetch_stored_users = fetch_stored_users
+        self.batch_window_in_seconds = batch_window_in_seconds
+        self._by_id: LRUCache[int, ResolvedUser] = LRUCache(max_size, ttl)
+        self._by_name: LRUCache[str, ResolvedUser] = LRUCache(max_size, ttl)
+        # Maps each user waiting to be fetched to the future its lookups await
+        self._pending: dict[UserKey, asyncio.Future[Optional[ResolvedUser]]] = dict()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # References to running fetches, so they're not garbage collected
+        self._tasks: set[asyncio.Task] = set()
+
+    def remember(self, user_id: int, name: str, display_name: str) -> None:
+        """
+        Cache a user whose id and names are already known, like the author of a message.
+        """
+        self._store(ResolvedUser(int(user_id), name.lower(), display_name or name))
+
+    async def get_users_by_ids(self, ids: Iterable[int]) -> dict[int, ResolvedUser]:
+        """
+        :return: dictionary mapping each id to its user, leaving out the ids without a user
+        """
+        users = await self._resolve([("id", int(user_id)) for user_id in ids])
+        return {user.id: user for user in users if user is not None}
+
+    async def get_users_by_names(self, names: Iterable[str]) -> dict[str, ResolvedUser]:
+        """
+        :return: dictionary mapping each lowercase name to its user, leaving out the names without a user
+        """
+        users = await self._resolve([("login", name.lower()) for name in names])
+        return {user.name: user for user in users if user is not None}
+
+    async def get_user_by_name(self, name: str) -> Optional[ResolvedUser]:
+        (user,) = await self._resolve([("login", name.lower())])
+        return user
+
+    async def _resolve(self, keys: list[UserKey]) -> list[Optional[ResolvedUser]]:
+        users = {key: self._get_cached(key) for key in keys}
+        missing_keys = [key for key, user in users.items() if user is None]
+
+        if missing_keys:
+            # Shielded so a cancelled lookup doesn't cancel the others waiting for the same users
+            fetched_users = await asyncio.gather(
+                *(asyncio.shield(self._get_pending(key)) for key in missing_keys)
+            )
+            users.update(zip(missing_keys, fetched_users))
+
+        return [users[key] for key in keys]
+
+    def _get_cached(self, key: UserKey) -> Optional[ResolvedUser]:
+        kind, value = key
+
+        if kind == "id":
+            return self._by_id.get(cast(int, value))
+
+        return self._by_name.get(cast(str, value))
+
+    def _get_pending(self, key: UserKey) -> asyncio.Future[Optional[ResolvedUser]]:
+        if (future := self._pending.get(key)) is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = self._pending[key] = loop.create_future()
+
+        if len(self._pending) >= self.MAX_USERS_PER_REQUEST:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(
+                self.batch_window_in_seconds, self._flush
+            )
+
+        return future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        pending = list(self._pending.items())
+        self._pending = dict()
+
+        for i in range(0, len(pending), self.MAX_USERS_PER_REQUEST):
+            task = asyncio.create_task(
+                self._fetch(dict(pending[i : i + self.MAX_USERS_PER_REQUEST]))
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(
+        self, pending: dict[UserKey, asyncio.Future[Optional[ResolvedUser]]]
+    ) -> None:
+        ids = [cast(int, value) for kind, value in pending if kind == "id"]
+        names = [cast(str, value) for kind, value in pending if kind == "login"]
+
+        try:
+            users = await self._get_stored(ids, names)
+            stored_keys: set[UserKey] = {("id", user.id) for user in users}
+            stored_keys.update(("login", user.name) for user in users)
+            ids = [user_id for user_id in ids if ("id", user_id) not in stored_keys]
+            names = [name for name in names if ("login", name) not in stored_keys]
+
+            if ids or names:
+                logging.debug(
+                    f"Fetching {len(ids)} user ids and {len(names)} user names"
+                )
+                twitch_users = await self._fetch_users(
+                    names=names or None, ids=ids or None
+                )
+                users.extend(
+                    ResolvedUser(
+                        int(twitch_user.id),
+                        twitch_user.name.lower(),
+                        twitch_user.display_name or twitch_user.name,
+                    )
+                    for twitch_user in twitch_users
+                )
+        except Exception as e:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        fetched: dict[UserKey, ResolvedUser] = dict()
+
+        for user in users:
+            self._store(user)
+            fetched[("id", user.id)] = user
+            fetched[("login", user.name)] = user
+
+        for key, future in pending.items():
+            if not future.done():
+                future.set_result(fetched.get(key))
+
+    async def _get_stored(self, ids: list[int], names: list[str]) -> list[ResolvedUser]:
+        """
+        :return: the stored users among ids and names, none if the store can't be read
+        """
+        if self._fetch_stored_users is None or not (ids or names):
+            return []
+
+        try:
+            return list(await self._fetch_stored_users(ids, names))
+        except Exception as e:
+            # Helix can still be used to resolve the users
+            logging.exception(e)
+            return []
+
+    def _store(self, user: ResolvedUser) -> None:
+        self._by_id.put(user.id, user)
+        self._by_name.put(user.name, user)
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        :return: fraction of lookups that were answered from the cache
+        """
+        hits = self._by_id.hits + self._by_name.hits
+        lookups = hits + self._by_id.misses + self._by_name.misses
+        return hits / lookups if lookups else 0.0
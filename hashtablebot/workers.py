@@ -0,0 +1,182 @@
+import dataclasses
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+import zlib
+from typing import Callable, Optional
+
+
+def partition_index(channel_name: str, partition_count: int) -> int:
+    """
+    :return: index of the partition that owns the channel, the same in every process
+    """
+    # crc32 instead of hash, which is salted differently in every process
+    return zlib.crc32(channel_name.lower().lstrip("#").encode()) % partition_count
+
+
+@dataclasses.dataclass(frozen=True)
+class ChannelPartition:
+    """
+    The channels owned by a worker, out of partition_count partitions.
+    """
+
+    index: int
+    count: int
+
+    def owns(self, channel_name: str) -> bool:
+        return partition_index(channel_name, self.count) == self.index
+
+
+class WorkerCoordinator:
+    """
+    Runs one worker process per channel partition and starts a new worker for the partition
+    of every worker that dies, after restart_delay_in_seconds so a crashing worker isn't
+    restarted in a tight loop. Workers that exit with code 0 are not replaced.
+
+    Every worker is stopped when the coordinator's process receives SIGTERM, which the shutdown
+    command sends from any worker.
+
+    Workers only share state through the database, so the coordinator just tells each worker
+    which partition it owns. They're spawned instead of forked, so they don't inherit the
+    thread pools and event loop of the coordinator's process.
+    """
+
+    DEFAULT_RESTART_DELAY_IN_SECONDS = 5.0
+    DEFAULT_POLL_INTERVAL_IN_SECONDS = 1.0
+
+    def __init__(
+        self,
+        worker_count: int,
+        target: Callable[[ChannelPartition], None],
+        restart_delay_in_seconds: float = DEFAULT_RESTART_DELAY_IN_SECONDS,
+    ):
+        """
+        :param worker_count: number of worker processes and channel partitions
+        :param target: picklable function run by each worker with its partition
+        :param restart_delay_in_seconds: seconds between a worker's death and the start of its replacement
+        """
+        if worker_count < 1:
+            raise ValueError("There must be at least one worker")
+
+        self.worker_count = worker_count
+        self._target = target
+        self.restart_delay_in_seconds = restart_delay_in_seconds
+        # Maps partition index to the process of the worker that owns it
+        self._processes: dict[int, multiprocessing.process.BaseProcess] = dict()
+        # Maps partition index to the time.monotonic its dead worker will be replaced at
+        self._restart_times: dict[int, float] = dict()
+        # Set by request_stop to make run stop the workers and return
+        self._stop_requested = threading.Event()
+
+    def start(self) -> None:
+        for index in range(self.worker_count):
+            self._start_worker(index)
+
+    def check_workers(self) -> list[int]:
+        """
+        Replace the dead workers whose restart delay has passed, and forget the workers that
+        exited cleanly.
+
+        :return: indexes of the partitions whose workers were replaced
+        """
+        now = time.monotonic()
+        restarted = []
+
+        for index, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+
+            if process.exitcode == 0:
+                logging.info(f"Worker of partition {index} exited")
+                del self._processes[index]
+                continue
+
+            if index not in self._restart_times:
+                logging.error(
+                    f"Worker of partition {index} died with exit code {process.exitcode}"
+                )
+                self._restart_times[index] = now + self.restart_delay_in_seconds
+
+            if self._restart_times[index] <= now:
+                del self._restart_times[index]
+                self._start_worker(index)
+                restarted.append(index)
+
+        return restarted
+
+    def run(
+        self, poll_interval_in_seconds: float = DEFAULT_POLL_INTERVAL_IN_SECONDS
+    ) -> None:
+        """
+        Start the workers and replace the ones that die until interrupted, then stop them.
+
+        Returns once every worker exited cleanly, or after request_stop is called or SIGTERM is
+        received when called from the main thread.
+        """
+        self._stop_requested.clear()
+        # Signal handlers can only be set from the main thread
+        previous_handler = None
+        if threading.current_thread() is threading.main_thread():
+            previous_handler = signal.signal(
+                signal.SIGTERM, lambda signum, frame: self.request_stop()
+            )
+
+        self.start()
+
+        try:
+            while self._processes:
+                if self._stop_requested.wait(poll_interval_in_seconds):
+                    logging.info("Stopping workers")
+                    break
+
+                self.check_workers()
+            else:
+                logging.info("Every worker exited")
+        except KeyboardInterrupt:
+            logging.info("Stopping workers")
+        finally:
+            self.stop()
+
+            if previous_handler is not None:
+                signal.signal(signal.SIGTERM, previous_handler)
+
+    def request_stop(self) -> None:
+        """
+        Make run stop every worker and return.
+        """
+        self._stop_requested.set()
+
+    def stop(self, timeout_in_seconds: Optional[float] = 10.0) -> None:
+        """
+        Terminate every worker, waiting up to timeout_in_seconds for each to exit.
+        """
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        for process in self._processes.values():
+            process.join(timeout_in_seconds)
+
+        self._processes.clear()
+        self._restart_times.clear()
+
+    def worker_pid(self, index: int) -> Optional[int]:
+        """
+        :return: process id of the worker that owns the partition, None if it isn't running
+        """
+        process = self._processes.get(index)
+        return process.pid if process is not None and process.is_alive() else None
+
+    def _start_worker(self, index: int) -> None:
+        partition = ChannelPartition(index, self.worker_count)
+        process = multiprocessing.get_context("spawn").Process(
+            target=self._target,
+            args=(partition,),
+            name=f"hashtablebot-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[index] = process
+        logging.info(f"Started worker {process.pid} for partition {index}")
@@ -0,0 +1,400 @@
+import asyncio
+import dataclasses
+import itertools
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional
+from unittest import mock
+
+import aiohttp
+from aiohttp import web
+from twitchio import AuthenticationError
+from twitchio.http import Route, TwitchHTTP
+
+
+@dataclasses.dataclass(frozen=True)
+class FakeTwitchUser:
+    id: int
+    login: str
+    display_name: str
+
+    def to_helix(self) -> dict:
+        """
+        :return: the user as returned by the Helix users endpoint
+        """
+        return {
+            "id": str(self.id),
+            "login": self.login,
+            "display_name": self.display_name,
+            "type": "",
+            "broadcaster_type": "",
+            "description": "",
+            "profile_image_url": "",
+            "offline_image_url": "",
+            "view_count": 0,
+            "created_at": "2020-01-01T00:00:00Z",
+        }
+
+
+class FakeIrcConnection:
+    """
+    A client connected to the IRC websocket of FakeTwitchServer.
+    """
+
+    def __init__(self, request: web.Request, websocket: web.WebSocketResponse):
+        self.request = request
+        self.websocket = websocket
+        self.nick: Optional[str] = None
+        self.authenticated = False
+        # Names of the channels joined through this connection
+        self.channels: set[str] = set()
+
+    async def send(self, *lines: str) -> None:
+        if lines and not self.websocket.closed:
+            await self.websocket.send_str("".join(f"{line}\r\n" for line in lines))
+
+
+class FakeTwitchServer:
+    """
+    Local stand-in for Twitch's IRC websocket and the Helix endpoints used by the bot,
+    to test the bot end to end without connecting to Twitch.
+
+    Serves, on a single local port:
+
+    - /irc: IRC over websocket, answering logins, CAP requests, JOIN, PART and PRIVMSG
+      like Twitch does, with the bot as a moderator of moderated_channels
+    - /helix/users: the users endpoint, used by fetch_users and channel.user()
+    - /oauth2/validate: the token validation, used when the bot logs in
+
+    Users are added with add_users, and chatters are added when they send a message.
+    Slow responses are simulated with helix_latency_in_seconds and join_latency_in_seconds,
+    and disconnects with disconnect.
+    """
+
+    BOT_LOGIN = "hashtablebot"
+    BOT_ID = 1
+    CLIENT_ID = "fakeclientid"
+    MAX_USERS_PER_REQUEST = 100
+
+    def __init__(self, token: str = "faketoken"):
+        self.token = token
+        self.port: Optional[int] = None
+        self.helix_latency_in_seconds = 0.0
+        self.join_latency_in_seconds = 0.0
+        self.helix_request_count = 0
+        # Most Helix requests that were being answered at the same time
+        self.max_concurrent_helix_requests = 0
+        self._concurrent_helix_requests = 0
+        # Maps lowercase login to user
+        self._users: dict[str, FakeTwitchUser] = dict()
+        self._user_ids = itertools.count(self.BOT_ID + 1)
+        self._users[self.BOT_LOGIN] = FakeTwitchUser(
+            self.BOT_ID, self.BOT_LOGIN, self.BOT_LOGIN
+        )
+        self.connections: set[FakeIrcConnection] = set()
+        # Maps channel name to the connections that joined it
+        self._channel_connections: defaultdict[
+            str, set[FakeIrcConnection]
+        ] = defaultdict(set)
+        # Channels where the bot gets moderator badges, so its messages aren't rate limited
+        self.moderated_channels: set[str] = set()
+        # (channel name, content) of every chat message sent by the bot
+        self.received_messages: list[tuple[str, str]] = []
+        self._message_ids = itertools.count()
+        self._runner: Optional[web.AppRunner] = None
+
+        app = web.Application()
+        app.router.add_get("/irc", self._handle_irc)
+        app.router.add_get("/helix/users", self._handle_users)
+        app.router.add_get("/oauth2/validate", self._handle_validate)
+        self._app = app
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self._app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def close(self) -> None:
+        for connection in list(self.connections):
+            await connection.websocket.close()
+
+        await self._runner.cleanup()
+
+    @contextmanager
+    def patch_twitchio(self) -> Iterator[None]:
+        """
+        Point twitchio at this server instead of Twitch while the context is active.
+        """
+
+        async def validate(http: TwitchHTTP, *, token: Optional[str] = None) -> dict:
+            # Same as TwitchHTTP.validate, whose URL can't be changed
+            if not http.session:
+                http.session = aiohttp.ClientSession()
+
+            headers = {"Authorization": f"OAuth {token or http.token}"}
+
+            async with http.session.get(
+                f"{self.url}/oauth2/validate", headers=headers
+            ) as response:
+                if response.status == 401:
+                    raise AuthenticationError("Invalid or unauthorized Access Token")
+                data = await response.json()
+
+            if not http.nick:
+                http.nick = data["login"]
+                http.user_id = int(data["user_id"])
+                http.client_id = data["client_id"]
+
+            return data
+
+        with mock.patch("twitchio.websocket.HOST", f"ws://127.0.0.1:{self.port}/irc"):
+            with mock.patch.object(Route, "BASE_URL", f"{self.url}/helix"):
+                with mock.patch.object(TwitchHTTP, "validate", validate):
+                    yield
+
+    def add_users(self, *logins: str) -> list[FakeTwitchUser]:
+        """
+        :return: the users with the logins, added if they didn't exist
+        """
+        users = []
+
+        for login in logins:
+            login = login.lower()
+
+            if (user := self._users.get(login)) is None:
+                user = self._users[login] = FakeTwitchUser(
+                    next(self._user_ids), login, login.capitalize()
+                )
+            users.append(user)
+
+        return users
+
+    def joined_channels(self) -> set[str]:
+        """
+        :return: names of the channels joined by at least one connection
+        """
+        return {
+            name
+            for name, connections in self._channel_connections.items()
+            if connections
+        }
+
+    def connection_count(self, channel_name: str) -> int:
+        """
+        :return: number of connections that joined the channel
+        """
+        return len(self._channel_connections[channel_name])
+
+    async def send_messages(
+        self, messages: Iterable[tuple[str, str, str]], mod: bool = False
+    ) -> int:
+        """
+        Send chat messages to the connections that joined their channel. The messages of a
+        connection are sent in a single websocket frame, like a burst of messages.
+
+        :param messages: (channel name, login of the chatter, content) of each message
+        :param mod: whether the chatters are moderators
+        :return: number of messages sent, counting once per connection that received it
+        """
+        connection_lines: defaultdict[FakeIrcConnection, list[str]] = defaultdict(list)
+
+        for channel_name, login, content in messages:
+            (user,) = self.add_users(login)
+            (channel_user,) = self.add_users(channel_name)
+            tags = ";".join(
+                (
+                    "badge-info=",
+                    f"badges={'moderator/1' if mod else ''}",
+                    "color=",
+                    f"display-name={user.display_name}",
+                    "emotes=",
+                    "first-msg=0",
+                    "flags=",
+                    f"id=fake-{next(self._message_ids)}",
+                    f"mod={int(mod)}",
+                    f"room-id={channel_user.id}",
+                    "subscriber=0",
+                    f"tmi-sent-ts={int(time.time() * 1000)}",
+                    "turbo=0",
+                    f"user-id={user.id}",
+                    "user-type=",
+                )
+            )
+            line = (
+                f"@{tags} :{user.login}!{user.login}@{user.login}.tmi.twitch.tv "
+                f"PRIVMSG #{channel_name} :{content}"
+            )
+
+            for connection in self._channel_connections[channel_name]:
+                connection_lines[connection].append(line)
+
+        await asyncio.gather(
+            *(connection.send(*lines) for connection, lines in connection_lines.items())
+        )
+        return sum(map(len, connection_lines.values()))
+
+    async def disconnect(
+        self,
+        connections: Optional[Iterable[FakeIrcConnection]] = None,
+        graceful: bool = False,
+    ) -> None:
+        """
+        Disconnect the connections, every connection by default.
+
+        :param graceful: whether the clients are asked to reconnect with a RECONNECT message, like
+            before a Twitch restart, instead of the connection being dropped
+        """
+        for connection in list(connections or self.connections):
+            if graceful:
+                await connection.send(":tmi.twitch.tv RECONNECT")
+            else:
+                connection.request.transport.abort()
+
+    async def wait_until(
+        self, predicate: Callable[[], bool], timeout_in_seconds: float = 10.0
+    ) -> None:
+        """
+        Wait until predicate returns True.
+
+        :raises: asyncio.TimeoutError
+        """
+        async with asyncio.timeout(timeout_in_seconds):
+            while not predicate():
+                await asyncio.sleep(0.01)
+
+    async def _handle_irc(self, request: web.Request) -> web.WebSocketResponse:
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        connection = FakeIrcConnection(request, websocket)
+        self.connections.add(connection)
+
+        try:
+            async for message in websocket:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    continue
+
+                for line in message.data.split("\r\n"):
+                    if line.strip():
+                        await self._handle_irc_line(connection, line.strip())
+        finally:
+            self.connections.discard(connection)
+
+            for channel_name in connection.channels:
+                self._channel_connections[channel_name].discard(connection)
+
+        return websocket
+
+    async def _handle_irc_line(self, connection: FakeIrcConnection, line: str) -> None:
+        # Replies are tagged with the id of the message they reply to
+        if line.startswith("@"):
+            _, _, line = line.partition(" ")
+
+        command, _, argument = line.partition(" ")
+        nick = connection.nick
+
+        match command:
+            case "PASS":
+                connection.authenticated = argument == f"oauth:{self.token}"
+            case "NICK":
+                if not connection.authenticated:
+                    await connection.send(":tmi.twitch.tv NOTICE * :Login unsuccessful")
+                    await connection.websocket.close()
+                    return
+
+                connection.nick = nick = argument
+                await connection.send(
+                    f":tmi.twitch.tv 001 {nick} :Welcome, GLHF!",
+                    f":tmi.twitch.tv 002 {nick} :Your host is tmi.twitch.tv",
+                    f":tmi.twitch.tv 003 {nick} :This server is rather new",
+                    f":tmi.twitch.tv 004 {nick} :-",
+                    f":tmi.twitch.tv 375 {nick} :-",
+                    f":tmi.twitch.tv 372 {nick} :You are in a maze of twisty passages.",
+                    f":tmi.twitch.tv 376 {nick} :>",
+                )
+            case "CAP":
+                await connection.send(
+                    f":tmi.twitch.tv CAP * ACK {argument.removeprefix('REQ ')}"
+                )
+            case "JOIN":
+                if self.join_latency_in_seconds:
+                    await asyncio.sleep(self.join_latency_in_seconds)
+
+                for channel_name in argument.replace("#", "").split(","):
+                    connection.channels.add(channel_name)
+                    self._channel_connections[channel_name].add(connection)
+                    mod = int(channel_name in self.moderated_channels)
+                    await connection.send(
+                        f":{nick}!{nick}@{nick}.tmi.twitch.tv JOIN #{channel_name}",
+                        f":{nick}.tmi.twitch.tv 353 {nick} = #{channel_name} :{nick}",
+                        f":{nick}.tmi.twitch.tv 366 {nick} #{channel_name} :End of /NAMES list",
+                        f"@badge-info=;badges={'moderator/1' if mod else ''};color=;"
+                        f"display-name={nick};emote-sets=0;mod={mod};subscriber=0;user-type= "
+                        f":tmi.twitch.tv USERSTATE #{channel_name}",
+                    )
+            case "PART":
+                channel_name = argument.lstrip("#")
+                connection.channels.discard(channel_name)
+                self._channel_connections[channel_name].discard(connection)
+                await connection.send(
+                    f":{nick}!{nick}@{nick}.tmi.twitch.tv PART #{channel_name}"
+                )
+            case "PRIVMSG":
+                channel, _, content = argument.partition(" ")
+                self.received_messages.append(
+                    (channel.lstrip("#"), content.removeprefix(":"))
+                )
+
+    async def _handle_users(self, request: web.Request) -> web.Response:
+        self.helix_request_count += 1
+
+        if request.headers.get("Client-ID") != self.CLIENT_ID:
+            return web.json_response({"message": "Invalid client id"}, status=401)
+
+        if self.helix_latency_in_seconds:
+            self._concurrent_helix_requests += 1
+            self.max_concurrent_helix_requests = max(
+                self.max_concurrent_helix_requests, self._concurrent_helix_requests
+            )
+
+            try:
+                await asyncio.sleep(self.helix_latency_in_seconds)
+            finally:
+                self._concurrent_helix_requests -= 1
+
+        ids = request.query.getall("id", [])
+        logins = request.query.getall("login", [])
+
+        if len(ids) + len(logins) > self.MAX_USERS_PER_REQUEST:
+            return web.json_response({"message": "Too many users"}, status=400)
+
+        id_to_user = {str(user.id): user for user in self._users.values()}
+        users = [id_to_user[user_id] for user_id in ids if user_id in id_to_user]
+        users += [self._users[login] for login in logins if login in self._users]
+
+        return web.json_response(
+            {"data": [user.to_helix() for user in users]},
+            headers={"Ratelimit-Limit": "800", "Ratelimit-Remaining": "799"},
+        )
+
+    async def _handle_validate(self, request: web.Request) -> web.Response:
+        if request.headers.get("Authorization") != f"OAuth {self.token}":
+            return web.json_response(
+                {"status": 401, "message": "invalid access token"}, status=401
+            )
+
+        return web.json_response(
+            {
+                "client_id": self.CLIENT_ID,
+                "login": self.BOT_LOGIN,
+                "scopes": ["chat:edit", "chat:read"],
+                "user_id": str(self.BOT_ID),
+                "expires_in": 3600,
+            }
+        )
@@ -0,0 +1,35 @@
+from typing import Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from hashtablebot.entity.bot_user import mapper_registry
+from hashtablebot.persistence.bot_user_cache import bot_user_cache
+from hashtablebot.persistence.session import Session
+
+
+def bind_sqlite_database(database_path: Optional[str] = None) -> Engine:
+    """
+    Bind the persistence Session to a new in-memory SQLite database with every table created,
+    used as a local stand-in for Postgres.
+
+    The connection is shared between threads so the database thread pool sees the same data,
+    and the pool hands it to one session at a time, since SQLite connections can't run
+    concurrent transactions.
+
+    :param database_path: path of an SQLite database file instead, to share it between processes
+    """
+    engine = create_engine(
+        f"sqlite:///{database_path}" if database_path is not None else "sqlite://",
+        future=True,
+        poolclass=QueuePool,
+        pool_size=1,
+        max_overflow=0,
+        connect_args={"check_same_thread": False},
+    )
+    mapper_registry.metadata.create_all(engine)
+    Session.configure(bind=engine)
+    # Users cached from the previous database would be returned instead of the new ones
+    bot_user_cache.clear()
+    return engine
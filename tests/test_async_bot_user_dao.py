@@ -0,0 +1,59 @@
+import asyncio
+import time
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from hashtablebot.entity.bot_user import BotUser
+from hashtablebot.persistence.async_bot_user_dao import AsyncBotUserDao
+
+SLOW_QUERY_SECONDS = 0.2
+
+
+def slow_get_by_id(obj_id: int) -> BotUser:
+    time.sleep(SLOW_QUERY_SECONDS)
+    return BotUser(id=obj_id)
+
+
+class TestAsyncBotUserDao(IsolatedAsyncioTestCase):
+    """
+    Tests for AsyncBotUserDao, simulating a slow database with a blocking sleep
+    """
+
+    async def test_queries_do_not_block_event_loop(self):
+        ticks = 0
+
+        async def handle_other_messages():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        with patch(
+            "hashtablebot.persistence.bot_user_dao.BotUserDao.get_by_id",
+            side_effect=slow_get_by_id,
+        ):
+            other_messages = asyncio.create_task(handle_other_messages())
+            bot_user = await AsyncBotUserDao.get_by_id(1)
+            other_messages.cancel()
+
+        self.assertEqual(bot_user.id, 1)
+        # The other task kept running while the query was in flight
+        self.assertGreater(ticks, 5)
+
+    async def test_queries_run_concurrently(self):
+        n_queries = 10
+
+        with patch(
+            "hashtablebot.persistence.bot_user_dao.BotUserDao.get_by_id",
+            side_effect=slow_get_by_id,
+        ):
+            start = time.perf_counter()
+            bot_users = await asyncio.gather(
+                *(AsyncBotUserDao.get_by_id(i) for i in range(n_queries))
+            )
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(
+            [bot_user.id for bot_user in bot_users], list(range(n_queries))
+        )
+        self.assertLess(elapsed, n_queries * SLOW_QUERY_SECONDS / 2)
@@ -0,0 +1,167 @@
+import asyncio
+import time
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, patch
+
+from hashtablebot.entity.bot_user import BotUser
+from hashtablebot.persistence.balance_write_buffer import BalanceWriteBuffer
+from hashtablebot.persistence.bot_user_dao import BotUserDao
+from tests.sqlite_database import bind_sqlite_database
+
+
+class TestBalanceWriteBuffer(IsolatedAsyncioTestCase):
+    """
+    Tests for the write-behind BalanceWriteBuffer, using SQLite as the database
+    """
+
+    def setUp(self) -> None:
+        bind_sqlite_database()
+        BotUserDao.save(BotUser(id=1, balance=100))
+
+    async def test_changes_are_coalesced(self):
+        buffer = BalanceWriteBuffer()
+        buffer.add(1, 10)
+        buffer.add(1, -30)
+        buffer.add(2, 5)
+
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(buffer.pending(1), -20)
+
+        with patch(
+            "hashtablebot.persistence.balance_write_buffer.AsyncBotUserDao.add_to_balances",
+            new_callable=AsyncMock,
+        ) as add_to_balances:
+            await buffer.flush()
+
+        add_to_balances.assert_awaited_once_with({1: -20, 2: 5})
+        self.assertEqual(len(buffer), 0)
+
+    async def test_flush_writes_deltas(self):
+        buffer = BalanceWriteBuffer()
+        buffer.add(1, -40)
+        # User 2 doesn't exist yet, so it's created
+        buffer.add(2, 25)
+
+        # Change written by someone else, it should not be overwritten by the flush
+        BotUserDao.add_to_balances({1: 5})
+
+        await buffer.flush()
+
+        self.assertEqual(BotUserDao.get_by_id(1).balance, 65)
+        self.assertEqual(BotUserDao.get_by_id(2).balance, 25)
+        self.assertEqual(buffer.pending(1), 0)
+
+    async def test_in_flight_changes_are_pending(self):
+        buffer = BalanceWriteBuffer()
+        buffer.add(1, 10)
+        write_started = asyncio.Event()
+        finish_write = asyncio.Event()
+
+        async def add_to_balances(deltas):
+            write_started.set()
+            await finish_write.wait()
+
+        with patch(
+            "hashtablebot.persistence.balance_write_buffer.AsyncBotUserDao.add_to_balances",
+            side_effect=add_to_balances,
+        ):
+            flush = asyncio.create_task(buffer.flush())
+            await write_started.wait()
+            buffer.add(1, 5)
+
+            self.assertEqual(buffer.pending(1), 15)
+
+            read = asyncio.create_task(
+                buffer.read_with_pending(AsyncMock(return_value=None), [1])
+            )
+            await asyncio.sleep(0.01)
+            self.assertFalse(read.done())
+
+            finish_write.set()
+            await flush
+            # The flush wrote its changes, so only the later ones are pending
+            self.assertEqual(await read, (None, {1: 5}))
+
+        self.assertEqual(buffer.pending(1), 5)
+
+    async def test_flush_during_read_is_read_again(self):
+        buffer = BalanceWriteBuffer()
+        buffer.add(1, 10)
+        balances = []
+
+        async def read():
+            balances.append(BotUserDao.get_by_id(1).balance)
+            # The flush commits after the balance was read
+            if len(balances) == 1:
+                await buffer.flush()
+            return balances[-1]
+
+        balance, pending_balances = await buffer.read_with_pending(read, [1])
+
+        self.assertEqual(balances, [100, 110])
+        self.assertEqual(balance + pending_balances[1], 110)
+
+    async def test_reads_run_concurrently(self):
+        buffer = BalanceWriteBuffer()
+        buffer.add(1, 10)
+
+        async def read():
+            await asyncio.sleep(0.05)
+
+        start = time.monotonic()
+        await asyncio.gather(
+            *(buffer.read_with_pending(read, [user_id]) for user_id in range(20))
+        )
+
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    async def test_failed_flush_is_retried(self):
+        buffer = BalanceWriteBuffer()
+        buffer.add(1, 10)
+
+        with patch(
+            "hashtablebot.persistence.balance_write_buffer.AsyncBotUserDao.add_to_balances",
+            new_callable=AsyncMock,
+            side_effect=ConnectionError,
+        ), self.assertLogs(level="ERROR"):
+            await buffer.flush()
+
+        # Changes made while the flush was failing are kept too
+        buffer.add(1, 5)
+        self.assertEqual(buffer.pending(1), 15)
+
+        await buffer.flush()
+        self.assertEqual(BotUserDao.get_by_id(1).balance, 115)
+
+    async def test_flush_on_interval(self):
+        buffer = BalanceWriteBuffer(flush_interval_in_seconds=0.05)
+        buffer.start()
+        buffer.add(1, 10)
+
+        await asyncio.sleep(0.2)
+
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(BotUserDao.get_by_id(1).balance, 110)
+        await buffer.close()
+
+    async def test_flush_on_size_threshold(self):
+        buffer = BalanceWriteBuffer(flush_interval_in_seconds=60, max_pending_users=3)
+        buffer.start()
+
+        for user_id in range(1, 4):
+            buffer.add(user_id, 1)
+
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(BotUserDao.get_by_id(3).balance, 1)
+        await buffer.close()
+
+    async def test_close_flushes_pending_changes(self):
+        buffer = BalanceWriteBuffer(flush_interval_in_seconds=60)
+        buffer.start()
+        buffer.add(1, -100)
+
+        await buffer.close()
+
+        self.assertEqual(BotUserDao.get_by_id(1).balance, 0)
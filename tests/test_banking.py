@@ -1,3 +1,4 @@
+import tracemalloc
 from unittest import TestCase
 
 from hashtablebot.banking.bank import Bank
@@ -96,3 +97,73 @@ class TestBanking(TestCase):
         bank.redo()
         self.assertEqual(self.bank_user.get_balance(), 0)
         self.assertEqual(transfer_target.get_balance(), 200)
+
+    def test_history_is_per_instance(self):
+        bank = Bank()
+        bank.execute(Deposit(bank_user=self.bank_user, amount=10))
+
+        # Another bank has nothing to undo
+        Bank().undo()
+        self.assertEqual(self.bank_user.get_balance(), 110)
+
+    def test_bounded_history(self):
+        bank = Bank(history_size=2)
+
+        for _ in range(3):
+            bank.execute(Deposit(bank_user=self.bank_user, amount=10))
+
+        for _ in range(3):
+            bank.undo()
+
+        # Only the last two deposits could be undone
+        self.assertEqual(self.bank_user.get_balance(), 110)
+        self.assertEqual(len(bank.redo_stack), 2)
+
+    def test_no_history(self):
+        bank = Bank(history_size=0)
+        bank.execute(Deposit(bank_user=self.bank_user, amount=10))
+
+        bank.undo()
+        self.assertEqual(self.bank_user.get_balance(), 110)
+        self.assertEqual(len(bank.undo_stack), 0)
+
+    def test_invalid_history_size(self):
+        with self.assertRaises(ValueError):
+            Bank(history_size=-1)
+
+    def test_history_is_bounded(self):
+        """
+        Run many transactions through a single bank and check only history_size are kept
+        """
+        bank = Bank(history_size=100)
+
+        for _ in range(10_000):
+            bank.execute(Deposit(bank_user=self.bank_user, amount=1))
+
+        self.assertEqual(len(bank.undo_stack), bank.history_size)
+
+        for _ in range(1_000):
+            bank.undo()
+
+        self.assertLessEqual(len(bank.undo_stack), bank.history_size)
+        self.assertLessEqual(len(bank.redo_stack), bank.history_size)
+
+    def test_history_memory_is_bounded(self):
+        """
+        Run many more transactions than history_size and check the memory held doesn't grow
+        """
+        bank = Bank(history_size=100)
+        tracemalloc.start()
+
+        try:
+            measurements = []
+            for i in range(1, 20_001):
+                bank.execute(Deposit(bank_user=self.bank_user, amount=1))
+
+                if i % 1_000 == 0:
+                    measurements.append(tracemalloc.get_traced_memory()[0])
+        finally:
+            tracemalloc.stop()
+
+        # A history of 1000 more transactions would take far more than that
+        self.assertLess(max(measurements) - measurements[0], 16 * 1024)
@@ -0,0 +1,118 @@
+import json
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from hashtablebot.bench import (
+    BenchMessage,
+    BenchReport,
+    parse_command_mix,
+    read_chat_log,
+    run_bench,
+    synthetic_messages,
+)
+
+
+class TestBenchMessages(TestCase):
+    """
+    Tests for the messages replayed by the benchmark
+    """
+
+    def test_parse_command_mix(self):
+        self.assertEqual(
+            parse_command_mix("chat=90, ping=10,"), {"chat": 90, "ping": 10}
+        )
+
+        for command_mix in ("chat=90,unknown=1", "chat=a", "chat=-1", "chat=0", ""):
+            with self.assertRaises(ValueError):
+                parse_command_mix(command_mix)
+
+    def test_synthetic_messages_are_reproducible(self):
+        def generate():
+            return list(
+                synthetic_messages(
+                    100, channel_count=2, user_count=3, command_mix={"ping": 1}, seed=1
+                )
+            )
+
+        messages = generate()
+
+        self.assertEqual(messages, generate())
+        self.assertEqual({message.content for message in messages}, {"$ping"})
+        self.assertEqual(
+            {message.channel for message in messages}, {"channel0", "channel1"}
+        )
+
+    def test_read_chat_log(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "chat.log")
+
+            with open(path, "w", encoding="utf-8") as file:
+                file.write("#Channel\tUser\t$give user 1\tcoin\n\n")
+                file.write(
+                    json.dumps({"channel": "channel", "user": "user", "content": "hi"})
+                )
+
+            self.assertEqual(
+                list(read_chat_log(path)),
+                [
+                    BenchMessage("channel", "user", "$give user 1\tcoin"),
+                    BenchMessage("channel", "user", "hi"),
+                ],
+            )
+
+            with open(path, "a", encoding="utf-8") as file:
+                file.write("\nchannel without message")
+
+            with self.assertRaises(ValueError):
+                list(read_chat_log(path))
+
+
+class TestBenchReport(TestCase):
+    """
+    Tests for BenchReport
+    """
+
+    def test_percentile(self):
+        report = BenchReport(
+            message_count=100,
+            duration_in_seconds=2,
+            latencies={"ping": [i / 100 for i in range(100, 0, -1)]},
+            sent_count=0,
+            dropped_count=0,
+            error_count=0,
+        )
+
+        self.assertEqual(report.throughput, 50)
+        self.assertEqual(report.percentile("ping", 50), 0.5)
+        self.assertEqual(report.percentile("ping", 99), 0.99)
+        self.assertEqual(report.percentile("ping", 0), 0.01)
+
+
+class TestRunBench(IsolatedAsyncioTestCase):
+    """
+    Tests for run_bench
+    """
+
+    async def test_every_message_is_handled(self):
+        messages = list(
+            synthetic_messages(
+                200,
+                channel_count=3,
+                user_count=20,
+                command_mix=parse_command_mix(
+                    "chat=5,ping=1,eliscoins=1,gamble=1,give=1,leaderboard=1,"
+                    "channelleaderboard=1,translate=1,trigger=1"
+                ),
+                seed=0,
+            )
+        )
+
+        report = await run_bench(messages)
+
+        self.assertEqual(report.message_count, 200)
+        self.assertEqual(sum(map(len, report.latencies.values())), 200)
+        self.assertEqual(report.error_count, 0)
+        self.assertEqual(report.dropped_count, 0)
+        # Every message but the chat messages gets a response
+        self.assertEqual(report.sent_count, 200 - len(report.latencies.get("chat", ())))
@@ -0,0 +1,85 @@
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from hashtablebot.entity.bot_user import BotUser
+from hashtablebot.persistence.async_bot_user_dao import AsyncBotUserDao
+from hashtablebot.persistence.bot_user_cache import BotUserCache, bot_user_cache
+from hashtablebot.persistence.bot_user_dao import BotUserDao
+from tests.sqlite_database import bind_sqlite_database
+
+
+class TestBotUserCache(IsolatedAsyncioTestCase):
+    """
+    Tests for the BotUser cache read through by AsyncBotUserDao, using SQLite as the database
+    """
+
+    def setUp(self) -> None:
+        bind_sqlite_database()
+        BotUserDao.save(BotUser(id=1, balance=100), BotUser(id=2, balance=50))
+
+    async def test_repeated_lookups_hit_cache(self):
+        hits, misses = bot_user_cache.hits, bot_user_cache.misses
+
+        with patch.object(
+            BotUserDao, "get_by_id", wraps=BotUserDao.get_by_id
+        ) as get_by_id:
+            for _ in range(3):
+                bot_user = await AsyncBotUserDao.get_by_id(1)
+
+        self.assertEqual(bot_user.balance, 100)
+        self.assertEqual(get_by_id.call_count, 1)
+        self.assertEqual(bot_user_cache.hits - hits, 2)
+        self.assertEqual(bot_user_cache.misses - misses, 1)
+
+    async def test_writes_invalidate(self):
+        await AsyncBotUserDao.get_by_id(1)
+        await AsyncBotUserDao.get_by_id(2)
+
+        await AsyncBotUserDao.transfer(1, 2, 30)
+        self.assertEqual((await AsyncBotUserDao.get_by_id(1)).balance, 70)
+        self.assertEqual((await AsyncBotUserDao.get_by_id(2)).balance, 80)
+
+        await AsyncBotUserDao.add_to_balances({1: 5})
+        self.assertEqual((await AsyncBotUserDao.get_by_id(1)).balance, 75)
+
+        bot_user = await AsyncBotUserDao.get_by_id(2)
+        bot_user.bot_command_prefix = "!"
+        await AsyncBotUserDao.update(bot_user)
+        self.assertNotIn(2, bot_user_cache._cache)
+
+    async def test_callers_get_their_own_copy(self):
+        await AsyncBotUserDao.get_by_id(1)
+        bot_user = await AsyncBotUserDao.get_by_id(1)
+
+        # Changes are only seen by other callers once they're committed
+        bot_user.balance = 10
+        self.assertEqual((await AsyncBotUserDao.get_by_id(1)).balance, 100)
+
+        await AsyncBotUserDao.update(bot_user)
+        self.assertEqual((await AsyncBotUserDao.get_by_id(1)).balance, 10)
+
+    async def test_failed_write_invalidates(self):
+        await AsyncBotUserDao.get_by_id(2)
+
+        with self.assertRaises(Exception):
+            await AsyncBotUserDao.withdraw(2, 51)
+
+        self.assertNotIn(2, bot_user_cache._cache)
+
+    async def test_warm_cache(self):
+        await AsyncBotUserDao.warm_cache(1)
+
+        self.assertIn(1, bot_user_cache._cache)
+        self.assertNotIn(2, bot_user_cache._cache)
+
+    def test_read_racing_with_write_is_not_stored(self):
+        cache = BotUserCache(max_size=10)
+        generation = cache.generation
+        cache.invalidate(1)
+        cache.put(BotUser(id=1), generation)
+
+        self.assertIsNone(cache.get(1))
+
+        cache.put(BotUser(id=1), cache.generation)
+        self.assertIsNotNone(cache.get(1))
+        self.assertEqual(cache.hit_rate, 0.5)
@@ -0,0 +1,81 @@
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from hashtablebot.entity.bot_user import BotUser
+from hashtablebot.persistence.async_bot_user_dao import AsyncBotUserDao
+from hashtablebot.persistence.bot_user_dao import BotUserDao
+from tests.sqlite_database import bind_sqlite_database
+
+
+class TestBotUserDao(IsolatedAsyncioTestCase):
+    """
+    Tests for batched lookups of BotUserDao, using SQLite as the database
+    """
+
+    def setUp(self) -> None:
+        bind_sqlite_database()
+        BotUserDao.save(*(BotUser(id=i, balance=i * 10) for i in range(1, 8)))
+
+    def test_get_by_ids(self):
+        bot_users = BotUserDao.get_by_ids([3, 1, 3, 100])
+
+        self.assertEqual(sorted(u.id for u in bot_users), [1, 3])
+        self.assertEqual(BotUserDao.get_by_ids([]), [])
+
+    def test_get_by_ids_in_chunks(self):
+        with patch.object(BotUserDao, "CHUNK_SIZE", 2):
+            bot_users = BotUserDao.get_by_ids(range(0, 10))
+
+        self.assertEqual(sorted(u.id for u in bot_users), list(range(1, 8)))
+
+    async def test_async_get_by_ids_queries_missing_ids_once(self):
+        await AsyncBotUserDao.get_by_id(1)
+
+        with patch.object(
+            BotUserDao, "get_by_ids", wraps=BotUserDao.get_by_ids
+        ) as get_by_ids:
+            bot_users = await AsyncBotUserDao.get_by_ids([1, 2, 3])
+
+        get_by_ids.assert_called_once_with([2, 3])
+        self.assertEqual(sorted(u.balance for u in bot_users), [10, 20, 30])
+
+    async def test_save_names(self):
+        # Cached users must not keep their old names
+        await AsyncBotUserDao.get_by_id(1)
+
+        await AsyncBotUserDao.save_names({1: ("alice", "Alice"), 100: ("bob", "BOB")})
+
+        alice = await AsyncBotUserDao.get_by_id(1)
+        self.assertEqual(
+            (alice.login_name, alice.name(), alice.balance), ("alice", "Alice", 10)
+        )
+        # Users that don't exist are created without coins
+        bob = BotUserDao.get_by_id(100)
+        self.assertEqual((bob.login_name, bob.name(), bob.balance), ("bob", "BOB", 0))
+        self.assertEqual(BotUserDao.get_by_id(3).name(), "3")
+
+    async def test_save_names_moves_taken_login_names(self):
+        BotUserDao.save_names({1: ("alice", "Alice"), 2: ("bob", "Bob")})
+        await AsyncBotUserDao.get_by_id(1)
+
+        # User 3 took the name of user 1 after they renamed, then users 2 and 4 are saved
+        # with the same name in one batch, which only the last one keeps
+        BotUserDao.save_names({3: ("alice", "Alice"), 4: ("bob", "Bob")})
+        BotUserDao.save_names({2: ("carol", "Carol"), 4: ("carol", "Carol")})
+
+        self.assertIsNone((await AsyncBotUserDao.get_by_id(1)).login_name)
+        self.assertEqual(
+            sorted((u.id, u.login_name) for u in BotUserDao.get_by_ids([2, 3, 4])),
+            [(2, None), (3, "alice"), (4, "carol")],
+        )
+        self.assertEqual(
+            [u.id for u in BotUserDao.get_by_login_names(["alice", "bob"])], [3]
+        )
+
+    def test_get_by_login_names(self):
+        BotUserDao.save_names({1: ("alice", "Alice"), 2: ("bob", "Bob")})
+
+        with patch.object(BotUserDao, "CHUNK_SIZE", 1):
+            bot_users = BotUserDao.get_by_login_names(["Alice", "bob", "carol"])
+
+        self.assertEqual(sorted(u.id for u in bot_users), [1, 2])
@@ -0,0 +1,199 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from hashtablebot.channel_message_queues import ChannelMessageQueues
+
+
+class TestChannelMessageQueues(IsolatedAsyncioTestCase):
+    """
+    Tests for ChannelMessageQueues
+    """
+
+    async def asyncSetUp(self):
+        self.queues = ChannelMessageQueues(max_queue_size=3)
+        self.handled: list[str] = []
+        # Handlers of blocked messages wait until it's set
+        self.unblocked = asyncio.Event()
+
+    async def asyncTearDown(self):
+        await self.queues.close()
+
+    def handler(self, name: str, blocked: bool = False):
+        async def handle():
+            if blocked:
+                await self.unblocked.wait()
+            self.handled.append(name)
+
+        return handle
+
+    async def wait_until_empty(self):
+        while len(self.queues) or self.queues._handlers:
+            await asyncio.sleep(0.001)
+
+    async def test_messages_are_handled_in_order(self):
+        for i in range(3):
+            await self.queues.put("channel", self.handler(str(i)))
+
+        await self.wait_until_empty()
+        self.assertEqual(self.handled, ["0", "1", "2"])
+
+    async def test_slow_channel_does_not_delay_others(self):
+        await self.queues.put("slow", self.handler("slow", blocked=True))
+        await self.queues.put("slow", self.handler("slow 2"))
+        await self.queues.put("fast", self.handler("fast"))
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(self.handled, ["fast"])
+        self.assertEqual(self.queues.depth("slow"), 1)
+
+        self.unblocked.set()
+        await self.wait_until_empty()
+        self.assertEqual(self.handled, ["fast", "slow", "slow 2"])
+
+    async def test_full_queue_drops_droppable_messages_first(self):
+        await self.queues.put("channel", self.handler("blocking", blocked=True))
+        await asyncio.sleep(0)
+
+        await self.queues.put("channel", self.handler("chat 1"), droppable=True)
+        await self.queues.put("channel", self.handler("command 1"))
+        await self.queues.put("channel", self.handler("chat 2"), droppable=True)
+        # The oldest chat message makes room for the command
+        self.assertTrue(await self.queues.put("channel", self.handler("command 2")))
+        # Only commands are left to drop, so the chat message is dropped
+        await self.queues.put("channel", self.handler("command 3"))
+        self.assertFalse(
+            await self.queues.put("channel", self.handler("chat 3"), droppable=True)
+        )
+        self.assertEqual(self.queues.dropped, 3)
+
+        # Commands wait for room instead of being dropped
+        command_4 = asyncio.create_task(
+            self.queues.put("channel", self.handler("command 4"))
+        )
+        await asyncio.sleep(0.01)
+        self.assertFalse(command_4.done())
+
+        self.unblocked.set()
+        self.assertTrue(await command_4)
+        await self.wait_until_empty()
+
+        self.assertEqual(
+            self.handled,
+            ["blocking", "command 1", "command 2", "command 3", "command 4"],
+        )
+
+    async def test_waiting_messages_are_queued_in_order(self):
+        queues = ChannelMessageQueues(max_queue_size=1, max_waiting_messages=2)
+        await queues.put("channel", self.handler("blocking", blocked=True))
+        await asyncio.sleep(0)
+        await queues.put("channel", self.handler("command 0"))
+
+        waiting = [
+            asyncio.create_task(queues.put("channel", self.handler(f"command {i}")))
+            for i in range(1, 4)
+        ]
+        await asyncio.sleep(0.01)
+        # Only two commands may wait, so the last one is dropped
+        self.assertFalse(await waiting[2])
+        self.assertEqual(queues.dropped, 1)
+
+        self.unblocked.set()
+        self.assertEqual(await asyncio.gather(*waiting[:2]), [True, True])
+        await queues.join()
+
+        self.assertEqual(
+            self.handled, ["blocking", "command 0", "command 1", "command 2"]
+        )
+        await queues.close()
+
+    async def test_cancelled_waiter_gives_its_room_to_the_next(self):
+        queues = ChannelMessageQueues(max_queue_size=1)
+        await queues.put("channel", self.handler("blocking", blocked=True))
+        await asyncio.sleep(0)
+        await queues.put("channel", self.handler("command 0"))
+
+        cancelled = asyncio.create_task(
+            queues.put("channel", self.handler("cancelled"))
+        )
+        waiting = asyncio.create_task(queues.put("channel", self.handler("command 1")))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+
+        self.unblocked.set()
+        self.assertTrue(await waiting)
+        await queues.join()
+
+        self.assertEqual(self.handled, ["blocking", "command 0", "command 1"])
+        await queues.close()
+
+    async def test_concurrency_cap(self):
+        queues = ChannelMessageQueues(max_concurrency=2)
+
+        for i in range(3):
+            await queues.put(f"channel {i}", self.handler(str(i), blocked=True))
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(len(queues._handlers), 2)
+        self.assertEqual(len(queues), 1)
+
+        self.unblocked.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(sorted(self.handled), ["0", "1", "2"])
+        await queues.close()
+
+    async def test_slow_handlers_are_detached(self):
+        queues = ChannelMessageQueues(detach_after_in_seconds=0.01)
+
+        await queues.put("channel", self.handler("slow", blocked=True))
+        await queues.put("channel", self.handler("next"))
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(self.handled, ["next"])
+        self.unblocked.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.handled, ["next", "slow"])
+        await queues.close()
+
+    async def test_detached_handlers_release_their_slot(self):
+        queues = ChannelMessageQueues(max_concurrency=1, detach_after_in_seconds=0.01)
+
+        await queues.put("duel channel", self.handler("duel", blocked=True))
+        await asyncio.sleep(0.05)
+        await queues.put("other channel", self.handler("other"))
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(self.handled, ["other"])
+        self.unblocked.set()
+        await queues.join()
+        await queues.close()
+
+    async def test_commands_do_not_wait_for_translations(self):
+        for i in range(3):
+            await self.queues.put(
+                "channel",
+                self.handler(f"translation {i}", blocked=True),
+                droppable=True,
+            )
+        await self.queues.put("channel", self.handler("command"))
+        await asyncio.sleep(0.01)
+
+        # The translations are still waiting for their batch
+        self.assertEqual(self.handled, ["command"])
+        self.assertEqual(len(self.queues._handlers), 2)
+
+        self.unblocked.set()
+        await self.wait_until_empty()
+        self.assertEqual(len(self.handled), 3)
+
+    async def test_join_waits_for_every_handler(self):
+        queues = ChannelMessageQueues(detach_after_in_seconds=0.01)
+
+        await queues.put("channel", self.handler("slow", blocked=True))
+        await queues.put("channel", self.handler("next"))
+        await queues.put("other_channel", self.handler("other"))
+        asyncio.get_running_loop().call_later(0.05, self.unblocked.set)
+        await queues.join()
+
+        self.assertEqual(sorted(self.handled), ["next", "other", "slow"])
+        self.assertFalse(queues._handlers)
+        await queues.close()
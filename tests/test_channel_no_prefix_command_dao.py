@@ -0,0 +1,60 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from hashtablebot.entity.channel_no_prefix_command import ChannelNoPrefixCommand
+from hashtablebot.persistence.bot_user_dao import BotUserDao
+from hashtablebot.persistence.channel_no_prefix_command_dao import (
+    ChannelNoPrefixCommandDao,
+)
+from tests.sqlite_database import bind_sqlite_database
+
+
+class TestChannelNoPrefixCommandDao(TestCase):
+    """
+    Tests for the ChannelNoPrefixCommandDao, using SQLite as the database
+    """
+
+    def setUp(self) -> None:
+        bind_sqlite_database()
+        ChannelNoPrefixCommandDao.save(
+            ChannelNoPrefixCommand(channel_id=1, names="elisWave", response="hi")
+        )
+        ChannelNoPrefixCommandDao.save(
+            ChannelNoPrefixCommand(
+                channel_id=2, names="elisElis elisTime", response="elisTime"
+            )
+        )
+
+    def test_get_by_channel_ids(self):
+        commands = ChannelNoPrefixCommandDao.get_by_channel_ids([2, 3])
+
+        self.assertEqual(
+            [(c.channel_id, c.names, c.response) for c in commands],
+            [(2, "elisElis elisTime", "elisTime")],
+        )
+        self.assertEqual(ChannelNoPrefixCommandDao.get_by_channel_ids([]), [])
+
+    def test_get_by_channel_ids_in_chunks(self):
+        with patch.object(BotUserDao, "CHUNK_SIZE", 1):
+            commands = ChannelNoPrefixCommandDao.get_by_channel_ids([1, 2, 3, 1])
+
+        self.assertCountEqual(
+            [(c.channel_id, c.names) for c in commands],
+            [(1, "elisWave"), (2, "elisElis elisTime")],
+        )
+
+    def test_save_replaces_response(self):
+        ChannelNoPrefixCommandDao.save(
+            ChannelNoPrefixCommand(channel_id=1, names="elisWave", response="hello")
+        )
+
+        (command,) = ChannelNoPrefixCommandDao.get_by_channel_ids([1])
+        self.assertEqual(command.response, "hello")
+
+    def test_delete(self):
+        self.assertTrue(ChannelNoPrefixCommandDao.delete(1, "elisWave"))
+        self.assertFalse(ChannelNoPrefixCommandDao.delete(1, "elisWave"))
+        self.assertFalse(ChannelNoPrefixCommandDao.delete(1, "elisElis elisTime"))
+
+        self.assertEqual(ChannelNoPrefixCommandDao.get_by_channel_ids([1]), [])
+        self.assertEqual(len(ChannelNoPrefixCommandDao.get_by_channel_ids([2])), 1)
@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+from hashtablebot.chat_rewards import ChatRewardEngine
+from hashtablebot.persistence.balance_write_buffer import BalanceWriteBuffer
+
+
+class TestChatRewardEngine(TestCase):
+    """
+    Tests for the ChatRewardEngine
+    """
+
+    def setUp(self):
+        self.buffer = BalanceWriteBuffer(max_pending_users=10_000)
+        self.engine = ChatRewardEngine(self.buffer, reward=2, cooldown_in_seconds=60)
+
+    def test_reward_once_per_cooldown(self):
+        self.assertTrue(self.engine.reward_message("channel", 1, now=0))
+        self.assertFalse(self.engine.reward_message("channel", 1, now=30))
+        self.assertEqual(self.buffer.pending(1), 2)
+
+        self.assertTrue(self.engine.reward_message("channel", 1, now=60))
+        self.assertEqual(self.buffer.pending(1), 4)
+
+    def test_cooldowns_are_per_channel(self):
+        self.assertTrue(self.engine.reward_message("channel", 1, now=0))
+        self.assertTrue(self.engine.reward_message("other_channel", 1, now=0))
+        self.assertTrue(self.engine.reward_message("channel", 2, now=0))
+
+        self.assertEqual(self.buffer.pending(1), 4)
+        self.assertEqual(len(self.buffer), 2)
+
+    def test_expired_cooldowns_are_forgotten(self):
+        for user_id in range(1000):
+            self.engine.reward_message("channel", user_id, now=user_id / 100)
+
+        self.assertEqual(len(self.engine), 1000)
+
+        # Users 0 to 500 were rewarded more than 60 seconds before
+        self.assertTrue(self.engine.reward_message("channel", 0, now=65.005))
+        self.assertEqual(len(self.engine), 1000 - 501 + 1)
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest import IsolatedAsyncioTestCase
+
+from hashtablebot.bot_exceptions import DuelInProgressError
+from hashtablebot.duel_manager import DuelManager
+
+
+def fake_message(channel_name: str, author_id: str, content: str):
+    return SimpleNamespace(
+        channel=SimpleNamespace(name=channel_name),
+        author=SimpleNamespace(id=author_id),
+        content=content,
+    )
+
+
+class TestDuelManager(IsolatedAsyncioTestCase):
+    """
+    Tests for the DuelManager, with chat messages simulated by dispatching fake messages
+    """
+
+    def setUp(self) -> None:
+        self.duel_manager = DuelManager(
+            wait_until_go_in_seconds=0.2, answer_timeout_in_seconds=0.5
+        )
+
+    def answer_on_go(self, channel_name: str, answers: dict[str, str]):
+        """
+        :return: send function that dispatches the answers once GO is sent
+        """
+
+        async def send(content: str):
+            if content.startswith("GO"):
+                for author_id, answer in answers.items():
+                    self.duel_manager.dispatch(
+                        fake_message(channel_name, author_id, answer)
+                    )
+
+        return send
+
+    async def test_duel(self):
+        answers = await self.duel_manager.run(
+            "channel",
+            "1",
+            2,
+            self.answer_on_go("channel", {"1": "ROCK", "2": "paper"}),
+            prompt="answer",
+        )
+
+        self.assertEqual(answers, ("rock", "paper"))
+        self.assertEqual(len(self.duel_manager), 0)
+
+    async def test_answers_before_go_are_ignored(self):
+        async def send(content: str):
+            if not content.startswith("GO"):
+                self.assertFalse(
+                    self.duel_manager.dispatch(fake_message("channel", "1", "rock"))
+                )
+
+        answers = await self.duel_manager.run("channel", "1", "2", send, "answer")
+        self.assertEqual(answers, (None, None))
+
+    async def test_timeout(self):
+        answers = await self.duel_manager.run(
+            "channel", "1", "2", self.answer_on_go("channel", {"2": "rock"}), "answer"
+        )
+        self.assertEqual(answers, (None, "rock"))
+
+    async def test_participant_already_dueling(self):
+        first_duel = asyncio.create_task(
+            self.duel_manager.run(
+                "channel", "1", "2", self.answer_on_go("channel", {}), "answer"
+            )
+        )
+        await asyncio.sleep(0)
+
+        with self.assertRaises(DuelInProgressError):
+            await self.duel_manager.run(
+                "channel", "3", "2", self.answer_on_go("channel", {}), "answer"
+            )
+
+        # The same users can duel in another channel
+        await self.duel_manager.run(
+            "other_channel", "1", "2", self.answer_on_go("other_channel", {}), "answer"
+        )
+        await first_duel
+
+    async def test_concurrent_duels(self):
+        """
+        Run dozens of duels at the same time and check they take as long as a single one
+        """
+        n_channels, duels_per_channel = 10, 5
+
+        async def duel(channel: int, index: int):
+            channel_name = f"channel{channel}"
+            author_id, target_id = f"{index}a", f"{index}b"
+            answers = {author_id: "scissors", target_id: f"paper{index}"}
+            return await self.duel_manager.run(
+                channel_name,
+                author_id,
+                target_id,
+                self.answer_on_go(channel_name, answers),
+                "answer",
+            )
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(
+                duel(channel, index)
+                for channel in range(n_channels)
+                for index in range(duels_per_channel)
+            )
+        )
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(len(results), n_channels * duels_per_channel)
+        for i, answers in enumerate(results):
+            self.assertEqual(answers, ("scissors", f"paper{i % duels_per_channel}"))
+
+        # Running the duels one after another would take 50 times the wait until GO
+        self.assertLess(elapsed, 2 * self.duel_manager.wait_until_go_in_seconds)
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import time
+from unittest import IsolatedAsyncioTestCase
+
+from hashtablebot.hash_table_bot import HashTableBot
+from hashtablebot.irc_shards import JoinRateLimiter
+from hashtablebot.metrics import messages_processed
+from tests.fake_twitch_server import FakeTwitchServer
+from tests.sqlite_database import bind_sqlite_database
+from tests.translation_backend_test import TranslationBackendTest
+
+logger = logging.getLogger(__name__)
+
+
+class TestEndToEnd(IsolatedAsyncioTestCase):
+    """
+    Tests of the bot connected to a FakeTwitchServer. Its startup time and throughput are
+    logged at the INFO level, but not asserted, since they depend on the machine
+    """
+
+    CHANNEL_COUNT = 2000
+    CHANNELS_PER_CONNECTION = 100
+
+    async def asyncSetUp(self):
+        bind_sqlite_database()
+        self.server = FakeTwitchServer()
+        await self.server.start()
+        self.channel_names = [f"channel{i}" for i in range(self.CHANNEL_COUNT)]
+        self.server.add_users(*self.channel_names)
+
+        patch = self.server.patch_twitchio()
+        patch.__enter__()
+        self.addCleanup(patch.__exit__, None, None, None)
+
+        self.bot = self.create_bot()
+
+    async def asyncTearDown(self):
+        await self.bot.close()
+        await self.server.close()
+
+    def create_bot(self) -> HashTableBot:
+        bot = HashTableBot(
+            token=self.server.token,
+            initial_channels=self.channel_names,
+            channels_per_connection=self.CHANNELS_PER_CONNECTION,
+            translation_backend=TranslationBackendTest(),
+        )
+        # Verified bots can join much faster than the default limit, which would take minutes here
+        bot._channel_shards._join_rate_limiter = JoinRateLimiter(
+            max_joins=10_000, period_in_seconds=1
+        )
+        return bot
+
+    async def start_bot(self) -> float:
+        """
+        Start the bot and wait until it joined every channel.
+
+        :return: seconds taken to join every channel
+        """
+        start = time.perf_counter()
+        self.bot_task = asyncio.create_task(self.bot.start())
+        await self.server.wait_until(
+            lambda: len(self.server.joined_channels()) == self.CHANNEL_COUNT,
+            timeout_in_seconds=60,
+        )
+        # Joins are only sent once the bot is ready, so the channels are loaded by now
+        return time.perf_counter() - start
+
+    async def test_startup_joins_every_channel(self):
+        startup_time = await self.start_bot()
+        logger.info(f"Joined {self.CHANNEL_COUNT} channels in {startup_time:.2f}s")
+
+        self.assertEqual(
+            self.bot._channel_shards.connection_count,
+            self.CHANNEL_COUNT // self.CHANNELS_PER_CONNECTION,
+        )
+        # The bot's main connection joins no channels
+        self.assertEqual(
+            len(self.server.connections), self.bot._channel_shards.connection_count + 1
+        )
+        self.assertTrue(
+            all(self.server.connection_count(name) == 1 for name in self.channel_names)
+        )
+        # Channel users are fetched in requests of up to 100 users
+        self.assertLessEqual(
+            self.server.helix_request_count, self.CHANNEL_COUNT // 100 + 1
+        )
+
+    async def test_startup_with_slow_helix(self):
+        self.server.helix_latency_in_seconds = 0.5
+        startup_time = await self.start_bot()
+        logger.info(
+            f"Joined {self.CHANNEL_COUNT} channels in {startup_time:.2f}s with slow Helix"
+        )
+
+        # Requests are sent concurrently instead of one after the other
+        self.assertGreaterEqual(self.server.helix_request_count, 20)
+        self.assertGreater(self.server.max_concurrent_helix_requests, 1)
+
+    async def test_startup_with_stored_channel_names(self):
+        await self.start_bot()
+        await self.bot.close()
+        self.server.helix_request_count = 0
+
+        # The names were stored by the first startup, so the channels aren't looked up again
+        self.bot = self.create_bot()
+        await self.server.wait_until(lambda: not self.server.joined_channels())
+        startup_time = await self.start_bot()
+        logger.info(
+            f"Joined {self.CHANNEL_COUNT} channels in {startup_time:.2f}s with stored names"
+        )
+
+        self.assertEqual(self.server.helix_request_count, 0)
+
+    async def test_message_burst_throughput(self):
+        await self.start_bot()
+        message_count = 20_000
+        processed = messages_processed.get()
+
+        start = time.perf_counter()
+        sent_count = await self.server.send_messages(
+            (self.channel_names[i % self.CHANNEL_COUNT], f"user{i % 500}", "hello chat")
+            for i in range(message_count)
+        )
+        await self.server.wait_until(
+            lambda: messages_processed.get() - processed == message_count,
+            timeout_in_seconds=60,
+        )
+        throughput = message_count / (time.perf_counter() - start)
+        logger.info(
+            f"Processed a burst of {message_count} messages at {throughput:.0f} messages/s"
+        )
+
+        # Every message reached a connection of the bot once
+        self.assertEqual(sent_count, message_count)
+
+    async def test_commands_are_answered(self):
+        self.server.moderated_channels.add("channel1")
+        await self.start_bot()
+
+        await self.server.send_messages(
+            [("channel1", "user", "$ping"), ("channel2", "user", "Robert")]
+        )
+        await self.server.wait_until(lambda: len(self.server.received_messages) == 2)
+
+        self.assertEqual(
+            sorted(self.server.received_messages),
+            [
+                ("channel1", "Pong! Uptime: 0d0h0m  | Channels: 2000"),
+                ("channel2", "NekoPray Robert"),
+            ],
+        )
+
+    async def test_stored_users_are_resolved_without_helix(self):
+        await self.start_bot()
+        self.server.helix_request_count = 0
+
+        # The channel names were stored when the bot added their entries at startup
+        await self.server.send_messages([("channel1", "user", "$eliscoins @channel5")])
+        await self.server.wait_until(lambda: len(self.server.received_messages) == 1)
+
+        self.assertEqual(
+            self.server.received_messages,
+            [("channel1", "User channel5 owns 0 elisCoin !  hakaseLaughingAtYou")],
+        )
+        self.assertEqual(self.server.helix_request_count, 0)
+
+    async def test_slow_command_does_not_delay_other_channels(self):
+        await self.start_bot()
+        self.server.helix_latency_in_seconds = 1
+
+        # The target user is fetched from Helix
+        await self.server.send_messages([("channel1", "user", "$bonk someone")])
+        await asyncio.sleep(0.1)
+        await self.server.send_messages([("channel2", "user", "Robert")])
+        await self.server.wait_until(lambda: len(self.server.received_messages) == 1)
+
+        self.assertEqual(
+            self.server.received_messages, [("channel2", "NekoPray Robert")]
+        )
+
+    async def test_channels_are_joined_again_after_disconnects(self):
+        await self.start_bot()
+        start = time.perf_counter()
+
+        disconnected = set(self.server.connections)
+        await self.server.disconnect()
+        # The disconnected connections leave their channels once the server notices they closed
+        await self.server.wait_until(lambda: not disconnected & self.server.connections)
+
+        await self.server.wait_until(
+            lambda: len(self.server.joined_channels()) == self.CHANNEL_COUNT,
+            timeout_in_seconds=60,
+        )
+        logger.info(
+            f"Joined {self.CHANNEL_COUNT} channels again in {time.perf_counter() - start:.2f}s"
+        )
+
+        self.assertTrue(
+            all(self.server.connection_count(name) == 1 for name in self.channel_names)
+        )
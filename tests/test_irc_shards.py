@@ -0,0 +1,131 @@
+import time
+from unittest import IsolatedAsyncioTestCase
+
+from hashtablebot.irc_shards import ChannelShards, JoinRateLimiter
+
+
+class FakeConnection:
+    """
+    Records the channels joined and parted instead of sending them to Twitch.
+    """
+
+    def __init__(self):
+        self.channels: set[str] = set()
+        self.joined: list[str] = []
+        self.parted: list[str] = []
+        self.closed = False
+
+    async def join_channels(self, *channels: str):
+        self.joined.extend(channels)
+
+    async def part_channels(self, *channels: str):
+        self.parted.extend(channels)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeChannelShards(ChannelShards):
+    def __init__(self, channels_per_connection: int):
+        super().__init__(None, channels_per_connection, JoinRateLimiter(max_joins=1000))
+        self.opened: list[FakeConnection] = []
+
+    async def _open_connection(self):
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+
+
+class TestChannelShards(IsolatedAsyncioTestCase):
+    """
+    Tests for ChannelShards
+    """
+
+    async def test_join_spreads_channels(self):
+        shards = FakeChannelShards(channels_per_connection=2)
+        await shards.join("a", "b", "c", "d", "e")
+
+        self.assertEqual(shards.connection_count, 3)
+        self.assertEqual(sorted(len(c.channels) for c in shards.opened), [1, 2, 2])
+        self.assertEqual(
+            sorted(name for c in shards.opened for name in c.joined),
+            ["a", "b", "c", "d", "e"],
+        )
+
+    async def test_join_ignores_joined_channels(self):
+        shards = FakeChannelShards(channels_per_connection=2)
+        await shards.join("A", "#a", "b")
+        await shards.join("b")
+
+        self.assertEqual(len(shards), 2)
+        self.assertIn("a", shards)
+        self.assertEqual(shards.opened[0].joined, ["a", "b"])
+
+    async def test_part_closes_connections_no_longer_needed(self):
+        shards = FakeChannelShards(channels_per_connection=2)
+        await shards.join("a", "b", "c")
+        first, second = shards.opened
+
+        await shards.part("a")
+
+        self.assertEqual(first.parted, ["a"])
+        self.assertTrue(first.closed)
+        self.assertFalse(second.closed)
+        self.assertEqual(shards.connection_count, 1)
+        # The channels of the closed connection are joined by the one left
+        self.assertEqual(second.channels, {"b", "c"})
+        self.assertEqual(second.joined, ["c", "b"])
+
+    async def test_part_keeps_needed_connections(self):
+        shards = FakeChannelShards(channels_per_connection=3)
+        await shards.join("a", "b", "c", "d", "e")
+
+        await shards.part("b", "unknown")
+
+        self.assertEqual(shards.connection_count, 2)
+        self.assertEqual(len(shards), 4)
+
+    async def test_part_every_channel(self):
+        shards = FakeChannelShards(channels_per_connection=2)
+        await shards.join("a", "b", "c")
+
+        await shards.part("a", "b", "c")
+
+        self.assertEqual(shards.connection_count, 0)
+        self.assertTrue(all(c.closed for c in shards.opened))
+
+        await shards.join("d")
+        self.assertEqual(shards.connection_count, 1)
+
+    async def test_close(self):
+        shards = FakeChannelShards(channels_per_connection=2)
+        await shards.join("a", "b", "c")
+        await shards.close()
+
+        self.assertTrue(all(c.closed for c in shards.opened))
+        self.assertEqual(len(shards), 0)
+
+
+class TestJoinRateLimiter(IsolatedAsyncioTestCase):
+    """
+    Tests for JoinRateLimiter
+    """
+
+    async def test_joins_over_the_limit_wait(self):
+        limiter = JoinRateLimiter(max_joins=2, period_in_seconds=0.2)
+        start = time.monotonic()
+
+        await limiter.acquire()
+        await limiter.acquire()
+        self.assertLess(time.monotonic() - start, 0.1)
+
+        await limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_processes_share_the_limit(self):
+        limiter = JoinRateLimiter(max_joins=20, period_in_seconds=10, process_count=3)
+        self.assertEqual((limiter.max_joins, limiter.period_in_seconds), (6, 9))
+
+        # More processes than joins each join once over a longer period
+        limiter = JoinRateLimiter(max_joins=20, period_in_seconds=10, process_count=40)
+        self.assertEqual((limiter.max_joins, limiter.period_in_seconds), (1, 20))
@@ -0,0 +1,154 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from hashtablebot.entity.bot_user import BotUser
+from hashtablebot.leaderboard import Leaderboard
+from hashtablebot.persistence.bot_user_dao import BotUserDao
+from tests.sqlite_database import bind_sqlite_database
+
+
+class TestLeaderboard(TestCase):
+    """
+    Tests for the Leaderboard
+    """
+
+    def setUp(self):
+        self.leaderboard = Leaderboard(load_size=3)
+        self.leaderboard.load(
+            [BotUser(id=1, balance=300), BotUser(id=2, balance=200)], limit=3
+        )
+
+    def test_top_before_load(self):
+        self.assertIsNone(Leaderboard().top(5))
+
+    def test_top_after_loading_every_user(self):
+        self.assertEqual(self.leaderboard.top(5), [(1, 300), (2, 200)])
+        self.assertEqual(self.leaderboard.top(1), [(1, 300)])
+
+    def test_update_balances(self):
+        self.leaderboard.update_balances({2: 400, 3: 250}, version=0)
+
+        self.assertEqual(self.leaderboard.top(3), [(2, 400), (1, 300), (3, 250)])
+
+    def test_older_versions_are_ignored(self):
+        self.leaderboard.update_balances({2: 400}, version=2)
+        self.leaderboard.update_balances({2: 100, 3: 250}, version=1)
+
+        self.assertEqual(self.leaderboard.top(3), [(2, 400), (1, 300), (3, 250)])
+
+    def test_read_balances_only_add_unseen_users(self):
+        self.leaderboard.update_balances({2: 400}, version=0)
+        self.leaderboard.update_balances({2: 100, 3: 250})
+
+        self.assertEqual(self.leaderboard.top(3), [(2, 400), (1, 300), (3, 250)])
+
+    def test_load_keeps_written_balances(self):
+        self.leaderboard.update_balances({2: 400}, version=0)
+        self.leaderboard.load([BotUser(id=2, balance=200)], limit=3)
+
+        self.assertEqual(self.leaderboard.top(2), [(2, 400), (1, 300)])
+
+    def test_entries_below_floor_need_load(self):
+        leaderboard = Leaderboard(load_size=2)
+        leaderboard.load([BotUser(id=1, balance=300), BotUser(id=2, balance=200)], 2)
+
+        self.assertEqual(leaderboard.top(2), [(1, 300), (2, 200)])
+        # Users that were not loaded could have up to 200 coins
+        self.assertIsNone(leaderboard.top(3))
+
+        leaderboard.update_balances({2: 100}, version=0)
+        self.assertIsNone(leaderboard.top(2))
+        self.assertEqual(leaderboard.top(1), [(1, 300)])
+
+    def test_ranking_is_bounded(self):
+        leaderboard = Leaderboard(load_size=2, capacity=3)
+        leaderboard.load([], limit=2)
+
+        leaderboard.update_balances({i: i * 10 for i in range(1, 11)}, version=0)
+
+        self.assertEqual(leaderboard.top(3), [(10, 100), (9, 90), (8, 80)])
+        # Users pushed out of the ranking could have up to 70 coins
+        self.assertIsNone(leaderboard.top(4))
+        leaderboard.update_balances({7: 75}, version=1)
+        self.assertEqual(leaderboard.top(3), [(10, 100), (9, 90), (8, 80)])
+        self.assertLessEqual(len(leaderboard._balances), 3)
+
+    def test_dropped_users_ignore_older_versions(self):
+        leaderboard = Leaderboard(load_size=1, capacity=1)
+        leaderboard.load([BotUser(id=1, balance=300)], limit=1)
+
+        leaderboard.update_balances({2: 10}, version=2)
+        leaderboard.update_balances({2: 500}, version=1)
+        self.assertEqual(leaderboard.top(1), [(1, 300)])
+
+        leaderboard.update_balances({2: 500}, version=3)
+        self.assertEqual(leaderboard.top(1), [(2, 500)])
+
+    def test_channel_members_are_bounded(self):
+        leaderboard = Leaderboard(max_channel_members=2)
+        leaderboard.load([], limit=leaderboard.load_size)
+        leaderboard.update_balances({1: 10, 2: 20, 3: 30})
+
+        for user_id in (1, 2, 1, 3):
+            leaderboard.add_channel_member("channel", user_id)
+
+        self.assertEqual(leaderboard.top(5, "channel"), [(3, 30), (1, 10)])
+
+    def test_channel_top(self):
+        self.leaderboard.add_channel_member("channel", 2)
+        self.leaderboard.add_channel_member("channel", 4)
+
+        self.assertIsNone(self.leaderboard.top(5, "channel"))
+        self.assertEqual(self.leaderboard.unknown_channel_members("channel"), [4])
+
+        self.leaderboard.update_balances({4: 0})
+        self.assertEqual(self.leaderboard.top(5, "channel"), [(2, 200), (4, 0)])
+        self.assertEqual(self.leaderboard.top(5, "other_channel"), [])
+
+
+class TestLeaderboardBalanceListener(TestCase):
+    """
+    Tests for the Leaderboard updated by BotUserDao writes, using SQLite as the database
+    """
+
+    def setUp(self):
+        bind_sqlite_database()
+        self.leaderboard = Leaderboard()
+        BotUserDao.balance_listeners.append(self.leaderboard.update_balances)
+        self.leaderboard.load([], limit=self.leaderboard.load_size)
+
+    def tearDown(self):
+        BotUserDao.balance_listeners.remove(self.leaderboard.update_balances)
+
+    def test_writes_update_leaderboard(self):
+        BotUserDao.save(BotUser(id=1, balance=100))
+        BotUserDao.transfer(1, 2, 30)
+        BotUserDao.add_to_balances({2: 50, 3: 10})
+
+        self.assertEqual(self.leaderboard.top(5), [(2, 80), (1, 70), (3, 10)])
+
+    def test_updating_other_fields_keeps_balance(self):
+        BotUserDao.save(BotUser(id=1, balance=100))
+        bot_user = BotUserDao.get_by_id(1)
+        BotUserDao.deposit(1, 50)
+
+        # The user was read before the deposit, so its balance is outdated
+        bot_user.bot_joined_channel = True
+        BotUserDao.update(bot_user)
+        self.assertEqual(self.leaderboard.top(1), [(1, 150)])
+
+        bot_user.balance = 10
+        BotUserDao.update(bot_user)
+        self.assertEqual(self.leaderboard.top(1), [(1, 10)])
+
+    def test_concurrent_writes_keep_latest_balance(self):
+        def deposit_many():
+            for _ in range(20):
+                BotUserDao.deposit(1, 1)
+
+        # Listeners run after the commit, so the threads' notifications can arrive out of order
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for _ in range(8):
+                executor.submit(deposit_many)
+
+        self.assertEqual(self.leaderboard.top(1), [(1, 160)])
@@ -0,0 +1,58 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from hashtablebot.lru_cache import LRUCache
+
+
+class TestLRUCache(TestCase):
+    """
+    Tests for the LRUCache
+    """
+
+    def test_get_and_put(self):
+        cache: LRUCache[str, str] = LRUCache(max_size=2)
+        cache.put("channel", "!")
+
+        self.assertEqual(cache.get("channel"), "!")
+        self.assertIsNone(cache.get("other_channel"))
+        self.assertEqual(cache.get("other_channel", "$"), "$")
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_least_recently_used_is_evicted(self):
+        cache: LRUCache[str, int] = LRUCache(max_size=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+
+        # Using "a" makes "b" the least recently used entry
+        cache.get("a")
+        cache.put("c", 3)
+
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_expired_entries_are_missing(self):
+        cache: LRUCache[str, int] = LRUCache(max_size=2, ttl=10)
+
+        with patch("hashtablebot.lru_cache.time.monotonic", return_value=0):
+            cache.put("a", 1)
+
+        with patch("hashtablebot.lru_cache.time.monotonic", return_value=5):
+            self.assertEqual(cache.get("a"), 1)
+
+        with patch("hashtablebot.lru_cache.time.monotonic", return_value=11):
+            self.assertNotIn("a", cache)
+            self.assertIsNone(cache.get("a"))
+
+    def test_invalidate(self):
+        cache: LRUCache[str, int] = LRUCache(max_size=2)
+        cache.put_many((("a", 1), ("b", 2)))
+        cache.invalidate("a", "missing")
+
+        self.assertNotIn("a", cache)
+        self.assertEqual(cache.get("b"), 2)
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            LRUCache(max_size=0)
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from hashtablebot.message_scheduler import (
+    MessageScheduler,
+    Priority,
+    TokenBucket,
+    message_priority,
+)
+
+
+class TestTokenBucket(TestCase):
+    """
+    Tests for TokenBucket
+    """
+
+    def test_refill(self):
+        bucket = TokenBucket(capacity=2, refill_per_second=0.5, now=0)
+
+        bucket.take(now=0)
+        bucket.take(now=0)
+        self.assertEqual(bucket.wait_time(now=0), 2)
+        self.assertEqual(bucket.wait_time(now=1), 1)
+        self.assertEqual(bucket.wait_time(now=2), 0)
+
+    def test_capacity_is_the_maximum(self):
+        bucket = TokenBucket(capacity=1, refill_per_second=1, now=0)
+
+        self.assertEqual(bucket.wait_time(now=100), 0)
+        bucket.take(now=100)
+        self.assertEqual(bucket.wait_time(now=100), 1)
+
+
+class TestMessageScheduler(IsolatedAsyncioTestCase):
+    """
+    Tests for MessageScheduler
+    """
+
+    async def asyncSetUp(self):
+        self.scheduler = MessageScheduler(channel_messages_per_second=20)
+        self.sent: list[tuple[str, str]] = []
+
+    async def asyncTearDown(self):
+        await self.scheduler.close()
+
+    async def send(self, channel_name: str, content: str, **kwargs) -> bool:
+        async def write():
+            self.sent.append((channel_name, content))
+
+        return await self.scheduler.send(channel_name, content, write, **kwargs)
+
+    async def test_messages_are_sent_in_order(self):
+        results = await asyncio.gather(
+            *(self.send("channel", str(i)) for i in range(3))
+        )
+
+        self.assertEqual(results, [True] * 3)
+        self.assertEqual(
+            self.sent, [("channel", "0"), ("channel", "1"), ("channel", "2")]
+        )
+
+    async def test_duplicate_messages_are_dropped(self):
+        self.assertTrue(await self.send("channel", "hi"))
+        self.assertFalse(await self.send("channel", "hi"))
+        self.assertTrue(await self.send("other_channel", "hi"))
+
+        self.scheduler.set_privileged("channel", True)
+        self.assertTrue(await self.send("channel", "hi"))
+
+        self.assertEqual(len(self.sent), 3)
+
+    async def test_replies_go_before_bulk_messages(self):
+        with message_priority(Priority.BULK):
+            bulk = [
+                asyncio.create_task(self.send("channel", f"line {i}")) for i in range(3)
+            ]
+
+        # The first line is sent, the others wait for the channel's limit
+        await asyncio.sleep(0.01)
+        await asyncio.gather(self.send("channel", "reply"), *bulk)
+
+        self.assertEqual(
+            [content for _, content in self.sent],
+            ["line 0", "reply", "line 1", "line 2"],
+        )
+
+    async def test_channel_limit(self):
+        start = time.monotonic()
+        await asyncio.gather(*(self.send("channel", str(i)) for i in range(3)))
+        self.assertGreaterEqual(time.monotonic() - start, 2 / 20)
+
+        # Channels where the bot is a moderator or VIP have no channel limit
+        self.scheduler.set_privileged("mod_channel", True)
+        start = time.monotonic()
+        await asyncio.gather(*(self.send("mod_channel", str(i)) for i in range(3)))
+        self.assertLess(time.monotonic() - start, 2 / 20)
+
+    async def test_global_limit(self):
+        scheduler = MessageScheduler(
+            global_limit=2, period_in_seconds=0.2, channel_messages_per_second=1000
+        )
+        write = asyncio.sleep
+
+        start = time.monotonic()
+        await asyncio.gather(
+            *(scheduler.send(f"channel{i}", "hi", lambda: write(0)) for i in range(3))
+        )
+
+        # The third message waits for a tenth of the period
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+        await scheduler.close()
+
+    async def test_processes_share_the_global_limits(self):
+        scheduler = MessageScheduler(
+            global_limit=20,
+            privileged_global_limit=100,
+            period_in_seconds=30,
+            process_count=4,
+        )
+
+        self.assertEqual(scheduler._global_bucket.capacity, 5)
+        self.assertAlmostEqual(scheduler._global_bucket.refill_per_second, 5 / 30)
+        self.assertEqual(scheduler._privileged_global_bucket.capacity, 25)
+        await scheduler.close()
+
+    async def test_queue_depth(self):
+        tasks = [asyncio.create_task(self.send("channel", str(i))) for i in range(3)]
+        # The first message is sent, the others wait for the channel's limit
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(len(self.scheduler), 2)
+        await asyncio.gather(*tasks)
+        self.assertEqual(len(self.scheduler), 0)
@@ -0,0 +1,112 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from hashtablebot.metrics import MetricsRegistry, MetricsServer, db_query_duration
+from hashtablebot.persistence.async_dao import run_blocking
+
+
+class TestMetricsRegistry(TestCase):
+    """
+    Tests for MetricsRegistry and its metrics
+    """
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter(self):
+        counter = self.registry.counter("messages_total", "Messages", ("channel",))
+        counter.inc("a")
+        counter.inc("a")
+        counter.inc('b"', amount=3)
+
+        self.assertEqual(counter.get("a"), 2)
+        self.assertEqual(
+            self.registry.render(),
+            "# HELP messages_total Messages\n"
+            "# TYPE messages_total counter\n"
+            'messages_total{channel="a"} 2\n'
+            'messages_total{channel="b\\""} 3\n',
+        )
+
+    def test_histogram(self):
+        histogram = self.registry.histogram(
+            "latency_seconds", "Latency", ("command",), buckets=(0.1, 1)
+        )
+        histogram.observe(0.05, "ping")
+        histogram.observe(0.1, "ping")
+        histogram.observe(5, "ping")
+
+        self.assertEqual(histogram.count("ping"), 3)
+        self.assertEqual(
+            self.registry.render().splitlines()[2:],
+            [
+                'latency_seconds_bucket{command="ping",le="0.1"} 2',
+                'latency_seconds_bucket{command="ping",le="1"} 2',
+                'latency_seconds_bucket{command="ping",le="+Inf"} 3',
+                'latency_seconds_sum{command="ping"} 5.15',
+                'latency_seconds_count{command="ping"} 3',
+            ],
+        )
+
+    def test_gauge_is_read_when_rendered(self):
+        queue = [1, 2]
+        self.registry.gauge("queue_depth", "Depth", lambda: len(queue))
+        queue.append(3)
+
+        self.assertIn("queue_depth 3\n", self.registry.render())
+
+    def test_names_are_unique(self):
+        self.registry.counter("total", "Total")
+
+        with self.assertRaises(ValueError):
+            self.registry.histogram("total", "Total")
+
+
+class TestMetricsServer(IsolatedAsyncioTestCase):
+    """
+    Tests for MetricsServer
+    """
+
+    async def asyncSetUp(self):
+        self.registry = MetricsRegistry()
+        self.registry.counter("messages_total", "Messages").inc()
+        self.server = MetricsServer(self.registry, port=0)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def get(self, path: str) -> bytes:
+        reader, writer = await asyncio.open_connection(
+            self.server.host, self.server.port
+        )
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        response = await reader.read()
+        writer.close()
+        return response
+
+    async def test_metrics(self):
+        response = await self.get("/metrics")
+
+        self.assertTrue(response.startswith(b"HTTP/1.1 200 OK\r\n"))
+        self.assertTrue(
+            response.endswith(b"\r\n\r\n" + self.registry.render().encode())
+        )
+
+    async def test_unknown_path(self):
+        response = await self.get("/")
+        self.assertTrue(response.startswith(b"HTTP/1.1 404 Not Found\r\n"))
+
+
+class TestDbQueryMetrics(IsolatedAsyncioTestCase):
+    """
+    Tests for the metrics of the database calls
+    """
+
+    async def test_run_blocking_is_timed(self):
+        def query():
+            return 1
+
+        count = db_query_duration.count(query.__qualname__)
+        self.assertEqual(await run_blocking(query), 1)
+        self.assertEqual(db_query_duration.count(query.__qualname__), count + 1)
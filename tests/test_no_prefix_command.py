@@ -0,0 +1,52 @@
+from unittest import TestCase
+
+from hashtablebot.memory_entity.no_prefix_command import (
+    DefaultNoPrefix,
+    NoPrefixCommandIndex,
+)
+
+
+class TestNoPrefixCommandIndex(TestCase):
+    """
+    Tests for the NoPrefixCommandIndex
+    """
+
+    def setUp(self):
+        self.elis = DefaultNoPrefix("elisElis", "elisElis")
+        self.elis_time = DefaultNoPrefix("elisElis elisTime", "elisElis elisTime")
+        self.robert = DefaultNoPrefix("NekoPray Robert", "NekoPray Robert")
+        self.index = NoPrefixCommandIndex((self.elis, self.elis_time, self.robert))
+
+    def test_find(self):
+        self.assertIs(self.index.find("elisElis"), self.elis)
+        self.assertIs(self.index.find("elisElis hello"), self.elis)
+        self.assertIs(self.index.find("NekoPray Robert NekoPray"), self.robert)
+        self.assertIsNone(self.index.find("hello elisElis"))
+        self.assertIsNone(self.index.find("elisElisTime"))
+
+    def test_longest_match_wins(self):
+        self.assertIs(self.index.find("elisElis elisTime"), self.elis_time)
+        self.assertIs(self.index.find("elisElis elisTime now"), self.elis_time)
+
+    def test_every_name_must_match(self):
+        self.assertIsNone(self.index.find("NekoPray"))
+        self.assertIsNone(self.index.find("NekoPray Rob"))
+
+    def test_add_replaces_command_with_same_names(self):
+        other_elis = DefaultNoPrefix("elisElis", "elisWave")
+        self.index.add(other_elis)
+
+        self.assertIs(self.index.find("elisElis"), other_elis)
+        self.assertEqual(len(self.index), 3)
+
+    def test_remove(self):
+        self.assertIs(self.index.remove(["elisElis"]), self.elis)
+
+        self.assertIsNone(self.index.find("elisElis"))
+        self.assertIs(self.index.find("elisElis elisTime"), self.elis_time)
+        self.assertIsNone(self.index.remove(["elisElis"]))
+        self.assertIsNone(self.index.remove(["NekoPray"]))
+
+        self.assertIs(self.index.remove(["NekoPray", "Robert"]), self.robert)
+        self.assertNotIn("NekoPray", self.index._root.children)
+        self.assertEqual(list(self.index), [self.elis_time])
@@ -0,0 +1,84 @@
+from unittest import TestCase
+
+from sqlalchemy.exc import NoResultFound
+
+from hashtablebot.banking.bank import Bank
+from hashtablebot.banking.commands import Deposit, Transfer, Withdrawal
+from hashtablebot.banking.persisted_bank_user import PersistedBankUser
+from hashtablebot.bot_exceptions import NotEnoughCoinError
+from hashtablebot.entity.bot_user import BotUser
+from hashtablebot.persistence.bot_user_dao import BotUserDao
+from tests.bank_user_test import BankUserTest
+from tests.sqlite_database import bind_sqlite_database
+
+
+class TestPersistedBankUser(TestCase):
+    """
+    Tests for balance changes applied by the database, using SQLite as the database
+    """
+
+    def setUp(self) -> None:
+        bind_sqlite_database()
+        BotUserDao.save(BotUser(id=1, balance=100), BotUser(id=2, balance=50))
+        self.bank_user = PersistedBankUser.from_bot_user(BotUserDao.get_by_id(1))
+
+    def test_deposit_creates_user(self):
+        new_bank_user = PersistedBankUser(id=3)
+        Bank().execute(Deposit(bank_user=new_bank_user, amount=10))
+
+        self.assertEqual(new_bank_user.balance, 10)
+        self.assertEqual(BotUserDao.get_by_id(3).balance, 10)
+
+    def test_withdrawal(self):
+        Bank().execute(Withdrawal(bank_user=self.bank_user, amount=30))
+
+        self.assertEqual(self.bank_user.balance, 70)
+        self.assertEqual(BotUserDao.get_by_id(1).balance, 70)
+
+        with self.assertRaises(NotEnoughCoinError):
+            Bank().execute(Withdrawal(bank_user=self.bank_user, amount=71))
+        self.assertEqual(BotUserDao.get_by_id(1).balance, 70)
+
+        with self.assertRaises(NotEnoughCoinError):
+            Bank().execute(Withdrawal(bank_user=PersistedBankUser(id=3), amount=1))
+
+    def test_stale_balance_is_not_overwritten(self):
+        # Two commands read the same balance before either of them writes
+        other_bank_user = PersistedBankUser.from_bot_user(BotUserDao.get_by_id(1))
+
+        Bank().execute(Withdrawal(bank_user=self.bank_user, amount=60))
+
+        # The balance read by the second command is stale, but the database checks the current one
+        with self.assertRaises(NotEnoughCoinError):
+            Bank().execute(Withdrawal(bank_user=other_bank_user, amount=60))
+
+        Bank().execute(Deposit(bank_user=other_bank_user, amount=5))
+        self.assertEqual(BotUserDao.get_by_id(1).balance, 45)
+
+    def test_transfer(self):
+        to_bank_user = PersistedBankUser(id=2)
+        bank = Bank()
+        bank.execute(Transfer(self.bank_user, to_bank_user, 100))
+
+        self.assertEqual((self.bank_user.balance, to_bank_user.balance), (0, 150))
+        self.assertEqual(BotUserDao.get_by_id(1).balance, 0)
+        self.assertEqual(BotUserDao.get_by_id(2).balance, 150)
+
+        bank.undo()
+        self.assertEqual(BotUserDao.get_by_id(1).balance, 100)
+        self.assertEqual(BotUserDao.get_by_id(2).balance, 50)
+
+    def test_failed_transfer_changes_nothing(self):
+        with self.assertRaises(NotEnoughCoinError):
+            Bank().execute(Transfer(self.bank_user, PersistedBankUser(id=3), 101))
+
+        self.assertEqual(BotUserDao.get_by_id(1).balance, 100)
+        with self.assertRaises(NoResultFound):
+            BotUserDao.get_by_id(3)
+
+    def test_transfer_to_other_bank_user(self):
+        to_bank_user = BankUserTest(balance=0)
+        Bank().execute(Transfer(self.bank_user, to_bank_user, 40))
+
+        self.assertEqual(BotUserDao.get_by_id(1).balance, 60)
+        self.assertEqual(to_bank_user.get_balance(), 40)
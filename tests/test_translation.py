@@ -0,0 +1,344 @@
+import asyncio
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from hashtablebot.translation import (
+    TranslatedUser,
+    TranslationBatcher,
+    TranslationCache,
+    TranslationError,
+    Translator,
+)
+from tests.translation_backend_test import TranslationBackendTest
+
+
+class TestTranslator(IsolatedAsyncioTestCase):
+    """
+    Tests for the Translator, using a fake translation backend
+    """
+
+    def setUp(self) -> None:
+        self.backend = TranslationBackendTest(latency_in_seconds=0.1)
+        self.translator = Translator(
+            backend=self.backend, max_workers=8, max_concurrent_per_channel=2
+        )
+
+    async def test_translate_text(self):
+        self.assertEqual(
+            await self.translator.translate_text("hello", "en", "pt"), "HELLO"
+        )
+
+        with self.assertRaises(TranslationError):
+            await self.translator.translate_text("", "en", "pt")
+
+        with self.assertRaises(TranslationError):
+            await self.translator.translate_text("hello", "en", "invalid")
+
+    async def test_does_not_block_event_loop(self):
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.create_task(tick())
+        await self.translator.translate_text("hello", "en", "pt")
+        ticking.cancel()
+
+        self.assertGreater(ticks, 5)
+
+    async def test_identical_requests_are_coalesced(self):
+        results = await asyncio.gather(
+            *(
+                self.translator.translate_text("spam", "en", "pt", f"channel{i}")
+                for i in range(10)
+            ),
+            self.translator.translate_text("spam", "en", "de"),
+        )
+
+        self.assertEqual(set(results), {"SPAM"})
+        self.assertEqual(self.backend.calls[("spam", "en", "pt")], 1)
+        self.assertEqual(self.backend.calls[("spam", "en", "de")], 1)
+
+        # Once finished, the translation is requested again
+        await self.translator.translate_text("spam", "en", "pt")
+        self.assertEqual(self.backend.calls[("spam", "en", "pt")], 2)
+
+    async def test_concurrency_per_channel(self):
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                self.translator.translate_text(f"text {i}", "en", "pt", "channel")
+                for i in range(6)
+            )
+        )
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(self.backend.max_concurrent_calls, 2)
+        # 6 translations, 2 at a time
+        self.assertGreaterEqual(elapsed, 0.3)
+
+        # Other channels are not limited by it
+        self.backend.max_concurrent_calls = 0
+        await asyncio.gather(
+            *(
+                self.translator.translate_text(f"text {i}", "en", "pt", f"channel{i}")
+                for i in range(6)
+            )
+        )
+        self.assertEqual(self.backend.max_concurrent_calls, 6)
+
+    async def test_translate_command_falls_back_to_default_languages(self):
+        ctx = SimpleNamespace(channel=SimpleNamespace(name="channel"))
+
+        message = await self.translator.translate(ctx, ("text", "en", "invalid", "hi"))
+
+        self.assertEqual(message, "Translation: EN INVALID HI")
+
+
+class TestTranslationCache(IsolatedAsyncioTestCase):
+    """
+    Tests for the TranslationCache
+    """
+
+    def setUp(self) -> None:
+        self.backend = TranslationBackendTest()
+        self.directory = tempfile.TemporaryDirectory()
+        self.database_path = os.path.join(self.directory.name, "translations.db")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    async def test_cached_translations_skip_backend(self):
+        cache = TranslationCache()
+        translator = Translator(backend=self.backend, cache=cache)
+
+        for _ in range(3):
+            self.assertEqual(
+                await translator.translate_text("kekw", "en", "pt"), "KEKW"
+            )
+
+        self.assertEqual(self.backend.calls[("kekw", "en", "pt")], 1)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+        # Languages are part of the key
+        await translator.translate_text("kekw", "en", "de")
+        self.assertEqual(self.backend.calls[("kekw", "en", "de")], 1)
+
+    async def test_failed_translations_are_not_cached(self):
+        cache = TranslationCache()
+        translator = Translator(backend=self.backend, cache=cache)
+
+        for _ in range(2):
+            with self.assertRaises(TranslationError):
+                await translator.translate_text("kekw", "en", "invalid")
+
+        self.assertEqual(len(cache), 0)
+
+    async def test_lru_eviction_and_ttl(self):
+        cache = TranslationCache(max_size=2, ttl=10)
+
+        with patch("hashtablebot.lru_cache.time.monotonic", return_value=0):
+            cache.put(("a", "en", "pt"), "A")
+            cache.put(("b", "en", "pt"), "B")
+            cache.put(("c", "en", "pt"), "C")
+
+            self.assertIsNone(await cache.get(("a", "en", "pt")))
+            self.assertEqual(await cache.get(("c", "en", "pt")), "C")
+
+        with patch("hashtablebot.lru_cache.time.monotonic", return_value=11):
+            self.assertIsNone(await cache.get(("c", "en", "pt")))
+
+    async def test_database_survives_restart(self):
+        cache = TranslationCache(database_path=self.database_path)
+        cache.put(("kekw", "en", "pt"), "KEKW")
+        cache.close()
+
+        restarted_cache = TranslationCache(database_path=self.database_path)
+        self.assertEqual(await restarted_cache.get(("kekw", "en", "pt")), "KEKW")
+        self.assertIsNone(await restarted_cache.get(("other", "en", "pt")))
+        self.assertEqual((restarted_cache.hits, restarted_cache.misses), (1, 1))
+
+        # Moved back to memory
+        self.assertEqual(len(restarted_cache), 1)
+        restarted_cache.close()
+
+    async def test_queued_writes_are_done_on_close(self):
+        translator = Translator(
+            backend=self.backend,
+            cache=TranslationCache(database_path=self.database_path),
+        )
+        await translator.translate_text("kekw", "en", "pt")
+        translator.close()
+
+        restarted_cache = TranslationCache(database_path=self.database_path)
+        self.assertEqual(await restarted_cache.get(("kekw", "en", "pt")), "KEKW")
+        restarted_cache.close()
+
+    async def test_database_ttl(self):
+        with patch("hashtablebot.translation.time.time", return_value=0):
+            cache = TranslationCache(ttl=10, database_path=self.database_path)
+            cache.put(("kekw", "en", "pt"), "KEKW")
+            cache.close()
+
+        with patch("hashtablebot.translation.time.time", return_value=11):
+            restarted_cache = TranslationCache(ttl=10, database_path=self.database_path)
+            self.assertIsNone(await restarted_cache.get(("kekw", "en", "pt")))
+            restarted_cache.close()
+
+
+class TestTranslationBatcher(IsolatedAsyncioTestCase):
+    """
+    Tests for batched translations of tracked users' messages
+    """
+
+    def setUp(self) -> None:
+        self.backend = TranslationBackendTest()
+        self.translator = Translator(
+            backend=self.backend,
+            cache=TranslationCache(),
+            batch_latency_in_seconds=0.1,
+        )
+
+    async def test_messages_are_batched_by_languages(self):
+        results = await asyncio.gather(
+            self.translator.translate_batched("one", "ja", "en"),
+            self.translator.translate_batched("two", "ja", "en"),
+            self.translator.translate_batched("one", "ja", "en"),
+            self.translator.translate_batched("three", "ko", "en"),
+        )
+
+        self.assertEqual(results, ["ONE", "TWO", "ONE", "THREE"])
+        self.assertCountEqual(
+            self.backend.batch_calls,
+            [(["one", "two"], "ja", "en"), (["three"], "ko", "en")],
+        )
+
+        # Batched translations are cached
+        self.assertEqual(
+            await self.translator.translate_batched("two", "ja", "en"), "TWO"
+        )
+        self.assertEqual(len(self.backend.batch_calls), 2)
+
+    async def test_max_latency(self):
+        start = time.perf_counter()
+        await self.translator.translate_batched("one", "ja", "en")
+        elapsed = time.perf_counter() - start
+
+        self.assertGreaterEqual(elapsed, 0.1)
+        self.assertLess(elapsed, 0.5)
+
+    async def test_full_batch_is_sent_early(self):
+        batcher = TranslationBatcher(
+            self.translator._call_backend_batch,
+            max_latency_in_seconds=10,
+            max_batch_size=3,
+        )
+
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batcher.translate(str(i), "ja", "en") for i in range(3))),
+            timeout=1,
+        )
+        self.assertEqual(results, ["0", "1", "2"])
+
+    async def test_failed_batch(self):
+        results = await asyncio.gather(
+            self.translator.translate_batched("one", "ja", "invalid"),
+            self.translator.translate_batched("two", "ja", "invalid"),
+            return_exceptions=True,
+        )
+
+        for result in results:
+            self.assertIsInstance(result, TranslationError)
+
+    async def test_short_batch_fails_every_text(self):
+        async def translate_batch(texts, source_lang, target_lang):
+            return [text.upper() for text in texts[1:]]
+
+        batcher = TranslationBatcher(translate_batch, max_latency_in_seconds=0.1)
+
+        results = await asyncio.wait_for(
+            asyncio.gather(
+                batcher.translate("one", "ja", "en"),
+                batcher.translate("two", "ja", "en"),
+                return_exceptions=True,
+            ),
+            timeout=1,
+        )
+
+        for result in results:
+            self.assertIsInstance(result, TranslationError)
+
+    async def test_in_flight_translations_are_awaited(self):
+        results = await asyncio.gather(
+            self.translator.translate_text("one", "ja", "en"),
+            self.translator.translate_batched("one", "ja", "en"),
+            self.translator.translate_batched("one", "ja", "en"),
+        )
+
+        self.assertEqual(results, ["ONE", "ONE", "ONE"])
+        self.assertEqual(self.backend.calls[("one", "ja", "en")], 1)
+        self.assertEqual(self.backend.batch_calls, [])
+
+    async def test_messages_of_one_channel_share_a_batch(self):
+        translator = Translator(
+            backend=self.backend,
+            cache=TranslationCache(),
+            max_concurrent_per_channel=1,
+            batch_latency_in_seconds=0.1,
+        )
+
+        await asyncio.gather(
+            *(
+                translator.translate_batched(text, "ja", "en")
+                for text in ("a", "b", "c")
+            )
+        )
+
+        self.assertEqual(self.backend.batch_calls, [(["a", "b", "c"], "ja", "en")])
+
+    async def test_concurrent_batches_are_limited(self):
+        backend = TranslationBackendTest(latency_in_seconds=0.1)
+        translator = Translator(backend=backend)
+        batcher = TranslationBatcher(
+            translator._call_backend_batch,
+            max_latency_in_seconds=0,
+            max_batch_size=1,
+            max_concurrent_batches=1,
+        )
+
+        start = time.perf_counter()
+        await asyncio.gather(*(batcher.translate(str(i), "ja", "en") for i in range(3)))
+
+        # The batches were translated one after the other
+        self.assertGreaterEqual(time.perf_counter() - start, 0.3)
+
+    async def test_translate_user_message(self):
+        sent_messages = []
+
+        async def send(content: str):
+            sent_messages.append(content)
+
+        channel = SimpleNamespace(name="channel", send=send)
+        user = SimpleNamespace(id=1, name="user")
+        self.translator._translated_users[("channel", 1)] = TranslatedUser(
+            user, "ja", "en", channel
+        )
+
+        await asyncio.gather(
+            *(
+                self.translator.translate_user_message(
+                    SimpleNamespace(channel=channel, author=user, content=content)
+                )
+                for content in ("konnichiwa", "arigatou")
+            )
+        )
+
+        self.assertCountEqual(sent_messages, ["user: KONNICHIWA", "user: ARIGATOU"])
+        self.assertEqual(len(self.backend.batch_calls), 1)
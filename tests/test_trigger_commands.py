@@ -0,0 +1,122 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from hashtablebot.hash_table_bot import HashTableBot
+from hashtablebot.persistence.channel_no_prefix_command_dao import (
+    ChannelNoPrefixCommandDao,
+)
+from tests.fake_twitch_server import FakeTwitchServer
+from tests.sqlite_database import bind_sqlite_database
+from tests.translation_backend_test import TranslationBackendTest
+
+
+class TestTriggerCommands(IsolatedAsyncioTestCase):
+    """
+    Tests for the addtrigger and removetrigger commands of the bot connected to a FakeTwitchServer.
+
+    Each test uses its own channel, since the commands' cooldowns are kept between bots.
+    """
+
+    CHANNEL_NAMES = ["channel1", "channel2", "channel3", "channel4"]
+
+    async def asyncSetUp(self):
+        bind_sqlite_database()
+        self.server = FakeTwitchServer()
+        await self.server.start()
+        self.server.add_users(*self.CHANNEL_NAMES)
+        self.server.moderated_channels.update(self.CHANNEL_NAMES)
+
+        patch = self.server.patch_twitchio()
+        patch.__enter__()
+        self.addCleanup(patch.__exit__, None, None, None)
+
+        self.bot = HashTableBot(
+            token=self.server.token,
+            initial_channels=self.CHANNEL_NAMES,
+            translation_backend=TranslationBackendTest(),
+        )
+        self.bot_task = asyncio.create_task(self.bot.start())
+        await self.server.wait_until(
+            lambda: self.server.joined_channels() == set(self.CHANNEL_NAMES)
+        )
+
+    async def asyncTearDown(self):
+        await self.bot.close()
+        await self.server.close()
+
+    async def send(self, channel_name: str, content: str, mod: bool = True) -> str:
+        """
+        Send a chat message and wait for the bot to answer it.
+
+        :return: the bot's answer
+        """
+        message_count = len(self.server.received_messages)
+        await self.server.send_messages([(channel_name, "user", content)], mod=mod)
+        await self.server.wait_until(
+            lambda: len(self.server.received_messages) > message_count
+        )
+        (answer,) = self.server.received_messages[message_count:]
+        self.assertEqual(answer[0], channel_name)
+        return answer[1]
+
+    def stored_triggers(self, channel_name: str) -> list[tuple[str, str]]:
+        (channel_user,) = self.server.add_users(channel_name)
+        return [
+            (command.names, command.response)
+            for command in ChannelNoPrefixCommandDao.get_by_channel_ids(
+                [channel_user.id]
+            )
+        ]
+
+    async def test_added_trigger_is_answered_until_removed(self):
+        self.assertEqual(
+            await self.send("channel1", '$addtrigger "elisElis elisWave" hi chat'),
+            "added trigger 'elisElis elisWave'.",
+        )
+        self.assertEqual(
+            await self.send("channel1", "elisElis elisWave", mod=False), "hi chat"
+        )
+        self.assertEqual(
+            self.stored_triggers("channel1"), [("elisElis elisWave", "hi chat")]
+        )
+
+        self.assertEqual(
+            await self.send("channel1", '$removetrigger "elisElis elisWave"'),
+            "removed trigger 'elisElis elisWave'.",
+        )
+        # The default trigger answers again
+        self.assertEqual(
+            await self.send("channel1", "elisElis elisWave", mod=False), "elisElis"
+        )
+        self.assertEqual(self.stored_triggers("channel1"), [])
+
+    async def test_non_moderators_cant_add_triggers(self):
+        self.assertEqual(
+            await self.send("channel2", "$addtrigger elisWave hi", mod=False),
+            "only moderators are allowed to add triggers.",
+        )
+        self.assertEqual(self.stored_triggers("channel2"), [])
+
+    async def test_chat_commands_cant_be_responses(self):
+        for response in ["/ban user", ".timeout user 600"]:
+            self.assertEqual(
+                await self.send("channel4", f"$addtrigger elisWave {response}"),
+                "the response can't be a chat command.",
+            )
+        self.assertEqual(self.stored_triggers("channel4"), [])
+
+    async def test_trigger_with_same_names_is_replaced(self):
+        await self.send("channel3", "$addtrigger elisWave hi")
+        await self.send("channel3", "$addtrigger elisWave hello")
+
+        self.assertEqual(await self.send("channel3", "elisWave"), "hello")
+        self.assertEqual(self.stored_triggers("channel3"), [("elisWave", "hello")])
+        # Triggers only answer in their channel, whose messages are handled in order
+        self.server.received_messages.clear()
+        await self.server.send_messages(
+            [("channel1", "user", "elisWave"), ("channel1", "user", "Robert")]
+        )
+        await self.server.wait_until(lambda: self.server.received_messages)
+        self.assertEqual(
+            self.server.received_messages, [("channel1", "NekoPray Robert")]
+        )
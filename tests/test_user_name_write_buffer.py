@@ -0,0 +1,69 @@
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, patch
+
+from hashtablebot.entity.bot_user import BotUser
+from hashtablebot.persistence.bot_user_dao import BotUserDao
+from hashtablebot.persistence.user_name_write_buffer import UserNameWriteBuffer
+from tests.sqlite_database import bind_sqlite_database
+
+
+class TestUserNameWriteBuffer(IsolatedAsyncioTestCase):
+    """
+    Tests for the write-behind UserNameWriteBuffer, using SQLite as the database
+    """
+
+    def setUp(self) -> None:
+        bind_sqlite_database()
+        BotUserDao.save(BotUser(id=1, balance=100))
+
+    async def test_flush_writes_names(self):
+        buffer = UserNameWriteBuffer()
+        buffer.add(1, "Alice", "Alice")
+        # User 2 doesn't exist yet, so it's created
+        buffer.add(2, "bob", None)
+
+        await buffer.flush()
+
+        alice, bob = BotUserDao.get_by_ids([1, 2])
+        self.assertEqual(
+            (alice.login_name, alice.name(), alice.balance), ("alice", "Alice", 100)
+        )
+        self.assertEqual((bob.login_name, bob.name()), ("bob", "bob"))
+        self.assertEqual(len(buffer), 0)
+
+    async def test_unchanged_names_are_not_written_again(self):
+        buffer = UserNameWriteBuffer()
+        buffer.add(1, "alice", "Alice")
+        await buffer.flush()
+
+        buffer.add(1, "alice", "Alice")
+        self.assertEqual(len(buffer), 0)
+
+        buffer.add(1, "alice", "ALICE")
+        self.assertEqual(len(buffer), 1)
+
+    async def test_failed_flush_is_retried(self):
+        buffer = UserNameWriteBuffer()
+        buffer.add(1, "alice", "Alice")
+
+        with patch(
+            "hashtablebot.persistence.user_name_write_buffer.AsyncBotUserDao.save_names",
+            new_callable=AsyncMock,
+            side_effect=ConnectionError,
+        ):
+            await buffer.flush()
+
+        self.assertEqual(len(buffer), 1)
+
+        await buffer.flush()
+
+        self.assertEqual(BotUserDao.get_by_id(1).name(), "Alice")
+
+    async def test_close_flushes_pending_names(self):
+        buffer = UserNameWriteBuffer(flush_interval_in_seconds=60)
+        buffer.start()
+        buffer.add(1, "alice", "Alice")
+
+        await buffer.close()
+
+        self.assertEqual(BotUserDao.get_by_id(1).login_name, "alice")
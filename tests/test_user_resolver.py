@@ -0,0 +1,117 @@
+import asyncio
+from types import SimpleNamespace
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+from hashtablebot.user_resolver import ResolvedUser, UserResolver
+
+
+class FakeHelix:
+    """
+    Stand-in for Bot.fetch_users, with users whose ids are 0 to n_users - 1 and names are "user<id>"
+    """
+
+    def __init__(self, n_users: int):
+        self.n_users = n_users
+        self.requests: list[tuple[list, list]] = []
+
+    async def fetch_users(self, names=None, ids=None):
+        names, ids = names or [], ids or []
+        self.requests.append((names, ids))
+        assert len(names) + len(ids) <= UserResolver.MAX_USERS_PER_REQUEST
+
+        found_ids = {i for i in ids if i < self.n_users}
+        found_ids.update(
+            int(name[4:]) for name in names if int(name[4:]) < self.n_users
+        )
+        return [
+            SimpleNamespace(id=i, name=f"user{i}", display_name=f"User{i}")
+            for i in found_ids
+        ]
+
+
+class TestUserResolver(IsolatedAsyncioTestCase):
+    """
+    Tests for the UserResolver
+    """
+
+    def setUp(self):
+        self.helix = FakeHelix(n_users=300)
+        self.resolver = UserResolver(
+            self.helix.fetch_users, batch_window_in_seconds=0.01
+        )
+
+    async def test_concurrent_lookups_are_batched(self):
+        by_ids, by_names, by_name = await asyncio.gather(
+            self.resolver.get_users_by_ids([1, 2, 1000]),
+            self.resolver.get_users_by_names(["USER3", "user2"]),
+            self.resolver.get_user_by_name("user1"),
+        )
+
+        self.assertEqual(len(self.helix.requests), 1)
+        self.assertEqual(by_ids, {1: ResolvedUser(1, "user1", "User1"), 2: by_ids[2]})
+        self.assertEqual(set(by_names), {"user3", "user2"})
+        self.assertEqual(by_name.id, 1)
+
+    async def test_cached_lookups_do_not_fetch(self):
+        await self.resolver.get_users_by_ids([1])
+        self.assertEqual((await self.resolver.get_user_by_name("user1")).id, 1)
+
+        self.resolver.remember(5, "User5", "USER5")
+        self.assertEqual(
+            await self.resolver.get_users_by_ids([5]),
+            {5: ResolvedUser(5, "user5", "USER5")},
+        )
+        self.assertEqual(len(self.helix.requests), 1)
+
+    async def test_lookups_are_split_in_requests_of_100_users(self):
+        users = await self.resolver.get_users_by_ids(range(250))
+
+        self.assertEqual(len(users), 250)
+        self.assertEqual(
+            sorted(len(ids) for _, ids in self.helix.requests), [50, 100, 100]
+        )
+
+    async def test_stored_users_are_not_fetched(self):
+        async def fetch_stored_users(ids, names):
+            return [ResolvedUser(1, "user1", "StoredUser1")]
+
+        resolver = UserResolver(
+            self.helix.fetch_users,
+            batch_window_in_seconds=0,
+            fetch_stored_users=fetch_stored_users,
+        )
+        by_ids, by_names = await asyncio.gather(
+            resolver.get_users_by_ids([1, 2]),
+            resolver.get_users_by_names(["user1", "user3"]),
+        )
+
+        self.assertEqual(by_ids[1].display_name, "StoredUser1")
+        self.assertEqual(by_names["user1"].display_name, "StoredUser1")
+        self.assertEqual(self.helix.requests, [(["user3"], [2])])
+
+    async def test_fetch_error_is_raised(self):
+        async def fetch_users(names=None, ids=None):
+            raise RuntimeError("Helix is down")
+
+        resolver = UserResolver(fetch_users, batch_window_in_seconds=0)
+
+        with self.assertRaises(RuntimeError):
+            await resolver.get_users_by_ids([1])
+
+
+class TestUserResolverCache(TestCase):
+    """
+    Tests for the expiration of the UserResolver's cache, outside of an event loop
+    so the patched clock only affects the cache
+    """
+
+    def test_mappings_expire(self):
+        resolver = UserResolver(FakeHelix(n_users=2).fetch_users, ttl=10)
+
+        with patch("hashtablebot.lru_cache.time.monotonic", return_value=0):
+            resolver.remember(1, "user1", "User1")
+        with patch("hashtablebot.lru_cache.time.monotonic", return_value=5):
+            self.assertIn(1, resolver._by_id)
+        with patch("hashtablebot.lru_cache.time.monotonic", return_value=20):
+            self.assertNotIn(1, resolver._by_id)
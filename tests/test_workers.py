@@ -0,0 +1,323 @@
+import asyncio
+import functools
+import os
+import signal
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Callable
+from unittest import TestCase
+
+from hashtablebot.hash_table_bot import HashTableBot
+from hashtablebot.main import run_bot
+from hashtablebot.workers import ChannelPartition, WorkerCoordinator, partition_index
+from tests.fake_twitch_server import FakeTwitchServer
+from tests.sqlite_database import bind_sqlite_database
+
+CHANNEL_NAMES = [f"channel{i}" for i in range(30)]
+
+
+class FakeIrcServer(socketserver.ThreadingTCPServer):
+    """
+    Keeps track of the channels joined by each connected nick, which are parted when its connection closes.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeIrcHandler)
+        self.lock = threading.Lock()
+        # Maps channel name to the nicks that joined it
+        self.channel_nicks: defaultdict[str, set[str]] = defaultdict(set)
+
+    def joined_channels(self) -> dict[str, set[str]]:
+        with self.lock:
+            return {name: set(n) for name, n in self.channel_nicks.items() if n}
+
+
+class FakeIrcHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        nick = None
+        joined = set()
+
+        try:
+            for line in self.rfile:
+                command, _, argument = line.decode().strip().partition(" ")
+
+                if command == "NICK":
+                    nick = argument
+                elif command == "JOIN":
+                    with self.server.lock:
+                        self.server.channel_nicks[argument.lstrip("#")].add(nick)
+                    joined.add(argument.lstrip("#"))
+        finally:
+            with self.server.lock:
+                for name in joined:
+                    self.server.channel_nicks[name].discard(nick)
+
+
+def join_partition_channels(port: int, partition: ChannelPartition):
+    """
+    Worker joining the channels of its partition, then staying connected until terminated.
+    """
+    with socket.create_connection(("127.0.0.1", port)) as connection:
+        connection.sendall(f"NICK worker{partition.index}\r\n".encode())
+
+        for name in CHANNEL_NAMES:
+            if partition.owns(name):
+                connection.sendall(f"JOIN #{name}\r\n".encode())
+
+        while connection.recv(1024):
+            pass
+
+
+def exit_cleanly(partition: ChannelPartition):
+    """
+    Worker exiting with code 0 right away, like a worker whose bot was closed.
+    """
+
+
+def stop_coordinator(partition: ChannelPartition):
+    """
+    Worker sending SIGTERM to the coordinator's process, like after the shutdown command,
+    then running until terminated.
+    """
+    if partition.index == 0:
+        os.kill(os.getppid(), signal.SIGTERM)
+
+    while True:
+        time.sleep(1)
+
+
+def run_bot_worker(
+    port: int, token: str, database_path: str, partition: ChannelPartition
+):
+    """
+    Worker running the bot on its partition of CHANNEL_NAMES against the FakeTwitchServer
+    listening on port, with a database file shared by every worker.
+    """
+    bind_sqlite_database(database_path)
+    HashTableBot.PARTITION_SYNC_INTERVAL_IN_SECONDS = 0.1
+    # Only used to point twitchio at the server running in the tests' process
+    server = FakeTwitchServer(token)
+    server.port = port
+
+    with server.patch_twitchio():
+        run_bot(
+            dict(
+                token=server.token,
+                initial_channels=CHANNEL_NAMES,
+                balance_flush_interval_in_seconds=None,
+                translation_cache_path=None,
+                user_cache_warm_size=0,
+                channels_per_connection=10,
+                metrics_port=None,
+            ),
+            "WARNING",
+            partition,
+        )
+
+
+class TestChannelPartition(TestCase):
+    """
+    Tests for ChannelPartition
+    """
+
+    def test_every_channel_has_one_owner(self):
+        partitions = [ChannelPartition(i, 3) for i in range(3)]
+
+        for name in CHANNEL_NAMES:
+            owners = [p for p in partitions if p.owns(name)]
+            self.assertEqual(len(owners), 1)
+
+    def test_index_ignores_case_and_hash(self):
+        self.assertEqual(partition_index("Channel", 7), partition_index("#channel", 7))
+
+
+class TestWorkerCoordinator(TestCase):
+    """
+    Tests for WorkerCoordinator, running workers against a fake IRC server
+    """
+
+    def setUp(self):
+        self.server = FakeIrcServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.coordinator = WorkerCoordinator(
+            3,
+            functools.partial(join_partition_channels, self.server.server_address[1]),
+            restart_delay_in_seconds=0,
+        )
+
+    def tearDown(self):
+        self.coordinator.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def wait_until_every_channel_is_joined_once(self):
+        deadline = time.monotonic() + 10
+
+        while time.monotonic() < deadline:
+            self.coordinator.check_workers()
+            joined = self.server.joined_channels()
+
+            if len(joined) == len(CHANNEL_NAMES) and all(
+                len(nicks) == 1 for nicks in joined.values()
+            ):
+                return joined
+
+            time.sleep(0.05)
+
+        self.fail(f"Channels were not joined, joined channels: {joined}")
+
+    def test_workers_join_their_partitions(self):
+        self.coordinator.start()
+        joined = self.wait_until_every_channel_is_joined_once()
+
+        for name, (nick,) in joined.items():
+            self.assertEqual(nick, f"worker{partition_index(name, 3)}")
+
+    def test_dead_worker_is_replaced(self):
+        self.coordinator.start()
+        self.wait_until_every_channel_is_joined_once()
+        dead_pid = self.coordinator.worker_pid(1)
+
+        os.kill(dead_pid, signal.SIGKILL)
+        # Wait for the fake server to part the dead worker's channels
+        deadline = time.monotonic() + 10
+        while "worker1" in set().union(*self.server.joined_channels().values()):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+
+        joined = self.wait_until_every_channel_is_joined_once()
+
+        self.assertNotIn(self.coordinator.worker_pid(1), (None, dead_pid))
+        self.assertIn("worker1", set().union(*joined.values()))
+
+    def test_cleanly_exited_workers_are_not_replaced(self):
+        coordinator = WorkerCoordinator(3, exit_cleanly, restart_delay_in_seconds=0)
+        run_thread = threading.Thread(
+            target=coordinator.run,
+            kwargs=dict(poll_interval_in_seconds=0.05),
+            daemon=True,
+        )
+        run_thread.start()
+        run_thread.join(10)
+
+        # The coordinator stops once every worker exited
+        self.assertFalse(run_thread.is_alive())
+        self.assertTrue(all(coordinator.worker_pid(i) is None for i in range(3)))
+
+    def test_sigterm_stops_every_worker(self):
+        coordinator = WorkerCoordinator(3, stop_coordinator, restart_delay_in_seconds=0)
+        start = time.monotonic()
+
+        coordinator.run(poll_interval_in_seconds=0.05)
+
+        self.assertLess(time.monotonic() - start, 30)
+        self.assertTrue(all(coordinator.worker_pid(i) is None for i in range(3)))
+        # The default handler is restored
+        self.assertIs(signal.getsignal(signal.SIGTERM), signal.SIG_DFL)
+
+
+class TestHashTableBotWorkers(TestCase):
+    """
+    Tests for HashTableBot workers, each running on a channel partition against a FakeTwitchServer
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        database_path = os.path.join(self.directory.name, "hashtablebot.db")
+        # Creates the tables, the workers bind their own engine
+        bind_sqlite_database(database_path).dispose()
+
+        # The server runs in a thread, since stopping the workers blocks until they exit
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.server = FakeTwitchServer()
+        self.run_in_loop(self.server.start())
+        self.server.add_users(*CHANNEL_NAMES)
+
+        self.coordinator = WorkerCoordinator(
+            3,
+            functools.partial(
+                run_bot_worker, self.server.port, self.server.token, database_path
+            ),
+            restart_delay_in_seconds=0,
+        )
+
+    def tearDown(self):
+        self.coordinator.stop()
+        self.run_in_loop(self.server.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.directory.cleanup()
+
+    def run_in_loop(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def wait_until(self, predicate: Callable[[], bool], timeout_in_seconds=30):
+        deadline = time.monotonic() + timeout_in_seconds
+
+        while not predicate():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+
+    def every_channel_is_joined_once(self, channel_names: list[str]) -> bool:
+        return all(self.server.connection_count(name) == 1 for name in channel_names)
+
+    def test_every_channel_is_joined_once(self):
+        self.coordinator.start()
+        self.wait_until(lambda: self.every_channel_is_joined_once(CHANNEL_NAMES))
+
+        self.assertEqual(self.server.joined_channels(), set(CHANNEL_NAMES))
+
+    def test_joined_channel_is_joined_by_its_owner(self):
+        self.coordinator.start()
+        self.wait_until(lambda: self.every_channel_is_joined_once(CHANNEL_NAMES))
+
+        # Handled by the worker of channel0, and joined by the worker of streamer after a sync
+        self.assertNotEqual(
+            partition_index("channel0", 3), partition_index("streamer", 3)
+        )
+        self.run_in_loop(self.server.send_messages([("channel0", "streamer", "$join")]))
+        self.wait_until(lambda: self.server.connection_count("streamer") == 1)
+
+        # Later syncs don't join it again
+        time.sleep(0.5)
+        self.assertTrue(self.every_channel_is_joined_once(CHANNEL_NAMES + ["streamer"]))
+        self.assertEqual(
+            self.server.received_messages, [("channel0", "joined channel 'streamer'")]
+        )
+
+    def test_stopped_workers_close_the_bot(self):
+        self.coordinator.start()
+        self.wait_until(lambda: self.every_channel_is_joined_once(CHANNEL_NAMES))
+        processes = list(self.coordinator._processes.values())
+
+        self.coordinator.stop()
+
+        self.assertEqual([process.exitcode for process in processes], [0, 0, 0])
+
+    def test_shutdown_stops_every_worker(self):
+        def send_shutdown():
+            deadline = time.monotonic() + 30
+            while not self.every_channel_is_joined_once(CHANNEL_NAMES):
+                if time.monotonic() > deadline:
+                    # Keeps run from blocking forever, the test fails below
+                    self.coordinator.request_stop()
+                    return
+                time.sleep(0.05)
+
+            self.run_in_loop(
+                self.server.send_messages([("channel0", "hash_table", "$shutdown")])
+            )
+
+        threading.Thread(target=send_shutdown, daemon=True).start()
+        self.coordinator.run(poll_interval_in_seconds=0.05)
+
+        self.assertEqual(len(self.server.received_messages), 1)
+        self.assertIn("elisLost bye", self.server.received_messages[0][1])
+        self.assertTrue(all(self.coordinator.worker_pid(i) is None for i in range(3)))
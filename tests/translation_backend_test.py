@@ -0,0 +1,52 @@
+import threading
+import time
+from collections import Counter
+
+from hashtablebot.translation import TranslationError
+
+
+class TranslationBackendTest:
+    """
+    Test implementation of the TranslationBackend Protocol, standing in for a translation server.
+
+    Takes latency_in_seconds to answer, uppercases the text and records the calls it receives.
+    """
+
+    def __init__(self, latency_in_seconds: float = 0.0):
+        self.latency_in_seconds = latency_in_seconds
+        self.calls: Counter[tuple[str, str, str]] = Counter()
+        self.batch_calls: list[tuple[list[str], str, str]] = []
+        self.max_concurrent_calls = 0
+        self._concurrent_calls = 0
+        self._lock = threading.Lock()
+
+    def translate(self, text: str, source_lang: str, target_lang: str) -> str:
+        with self._lock:
+            self.calls[(text, source_lang, target_lang)] += 1
+            self._concurrent_calls += 1
+            self.max_concurrent_calls = max(
+                self.max_concurrent_calls, self._concurrent_calls
+            )
+
+        time.sleep(self.latency_in_seconds)
+
+        with self._lock:
+            self._concurrent_calls -= 1
+
+        if target_lang == "invalid":
+            raise TranslationError(f"Invalid language {target_lang}")
+
+        return text.upper()
+
+    def translate_batch(
+        self, texts: list[str], source_lang: str, target_lang: str
+    ) -> list[str]:
+        with self._lock:
+            self.batch_calls.append((texts, source_lang, target_lang))
+
+        time.sleep(self.latency_in_seconds)
+
+        if target_lang == "invalid":
+            raise TranslationError(f"Invalid language {target_lang}")
+
+        return [text.upper() for text in texts]